@@ -0,0 +1,178 @@
+# batch_runner.py
+import json
+import os
+import signal
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from config import BATCH_CHECKPOINT_PATH
+from llm_scheduler import priority_class
+from logger import performance_logger
+from manifest import file_sha256
+
+
+class SectionCheckpointStore:
+    """
+    SQLite store of the section results finished for each CV text file, so a run that
+    crashes or is stopped resumes every CV from its last completed section.
+    Rows are keyed by file path and content hash: results of a text file that has since
+    changed are never restored. A CV's rows are deleted once its parsed JSON is saved.
+    """
+
+    def __init__(self, path=BATCH_CHECKPOINT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written from the section worker threads; every access goes through self._lock
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS sections ("
+            "file_path TEXT, content_hash TEXT, section TEXT, result TEXT, finished REAL, "
+            "PRIMARY KEY (file_path, content_hash, section))"
+        )
+
+    def completed_sections(self, file_path, content_hash):
+        """Returns {section: result} of the sections already finished for this file content."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT section, result FROM sections WHERE file_path = ? AND content_hash = ?",
+                (file_path, content_hash)
+            ).fetchall()
+        return {section: json.loads(result) for section, result in rows}
+
+    def record_section(self, file_path, content_hash, section, result):
+        """Stores one finished section (committed immediately, so it survives a crash)."""
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO sections (file_path, content_hash, section, result, finished) VALUES (?, ?, ?, ?, ?)",
+                (file_path, content_hash, section, json.dumps(result, ensure_ascii=False), time.time())
+            )
+
+    def clear(self, file_path):
+        """Drops every checkpoint of a file once its parse is complete."""
+        with self._lock:
+            self._connection.execute("DELETE FROM sections WHERE file_path = ?", (file_path,))
+
+
+class BatchRunner:
+    """
+    Runs parse_fn over a list of CV text files with per-section checkpointing.
+    parse_fn(file_path, completed_sections=..., on_section_done=...) must skip the sections
+    in completed_sections and call on_section_done(section, result) as each one finishes
+    (regex_parser.parse_cv_with_pipeline does). on_parsed(file_path, parsed_data) saves a
+    finished CV, after which its checkpoints are dropped.
+    SIGINT/SIGTERM stop the run after the CV in progress; a second signal aborts at once.
+    parse() and finish() are the two halves of one CV, so a pipeline (see ingest_pipeline.py)
+    can run them in different stages. Their LLM calls are scheduled as "batch" work, behind
+    interactive requests.
+    """
+
+    def __init__(self, parse_fn, on_parsed, store=None):
+        self.parse_fn = parse_fn
+        self.on_parsed = on_parsed
+        self.store = store or SectionCheckpointStore()
+        self.stop_requested = False
+        self._lock = threading.Lock()
+        self.begin(0)
+
+    def begin(self, total):
+        """Resets the progress counters for a run over `total` CVs."""
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.start_time = time.time()
+
+    def _request_stop(self, signum, frame):
+        if self.stop_requested:
+            raise KeyboardInterrupt
+        self.stop_requested = True
+        print(f"\n [BATCH] {signal.Signals(signum).name} received: stopping after the CV(s) in progress "
+              f"(finished sections are checkpointed). Send it again to abort immediately.")
+
+    @contextmanager
+    def stop_on_signals(self):
+        """Within the block, SIGINT/SIGTERM set stop_requested instead of killing the process (main thread only)."""
+        if threading.current_thread() is not threading.main_thread():
+            yield
+            return
+        previous = {signum: signal.signal(signum, self._request_stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            yield
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def report_progress(self):
+        with self._lock:
+            done, failed = self.completed + self.failed, self.failed
+        elapsed = time.time() - self.start_time
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / rate if rate > 0 else 0.0
+        summary = (f" [BATCH] {done}/{self.total} CVs ({failed} failed) | "
+                   f"{rate * 60:.2f} CVs/min | elapsed {time.strftime('%H:%M:%S', time.gmtime(elapsed))} | "
+                   f"ETA {time.strftime('%H:%M:%S', time.gmtime(eta))}")
+        print(summary)
+        performance_logger.info(summary)
+
+    def _record_failure(self, file_path, e):
+        with self._lock:
+            self.failed += 1
+        performance_logger.error(f"Error processing {os.path.basename(file_path)}: {type(e).__name__}: {e}", exc_info=True)
+        import traceback
+        traceback.print_exc() # Print full traceback for deeper debugging
+        self.report_progress()
+
+    def record_failure(self, file_path, reason):
+        """Counts a CV that failed before it could be parsed (e.g. its text could not be extracted)."""
+        with self._lock:
+            self.failed += 1
+        performance_logger.error(f"Error processing {os.path.basename(file_path)}: {reason}")
+        self.report_progress()
+
+    def parse(self, file_path):
+        """Parses one CV, restoring and checkpointing its sections. Returns None if it failed."""
+        try:
+            content_hash = file_sha256(file_path)
+            completed_sections = self.store.completed_sections(file_path, content_hash)
+            if completed_sections:
+                performance_logger.info(f"Resuming {os.path.basename(file_path)}: {len(completed_sections)} section(s) restored from checkpoint")
+
+            def on_section_done(section, result):
+                if result in (None, "", "N/A", []):
+                    return  # Possibly a failed call (extractors return these on errors), so it is retried on resume
+                self.store.record_section(file_path, content_hash, section, result)
+
+            with priority_class("batch"):
+                return self.parse_fn(file_path, completed_sections=completed_sections, on_section_done=on_section_done)
+        except Exception as e:
+            self._record_failure(file_path, e)
+            return None
+
+    def finish(self, file_path, parsed_data):
+        """Saves a parsed CV through on_parsed and drops its checkpoints."""
+        try:
+            with priority_class("batch"):
+                self.on_parsed(file_path, parsed_data)
+            self.store.clear(file_path)
+        except Exception as e:
+            self._record_failure(file_path, e)
+            return
+        with self._lock:
+            self.completed += 1
+        self.report_progress()
+
+    def run(self, file_paths):
+        """Parses every file unless stopped; returns the number of CVs completed."""
+        self.begin(len(file_paths))
+        with self.stop_on_signals():
+            for position, file_path in enumerate(file_paths):
+                if self.stop_requested:
+                    print(f" [BATCH] Stopped with {len(file_paths) - position} CV(s) left; they resume on the next run.")
+                    break
+                parsed_data = self.parse(file_path)
+                if parsed_data is not None:
+                    self.finish(file_path, parsed_data)
+        return self.completed
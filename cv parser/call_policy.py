@@ -0,0 +1,202 @@
+# call_policy.py
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+
+from config import LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY, LLM_HEDGE_MIN_SAMPLES
+from logger import performance_logger
+
+# Absolute time.monotonic() deadline of the LLM attempt running in the current context.
+# ollama_pool applies it to every HTTP request as its timeout, so an attempt's connection
+# is closed (and the generation stopped) by the deadline, even while nothing is streamed.
+_attempt_deadline = contextvars.ContextVar("llm_attempt_deadline", default=None)
+
+
+def remaining_deadline():
+    """Seconds left before the current attempt's deadline, or None outside run_with_deadline."""
+    deadline_at = _attempt_deadline.get()
+    return None if deadline_at is None else deadline_at - time.monotonic()
+
+
+class CallTimeout(TimeoutError):
+    """An LLM call did not finish within its deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The circuit breaker is open, so the call was not sent."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a server that keeps failing.
+    Closed: calls go through, and failure_threshold consecutive failures open the circuit.
+    Open: calls fail fast for reset_seconds. Then one trial call is let through (half-open);
+    its success closes the circuit, its failure opens it for another reset_seconds.
+    """
+
+    def __init__(self, failure_threshold=LLM_CIRCUIT_FAILURE_THRESHOLD, reset_seconds=LLM_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.reset_seconds else "open"
+
+    def allow(self):
+        """Returns True if a call may be sent now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                performance_logger.info("LLM circuit closed after a successful trial call")
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._trial_in_flight or (self.opened_at is None and self.consecutive_failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                performance_logger.info(
+                    f"LLM circuit opened after {self.consecutive_failures} consecutive failure(s); "
+                    f"calls fail fast for {self.reset_seconds}s"
+                )
+            self._trial_in_flight = False
+
+
+class LatencyTracker:
+    """Keeps the last `window` successful call latencies per section for p95 hedging thresholds."""
+
+    def __init__(self, window=200, min_samples=LLM_HEDGE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._window = window
+
+    def record(self, section, seconds):
+        with self._lock:
+            self._samples.setdefault(section, deque(maxlen=self._window)).append(seconds)
+
+    def p95(self, section):
+        """The section's 95th percentile latency, or None until min_samples calls were recorded."""
+        with self._lock:
+            samples = sorted(self._samples.get(section, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(0.95 * len(samples)))]
+
+
+class CallPolicyStats:
+    """Counts retries, timeouts, hedged requests and hedges that won."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def log_stats(self, breaker=None):
+        summary = f"LLM call policy: {self.retries} retries, {self.timeouts} timeouts, {self.hedges} hedged requests ({self.hedge_wins} won)"
+        if breaker is not None:
+            summary += f", circuit opened {breaker.times_opened}x, {breaker.rejected} calls rejected while open"
+        performance_logger.info(summary)
+
+
+def backoff_delay(attempt, base_delay=LLM_RETRY_BASE_DELAY, max_delay=LLM_RETRY_MAX_DELAY):
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base_delay * 2**attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def _run_attempt(future, attempt_fn, cancel_event, deadline_at):
+    _attempt_deadline.set(deadline_at)
+    try:
+        future.set_result(attempt_fn(cancel_event))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+def run_with_deadline(attempt_fn, deadline, hedge_after=None, hedge_gate=None, label="unlabelled", stats=None):
+    """
+    Runs attempt_fn(cancel_event) on a worker thread and returns its result, raising
+    CallTimeout once `deadline` seconds have passed. attempt_fn should return early once
+    cancel_event is set (a streamed call closes its stream); the late result is discarded.
+    HTTP requests made by the attempt time out at the same deadline (see remaining_deadline),
+    so an abandoned attempt ends by then at the latest.
+    With hedge_after, a second attempt is started if the first one is still running after
+    that many seconds (and hedge_gate(), if given, returns True), and whichever finishes
+    first wins. The other one is cancelled.
+    """
+    start_time = time.perf_counter()
+    deadline_at = time.monotonic() + deadline
+    attempts = []  # (future, cancel_event)
+
+    def launch():
+        # A daemon thread per attempt: one stuck on a stalled connection is abandoned at the
+        # deadline and cannot keep the process from exiting (executor threads would). It runs
+        # in a copy of the caller's context, so context labels (e.g. the metrics cv) carry over.
+        future, cancel_event = Future(), threading.Event()
+        future.set_running_or_notify_cancel()
+        threading.Thread(target=contextvars.copy_context().run, args=(_run_attempt, future, attempt_fn, cancel_event, deadline_at),
+                         name=f"llm-attempt-{label}", daemon=True).start()
+        attempts.append((future, cancel_event))
+
+    def cancel_all():
+        for _, cancel_event in attempts:
+            cancel_event.set()
+
+    launch()
+    while True:
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= deadline:
+            cancel_all()
+            if stats is not None:
+                stats.count("timeouts")
+            raise CallTimeout(f"no answer within {deadline}s")
+        wait_seconds = deadline - elapsed
+        if hedge_after is not None and len(attempts) == 1:
+            wait_seconds = min(wait_seconds, max(hedge_after - elapsed, 0))
+        wait([future for future, _ in attempts if not future.done()], timeout=wait_seconds, return_when=FIRST_COMPLETED)
+        finished = [future for future, _ in attempts if future.done()]
+        for future in finished:
+            if future.exception() is None:
+                cancel_all()
+                if stats is not None and future is not attempts[0][0]:
+                    stats.count("hedge_wins")
+                return future.result()
+        if len(finished) == len(attempts):
+            raise finished[0].exception()
+        if hedge_after is not None and len(attempts) == 1 and time.perf_counter() - start_time >= hedge_after:
+            if hedge_gate is not None and not hedge_gate():
+                hedge_after = None  # No capacity for a second request; wait for the first one
+                continue
+            performance_logger.info(f"Hedging [{label}]: no answer after p95 {hedge_after:.2f}s, sending a second request")
+            if stats is not None:
+                stats.count("hedges")
+            launch()
@@ -13,16 +13,210 @@ EXTRACTED_TEXT_DIR = os.path.join(BASE_DIR, 'extracted_text')
 # Directory where final parsed JSON results will be saved
 REGEX_PARSED_RESULTS_DIR = os.path.join(BASE_DIR, 'parsed_results')
 
+# Directory for persistent caches (LLM responses, preprocessing manifest)
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+# Manifest of source CV -> extracted text -> parsed JSON, used to skip unchanged resumes
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'cv_manifest.json')
+INCREMENTAL_PREPROCESSING = True  # False re-extracts and re-parses every CV on each run
+
+# PDF/DOCX text extraction worker processes (1 = extract in the main process)
+PREPROCESS_WORKERS = os.cpu_count() or 1
+PREPROCESS_CHUNKSIZE = 4  # Files handed to a worker per task
+STREAM_SEGMENT_SIZE = 64 * 1024  # Characters buffered per segment when cleaning extracted text as a stream
+
 # Ensure directories exist
 os.makedirs(CV_FILES_DIR, exist_ok=True)
 os.makedirs(EXTRACTED_TEXT_DIR, exist_ok=True)
 os.makedirs(REGEX_PARSED_RESULTS_DIR, exist_ok=True)
+os.makedirs(CACHE_DIR, exist_ok=True)
 
 # Ollama Configuration
 OLLAMA_HOST = "http://localhost:11434"  
+# Every Ollama endpoint to spread the calls over (see ollama_pool.py), e.g.
+# ["http://gpu-box-1:11434", "http://gpu-box-2:11434"]
+OLLAMA_HOSTS = [OLLAMA_HOST]
+OLLAMA_POOL_CONNECTIONS = 8  # Keep-alive connections per host
+OLLAMA_HEALTH_CHECK_INTERVAL = 15  # Seconds between health probes (multi-host pools only)
+OLLAMA_HEALTH_CHECK_TIMEOUT = 2.0  # A probe slower than this takes the host out of rotation
 OLLAMA_MODEL_NAME = "llama3.2:latest"  
 # OLLAMA_MODEL_NAME = "llama3.3-32k:latest"          
 OLLAMA_EMBEDDING_MODEL_NAME = "mxbai-embed-large"  # mxbai-embed-large:334m, mxbai-embed-large:latest (335M), nomic-embeded-text (137M)
+# Model tiers, smallest first (see llm_parser.route_model_call). Each section starts on its
+# tier in SECTION_MODEL_TIERS (default: DEFAULT_MODEL_TIER) and is escalated to the next
+# larger tier when the output fails validation. Ollama keeps up to OLLAMA_MAX_LOADED_MODELS
+# models loaded at once, so both tiers stay resident with the default server settings.
+MODEL_ROUTING_ENABLED = True
+MODEL_TIERS = {
+    "small": "llama3.2:1b",
+    "large": OLLAMA_MODEL_NAME,
+}
+DEFAULT_MODEL_TIER = "large"
+SECTION_MODEL_TIERS = {
+    "name": "small",
+    "languages": "small",
+    "certifications": "small",
+    "experience": "large",
+    "projects": "large",
+}
+OLLAMA_NUM_CTX = 8192  # Context window requested for every chat call (Ollama's num_ctx option)
+OLLAMA_KEEP_ALIVE = "30m"  # How long Ollama keeps a model loaded after its last request
+OLLAMA_NUM_THREAD = None  # CPU threads per request; None lets Ollama decide
+
+# Generation profiles
+# Options sent with every chat call, merged with the profile of the call's section.
+# num_predict caps the output at roughly twice the JSON a large resume produces for
+# that section. num_ctx is deliberately the same for every call: a model loaded with
+# another num_ctx is reloaded by Ollama.
+GENERATION_DEFAULTS = {
+    "num_ctx": OLLAMA_NUM_CTX,
+    "temperature": 0,  # Deterministic (greedy) decoding
+    "seed": 42,
+    "num_predict": 1024,
+}
+GENERATION_PROFILES = {
+    "name": {"num_predict": 32},
+    "skills": {"num_predict": 512},
+    "experience": {"num_predict": 1536},
+    "education": {"num_predict": 512},
+    "projects": {"num_predict": 2048},
+    "certifications": {"num_predict": 768},
+    "languages": {"num_predict": 384},
+    "combined": {"num_predict": 3072},
+    "analysis": {"num_predict": 384},
+}
+
+# Context packing (see context_packer.py)
+# Each prompt's resume context is trimmed to OLLAMA_NUM_CTX minus the instructions reserve
+# and the section's num_predict, keeping the blocks of about CONTEXT_BLOCK_TOKENS tokens
+# that are most relevant to the section.
+CONTEXT_PROMPT_RESERVE_TOKENS = 768   # Instructions and output format
+CONTEXT_BLOCK_TOKENS = 200
+
+# Section extraction execution
+# "sequential" runs the LLM section extractors one after another,
+# "concurrent" runs them in a thread pool of at most LLM_MAX_CONCURRENCY workers.
+# The Ollama server only serves them in parallel when started with OLLAMA_NUM_PARALLEL > 1.
+LLM_EXECUTION_MODE = "concurrent"
+LLM_MAX_CONCURRENCY = 4
+
+# "per_section" asks the LLM once per section, "combined" asks for every section in one
+# JSON object and only re-queries the sections whose output fails validation.
+LLM_EXTRACTION_MODE = "per_section"
+
+# Map-reduce extraction for long resumes
+# A MAP_REDUCE_SECTIONS context above MAP_REDUCE_THRESHOLD_TOKENS (estimated) is split with
+# chunk_text into MAP_REDUCE_CHUNK_SIZE-character chunks, extracted chunk by chunk in parallel
+# (at most LLM_MAX_CONCURRENCY calls at a time) and merged, instead of being packed.
+MAP_REDUCE_ENABLED = True
+MAP_REDUCE_SECTIONS = ("experience", "projects")
+MAP_REDUCE_THRESHOLD_TOKENS = 4096
+MAP_REDUCE_CHUNK_SIZE = 8000
+MAP_REDUCE_CHUNK_OVERLAP = 400
+
+# Deterministic tier (see deterministic_parser.py): name, skills, languages and education are
+# first extracted with regexes and dictionaries, and the LLM is only asked for a section
+# when the deterministic confidence is below the threshold.
+DETERMINISTIC_TIER_ENABLED = True
+DETERMINISTIC_CONFIDENCE_THRESHOLD = 0.85
+
+# Structured output: every JSON extraction call sends its section's JSON schema as Ollama's
+# `format`, so decoding is constrained to valid JSON and the reply needs one json.loads.
+# The text scraper stays as the fallback (and is used alone when this is False).
+LLM_STRUCTURED_OUTPUT = True
+
+# Streaming: replies are consumed token by token, and JSON replies are cut off (ending the
+# generation on the server) as soon as the first complete JSON array/object has arrived.
+LLM_STREAMING = True
+
+# Deadlines, retries and hedging (see call_policy.py)
+# Every _call_ollama attempt is abandoned after its section's deadline in seconds (streams
+# are closed, which stops the generation). Failed or timed-out attempts are retried up to
+# LLM_MAX_RETRIES times after a jittered exponential backoff. LLM_CIRCUIT_FAILURE_THRESHOLD
+# consecutive failures open the circuit: calls fail fast for LLM_CIRCUIT_RESET_SECONDS,
+# then a single trial call decides whether it closes again.
+LLM_DEFAULT_DEADLINE = 120
+LLM_SECTION_DEADLINES = {
+    "name": 30,
+    "languages": 60,
+    "certifications": 90,
+    "education": 90,
+    "skills": 90,
+    "experience": 180,
+    "projects": 180,
+    "combined": 240,
+    "analysis": 180,
+}
+LLM_MAX_RETRIES = 2
+LLM_RETRY_BASE_DELAY = 1.0  # Seconds before the first retry, doubled for each further one
+LLM_RETRY_MAX_DELAY = 15.0
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5
+LLM_CIRCUIT_RESET_SECONDS = 30
+# Hedging: once a section has LLM_HEDGE_MIN_SAMPLES recorded latencies, an attempt still
+# running at that section's p95 gets a second, identical request and the first answer wins.
+# Costs up to ~5% extra LLM calls; pays off with several hosts or OLLAMA_NUM_PARALLEL > 1.
+LLM_HEDGING_ENABLED = False
+LLM_HEDGE_MIN_SAMPLES = 20
+OLLAMA_CONNECT_TIMEOUT = 5.0  # Seconds to open a connection to an Ollama host
+
+# LLM request scheduling (see llm_scheduler.py)
+# At most LLM_SCHEDULER_SLOTS requests are in flight at once (roughly OLLAMA_NUM_PARALLEL
+# times the number of hosts). Calls made on behalf of a user ("interactive", the default)
+# are admitted before queued bulk work ("batch", set by batch_runner.BatchRunner). Each
+# class keeps its reserved slots, so a single upload never waits behind a full batch queue
+# and a steady stream of interactive calls cannot starve a batch run.
+LLM_SCHEDULER_SLOTS = 4
+LLM_SCHEDULER_RESERVATIONS = {"interactive": 1, "batch": 1}
+LLM_DEFAULT_PRIORITY_CLASS = "interactive"
+
+# LLM response cache
+# Identical requests (same model, messages and options) are answered from disk.
+# Set LLM_CACHE_ENABLED = False (or pass use_cache=False to _call_ollama) to bypass it.
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, 'llm_responses.sqlite3')
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Least recently used entries are evicted above this size
+
+# Pipelined ingestion (see ingest_pipeline.py): extraction, LLM parsing and saving run as
+# concurrent stages connected by queues of at most PIPELINE_QUEUE_SIZE CVs, so extracting
+# the next CVs overlaps with parsing the current ones. False extracts everything first.
+PIPELINE_ENABLED = True
+PIPELINE_EXTRACT_WORKERS = PREPROCESS_WORKERS
+PIPELINE_PARSE_WORKERS = 2  # CVs parsed at once (each still runs its sections concurrently)
+PIPELINE_WRITE_WORKERS = 1
+PIPELINE_QUEUE_SIZE = 4
+
+# Batch runs (see batch_runner.py): finished section results of every CV are checkpointed
+# here, so an interrupted run resumes each CV from its last completed section.
+BATCH_CHECKPOINT_PATH = os.path.join(CACHE_DIR, 'batch_checkpoints.sqlite3')
+
+# Metrics (see metrics.py): counters, latency histograms and gauges collected in-process.
+# main() appends a snapshot to METRICS_JSONL_PATH and rewrites METRICS_PROMETHEUS_PATH
+# (Prometheus text format, e.g. for node_exporter's textfile collector). With
+# METRICS_HTTP_PORT set, the same text is also served live at http://<host>:<port>/metrics.
+METRICS_JSONL_PATH = os.path.join('logs', 'metrics.jsonl')
+METRICS_PROMETHEUS_PATH = os.path.join('logs', 'metrics.prom')
+METRICS_HTTP_PORT = None
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRICS_QUANTILE_WINDOW = 2048  # Most recent observations per series kept for p50/p95/p99
+# True keeps the old "Function 'x' took N seconds" line per timed call in performance.log
+LOG_FUNCTION_TIMINGS = False
+
+# Embeddings
+# Chunks are embedded through Ollama's batched embed endpoint, EMBEDDING_BATCH_SIZE texts
+# per request, and every vector is kept on disk keyed by model and text hash.
+EMBEDDING_BATCH_SIZE = 32
+EMBEDDING_CACHE_PATH = os.path.join(CACHE_DIR, 'embeddings.sqlite3')
+# True builds section contexts from the chunks retrieved for each section query,
+# False sends the full document to every section extractor.
+RAG_ENABLED = False
+
+# Corpus-wide vector index over every parsed CV's chunks (see vector_index.py).
+# Off by default like RAG: it embeds every chunk of every CV with OLLAMA_EMBEDDING_MODEL_NAME.
+VECTOR_INDEX_ENABLED = False
+VECTOR_INDEX_DIR = os.path.join(CACHE_DIR, 'vector_index')
+VECTOR_INDEX_LISTS = 0  # IVF clusters; 0 picks sqrt(number of vectors) when the index is trained
+VECTOR_INDEX_PROBES = 8  # Clusters scored per query (more = better recall, slower)
+VECTOR_INDEX_TRAIN_SIZE = 4096  # Vectors needed before clustering; smaller indexes are searched exactly
 
 
 
@@ -0,0 +1,135 @@
+# context_packer.py
+import math
+import re
+
+from config import CONTEXT_PROMPT_RESERVE_TOKENS, CONTEXT_BLOCK_TOKENS, GENERATION_DEFAULTS, GENERATION_PROFILES
+from logger import performance_logger
+
+# Local token estimate: one token per word or punctuation mark, plus one for every further
+# 6 characters of a long word. Close enough to the Llama tokenizers for budgeting, and
+# errs on the high side for the short words and punctuation that dominate CV text.
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_PATTERN = re.compile(r"[^\n]+(?:\n[^\n]+)*")
+_LINE_PATTERN = re.compile(r"[^\n]+")
+
+# Words that mark text relevant to each section, used to rank blocks when a context
+# does not fit into the token budget.
+SECTION_KEYWORDS = {
+    "name": ("name", "curriculum", "resume", "email", "mobile", "phone"),
+    "skills": ("skill", "software", "tool", "proficien", "knowledge", "programming", "autocad", "staad", "ms office", "python", "language"),
+    "experience": ("experience", "employer", "company", "designation", "position", "worked", "working", "present", "till date", "responsib", "engineer", "manager"),
+    "projects": ("project", "client", "assignment", "role", "description", "duration", "consultan", "design", "study"),
+    "certifications": ("certif", "training", "course", "workshop", "licen", "seminar", "attended"),
+    "education": ("education", "degree", "universit", "college", "institut", "b.tech", "m.tech", "b.e", "bachelor", "master", "diploma", "school", "cgpa", "percentage"),
+    "languages": ("language", "english", "hindi", "speak", "read", "writ", "mother tongue", "fluent"),
+}
+SECTION_KEYWORDS["combined"] = tuple(keyword for keywords in SECTION_KEYWORDS.values() for keyword in keywords)
+
+# Section map entries (see regex_parser.build_section_map) whose text belongs to each section
+SECTION_MAP_SECTIONS = {
+    "skills": ("SKILLS",),
+    "experience": ("EXPERIENCE",),
+    "projects": ("PROJECTS", "EXPERIENCE"),
+    "certifications": ("CERTIFICATIONS", "TRAINING"),
+    "education": ("EDUCATION",),
+    "languages": ("LANGUAGES",),
+}
+
+
+def estimate_tokens(text):
+    """Estimates the number of tokens in text without loading the model's tokenizer."""
+    return sum(1 + (len(token) - 1) // 6 for token in _TOKEN_PATTERN.findall(text))
+
+
+def context_budget(section=None):
+    """Tokens left for a section's resume context once the instructions and its answer (num_predict) are reserved."""
+    options = {**GENERATION_DEFAULTS, **GENERATION_PROFILES.get(section, {})}
+    return max(options["num_ctx"] - CONTEXT_PROMPT_RESERVE_TOKENS - options["num_predict"], 0)
+
+
+def _iter_units(text, block_tokens):
+    """
+    Yields (start, end, tokens) for the paragraphs of text. A paragraph over block_tokens is
+    split into its lines, and a single line over block_tokens into word-aligned pieces.
+    """
+    for paragraph in _PARAGRAPH_PATTERN.finditer(text):
+        paragraph_tokens = estimate_tokens(paragraph.group(0))
+        if paragraph_tokens <= block_tokens:
+            yield paragraph.start(), paragraph.end(), paragraph_tokens
+            continue
+        for line in _LINE_PATTERN.finditer(text, paragraph.start(), paragraph.end()):
+            line_tokens = estimate_tokens(line.group(0))
+            if line_tokens <= block_tokens:
+                yield line.start(), line.end(), line_tokens
+                continue
+            piece_start = line.start()
+            piece_tokens = 0
+            for token in _TOKEN_PATTERN.finditer(text, line.start(), line.end()):
+                if piece_tokens >= block_tokens:
+                    yield piece_start, token.start(), piece_tokens
+                    piece_start, piece_tokens = token.start(), 0
+                piece_tokens += 1 + (len(token.group(0)) - 1) // 6
+            yield piece_start, line.end(), piece_tokens
+
+
+def _split_blocks(text, block_tokens):
+    """
+    Splits text at blank lines into blocks of roughly block_tokens tokens.
+    Returns [(start, end, tokens)] character spans in document order.
+    """
+    blocks = []
+    block_start = 0
+    block_end = 0
+    block_size = 0
+    for unit_start, unit_end, unit_tokens in _iter_units(text, block_tokens):
+        if block_size and block_size + unit_tokens > block_tokens:
+            blocks.append((block_start, block_end, block_size))
+            block_start, block_size = unit_start, 0
+        block_end = unit_end
+        block_size += unit_tokens
+    if block_size:
+        blocks.append((block_start, block_end, block_size))
+    return blocks
+
+
+def pack_context(section, text, budget=None, section_map=None):
+    """
+    Fits the context for one section prompt into the token budget (context_budget(section) by default).
+    Text that fits is returned unchanged. Otherwise it is split into blocks at blank lines,
+    the blocks are ranked by the section's keywords plus a bonus for overlapping the
+    section's span in section_map (spans into `text`, from regex_parser.build_section_map),
+    and the best blocks that fit are returned in document order.
+    """
+    budget = context_budget(section) if budget is None else budget
+    total_tokens = estimate_tokens(text)
+    if total_tokens <= budget:
+        performance_logger.info(f"Context [{section}]: {total_tokens} tokens sent of {budget} available")
+        return text
+
+    keywords = SECTION_KEYWORDS.get(section, ())
+    spans = [(section_map or {}).get(name) for name in SECTION_MAP_SECTIONS.get(section, ())]
+    spans = [span for span in spans if span]
+
+    scored_blocks = []
+    for start, end, tokens in _split_blocks(text, CONTEXT_BLOCK_TOKENS):
+        block_text = text[start:end].lower()
+        keyword_hits = sum(block_text.count(keyword) for keyword in keywords)
+        score = keyword_hits / math.sqrt(tokens)  # Keyword density, without favouring tiny blocks too much
+        overlap = sum(max(0, min(end, span_end) - max(start, span_start)) for span_start, span_end in spans)
+        score += 10.0 * overlap / max(end - start, 1)
+        scored_blocks.append((score, start, end, tokens))
+
+    selected = []
+    used_tokens = 0
+    for score, start, end, tokens in sorted(scored_blocks, key=lambda block: (-block[0], block[1])):
+        if used_tokens + tokens <= budget:
+            selected.append((start, end))
+            used_tokens += tokens
+    if not selected:  # A single unbroken token run longer than the budget
+        selected, used_tokens = [(0, budget * 4)], budget
+    packed = "\n\n".join(text[start:end] for start, end in sorted(selected))
+    performance_logger.info(
+        f"Context [{section}]: {used_tokens} tokens sent of {budget} available "
+        f"({len(selected)}/{len(scored_blocks)} blocks kept, {total_tokens} tokens before packing)"
+    )
+    return packed
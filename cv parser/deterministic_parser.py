@@ -0,0 +1,511 @@
+# deterministic_parser.py
+import re
+import threading
+
+from logger import performance_logger
+
+# Deterministic (regex and dictionary based) extractors for the sections that usually follow
+# a fixed layout. Every extractor returns (result, confidence) with confidence in [0, 1];
+# parse_cv_with_pipeline only skips the LLM call when confidence reaches the configured threshold.
+# Results use the same shapes as the matching llm_parser extractors.
+
+# --- Dictionaries ---
+
+SKILL_DICTIONARY = [
+    # Programming and data
+    "Python", "Java", "JavaScript", "TypeScript", "C", "C++", "C#", "R", "Go", "Rust", "Kotlin", "Swift",
+    "PHP", "Ruby", "Scala", "MATLAB", "SQL", "MySQL", "PostgreSQL", "MongoDB", "SQLite", "Oracle",
+    "HTML", "CSS", "React", "Angular", "Vue", "Node.js", "Django", "Flask", "FastAPI", "Spring",
+    "Pandas", "NumPy", "scikit-learn", "TensorFlow", "PyTorch", "Keras", "OpenCV", "Machine Learning",
+    "Deep Learning", "Data Analysis", "Power BI", "Tableau", "Excel", "Git", "Docker", "Kubernetes",
+    "Linux", "AWS", "Azure", "GCP", "Hadoop", "Spark", "VBA", "Fortran", "LaTeX",
+    # Engineering software
+    "AutoCAD", "STAAD Pro", "STAAD", "ETABS", "SAP2000", "SAFE", "ANSYS", "ABAQUS", "Revit", "Civil 3D",
+    "MX Road", "MOSS", "HDM-4", "VISSIM", "Synchro", "SIDRA", "EMME", "CUBE", "TransCAD", "GIS",
+    "ArcGIS", "QGIS", "Primavera", "MS Project", "MS Office", "Word", "PowerPoint", "Google SketchUp",
+    "SketchUp", "3ds Max", "Photoshop", "PLAXIS", "GeoStudio", "Tekla", "Bentley", "MicroStation",
+    "HEC-RAS", "SWMM", "EPANET", "WaterGEMS", "PDMS", "Pipenet", "CATIA", "SolidWorks", "Total Station",
+]
+
+LANGUAGE_DICTIONARY = [
+    "English", "Hindi", "Bengali", "Marathi", "Telugu", "Tamil", "Gujarati", "Urdu", "Kannada", "Odia",
+    "Oriya", "Malayalam", "Punjabi", "Assamese", "Sanskrit", "Nepali", "Manipuri", "Konkani", "Sindhi",
+    "Rajasthani", "Bhojpuri", "Maithili", "French", "German", "Spanish", "Portuguese", "Italian", "Russian",
+    "Arabic", "Chinese", "Mandarin", "Japanese", "Korean", "Dutch", "Swahili", "Persian", "Turkish",
+]
+
+PROFICIENCY_LEVELS = {
+    "mother tongue": "Mother tongue", "native": "Native", "fluent": "Fluent", "excellent": "Excellent",
+    "proficient": "Proficient", "very good": "Very good", "good": "Good", "fair": "Fair",
+    "working knowledge": "Working knowledge", "intermediate": "Intermediate", "advanced": "Advanced",
+    "basic": "Basic", "elementary": "Elementary", "beginner": "Beginner", "poor": "Poor",
+}
+
+# --- Patterns, built once at import time ---
+
+def _dictionary_pattern(terms):
+    """One alternation over all terms, longest first; terms of two characters or less match case-sensitively."""
+    alternatives = []
+    for term in sorted(terms, key=len, reverse=True):
+        escaped = re.escape(term).replace(r'\ ', r'[\s\-]*')
+        alternatives.append(f"(?-i:{escaped})" if len(term) <= 2 else escaped)
+    return re.compile(r"(?<![\w+#])(?:" + "|".join(alternatives) + r")(?![\w+#])", re.IGNORECASE)
+
+_SKILL_PATTERN = _dictionary_pattern(SKILL_DICTIONARY)
+_SKILL_CANONICAL = {re.sub(r'[\s\-]', '', term.lower()): term for term in SKILL_DICTIONARY}
+_LANGUAGE_PATTERN = _dictionary_pattern(LANGUAGE_DICTIONARY)
+_PROFICIENCY_PATTERN = re.compile(r"\b(?:" + "|".join(re.escape(level) for level in PROFICIENCY_LEVELS) + r")\b", re.IGNORECASE)
+_FORWARD_LEVEL_PATTERN = re.compile(r"\s*(?:knowledge\s+)?(?:in|of|at)\b", re.IGNORECASE)  # "Fluent in English, Hindi"
+
+_EMAIL_PATTERN = re.compile(r'\b([A-Za-z0-9._%+-]+)@[A-Za-z0-9.-]+\.[A-Za-z]{2,}\b')
+_NAME_LINE_PATTERN = re.compile(r"^[A-Z][A-Za-z'-]*\.?(?:\s+[A-Z][A-Za-z'-]*\.?){1,3}$")
+_NAME_LABEL_PATTERN = re.compile(r"^(?:name|cv of|resume of|curriculum vitae\s*-)\s*:?\s*(.*)$", re.IGNORECASE)
+_NAME_SKIP_PATTERN = re.compile(
+    r"^(?:curricul[au]m\s+vitae|resume|r[eé]sum[eé]|cv|bio[\s-]?data|page\s+\d+(?:\s+of\s+\d+)?|-?\s*\d+\s*-?|\d+\s+of\s+\d+|:)$",
+    re.IGNORECASE
+)
+_NAME_STOPWORDS = {
+    "address", "mailing", "permanent", "contact", "career", "objective", "education", "experience", "profile",
+    "summary", "email", "mobile", "phone", "proposed", "position", "institute", "technology", "university",
+    "college", "engineering", "civil", "resume", "curriculum", "vitae", "page", "personal", "details",
+    "information", "date", "birth", "appendix", "perusal", "please", "india", "road", "nagar", "colony",
+}
+
+_SKILLS_HEADER_PATTERN = re.compile(
+    r"^\s*(?:technical|software|computer|it|key|core|professional)?\s*(?:skills?|proficiency|competencies|expertise)(?:\s+set)?\s*:?\s*(.*)$",
+    re.IGNORECASE
+)
+_LANGUAGES_HEADER_PATTERN = re.compile(r"^\s*languages?(?:\s+(?:known|skills|proficiency))?\s*[:\-]?\s*(.*)$", re.IGNORECASE)
+_HEADER_LINE_PATTERN = re.compile(r"^[A-Z][A-Z &/\-]{3,}:?$|^[A-Z][a-z]+(?: [A-Za-z]+){0,3}:$")
+_LANGUAGE_HEADINGS_LINE_PATTERN = re.compile(r'[\s\W]*(?:(?:speak|read|writ|language)\w*[\s\W]*)*', re.IGNORECASE)
+_ITEM_SPLIT_PATTERN = re.compile(r"[,;|/\n]|\band\b|&|\betc\b\.?", re.IGNORECASE)
+
+_DEGREE_PATTERN = re.compile(
+    r"\b(?:ph\.?\s?d|doctor(?:ate)?|m\.\s?tech|b\.\s?tech|mtech|btech|m\.\s?e\.|b\.\s?e\.|m\.\s?sc|b\.\s?sc|mba|m\.b\.a|"
+    r"mca|bca|b\.\s?com|m\.\s?com|bachelor|master|diploma|post[\s-]?graduat\w*|intermediate|matriculation|"
+    r"(?:higher|senior)\s+secondary|secondary|hsc|ssc|aissce|aisce|class\s+(?:x|xii|10|12)(?:th)?|(?:10|12)th)(?!\w)",
+    re.IGNORECASE
+)
+_INSTITUTION_PATTERN = re.compile(
+    r"\b(?:universit\w*|institut\w*|college|school|academy|vidyalaya|polytechnic|board|iit|nit|iim|bits|cbse|icse)\b",
+    re.IGNORECASE
+)
+_INSTITUTION_HEADING_PATTERN = re.compile(r"^(?:name of )?(?:college|universit\w*|institut\w*|school|board)(?:\s*/\s*\w+)*\s*:?$", re.IGNORECASE)
+_YEAR_PATTERN = re.compile(r"\b(?:19[5-9]\d|20[0-4]\d)\b")
+
+# DOCX tables (extract_text_from_docx): one row per line, cells joined by spaces after normalization
+_TABLE_BLOCK_PATTERN = re.compile(r"^--- TABLE START ---\n(.*?)\n--- TABLE END ---$", re.MULTILINE | re.DOTALL)
+_NUMBER_CELL_PATTERN = re.compile(r"\s(?=\d)")  # Where a year, percentage or serial number cell starts
+_TABLE_SKILL_COLUMN_PATTERN = re.compile(r"\b(speak|read|writ)\w*", re.IGNORECASE)
+_EDUCATION_HEADING_WORDS = re.compile(
+    r"\b(?:qualifications?|degrees?|courses?|exam\w*|institut\w*|universit\w*|college|school|board|years?|passing|"
+    r"percentage|marks|cgpa|gpa|grade|division|class|specialization|stream|subjects?|name|of|s\.?\s?no\.?)\b",
+    re.IGNORECASE
+)
+# Specialization words that end an institution name when reading leftwards ("B.Tech Civil Engineering Delhi Technological University")
+_SPECIALIZATION_WORDS = {"engineering", "science", "sciences", "arts", "commerce", "technology", "management", "applications", "studies"}
+
+
+# --- Extractors ---
+
+def _table_rows(text):
+    """Rows of every --- TABLE START --- block in text, one list of row strings per table."""
+    return [[row.strip() for row in block.split('\n') if row.strip()] for block in _TABLE_BLOCK_PATTERN.findall(text or "")]
+
+
+def extract_name_deterministic(text):
+    """
+    Takes the candidate name from the top of the resume: the first short line of
+    capitalized words that is not a title, page marker or address/heading line.
+    Confidence rises when the name also appears in an email address or after a "Name" label.
+    """
+    email_users = {match.lower() for match in _EMAIL_PATTERN.findall(text[:5000])}
+    lines = [line.strip() for line in text[:3000].split('\n') if line.strip()][:12]
+
+    for position, line in enumerate(lines):
+        labelled = False
+        label_match = _NAME_LABEL_PATTERN.match(line)
+        if label_match:
+            labelled = True
+            line = label_match.group(1).strip(' :-')
+            if not line and position + 1 < len(lines):
+                # "Name" / ":" / "<name>" on separate lines
+                following = [candidate for candidate in lines[position + 1:position + 3] if candidate != ':']
+                line = following[0].strip(' :') if following else ""
+        if not line or _NAME_SKIP_PATTERN.match(line) or not _NAME_LINE_PATTERN.match(line):
+            continue
+        tokens = line.replace('.', ' ').split()
+        if any(token.lower() in _NAME_STOPWORDS for token in tokens):
+            continue
+
+        confidence = 0.7 - 0.05 * position
+        if labelled:
+            confidence += 0.15
+        if any(len(token) >= 3 and token.lower() in user for token in tokens for user in email_users):
+            confidence += 0.25
+        return line, round(min(confidence, 0.99), 2)
+    return "N/A", 0.0
+
+
+def _section_lines(text, header_pattern, max_lines=15):
+    """
+    Returns the lines of the first section whose header matches header_pattern: the rest
+    of the header line plus the following lines up to the next heading-like line.
+    """
+    lines = text.split('\n')
+    for index, line in enumerate(lines):
+        header_match = header_pattern.match(line)
+        if not header_match or len(line) - len(header_match.group(1)) > 40:
+            continue  # Not a heading, just a sentence containing the word
+        section = [header_match.group(1)] if header_match.group(1).strip(' :') else []
+        for following in lines[index + 1:index + 1 + max_lines]:
+            stripped = following.strip()
+            if _HEADER_LINE_PATTERN.match(stripped) and not _is_blank(section) and not _SKILL_PATTERN.fullmatch(stripped):
+                break  # Next heading (a skill written in capitals, e.g. "AUTOCAD", is not one)
+            section.append(following)
+        return section
+    return []
+
+
+def _is_blank(section_lines):
+    return not any(line.strip(' :-o') for line in section_lines)
+
+
+def extract_skills_deterministic(text):
+    """
+    Matches the skills section against SKILL_DICTIONARY. Confidence is the share of
+    listed items that contain a known skill, so free-text skill descriptions go to the LLM.
+    """
+    section = _section_lines(text, _SKILLS_HEADER_PATTERN)
+    items = [item.strip(' .:-o') for item in _ITEM_SPLIT_PATTERN.split('\n'.join(section))]
+    items = [item for item in items if len(item) > 1]
+    if not items:
+        return [], 0.0
+
+    skills = []
+    recognised_items = 0
+    for item in items:
+        matches = _SKILL_PATTERN.findall(item)
+        if matches:
+            recognised_items += 1
+        for match in matches:
+            skill = _SKILL_CANONICAL.get(re.sub(r'[\s\-]', '', match.lower()), match)
+            if skill not in skills:
+                skills.append(skill)
+    coverage = recognised_items / len(items)
+    confidence = coverage if len(skills) >= 3 else coverage * 0.5
+    return skills, round(confidence, 2)
+
+
+def _pair_language_levels(line):
+    """
+    Pairs the languages of one line with the proficiency levels around them and returns
+    [(language, [level, ...]), ...] in line order. A level written as "Level in X, Y" applies
+    to the languages after it; any other level applies to the languages listed since the
+    previous level ("English, Hindi - Fluent"), or only to the language right before it
+    when it is in brackets ("English, Hindi (Fluent)"). Further levels right after a level
+    go to the same languages ("English Fluent Good Good").
+    """
+    tokens = sorted(
+        [(match.start(), match.end(), "language", match.group().title()) for match in _LANGUAGE_PATTERN.finditer(line)]
+        + [(match.start(), match.end(), "level", PROFICIENCY_LEVELS[match.group().lower()]) for match in _PROFICIENCY_PATTERN.finditer(line)]
+    )
+    pairs = []
+    pending = []        # Languages listed since the last level, still without one
+    targets = []        # Languages the previous level went to
+    forward_level = None
+    previous = None
+    for start, end, kind, value in tokens:
+        if kind == "language":
+            pairs.append((value, [forward_level] if forward_level else []))
+            if not forward_level:
+                pending.append(len(pairs) - 1)
+            previous = (end, kind)
+            continue
+        if _FORWARD_LEVEL_PATTERN.match(line, end):
+            forward_level, targets = value, []
+        elif previous is not None and previous[1] == "level" and targets:
+            for index in targets:
+                pairs[index][1].append(value)
+        elif pending:
+            gap = line[previous[0]:start] if previous is not None else ""
+            targets = pending[-1:] if re.search(r"[(\[]", gap) else pending
+            for index in targets:
+                pairs[index][1].append(value)
+            pending = [index for index in pending if index not in targets]
+            forward_level = None
+        previous = (end, kind)
+    return pairs
+
+
+def _languages_from_tables(text):
+    """
+    Reads a DOCX language table whose header names the Speak/Read/Write columns, so levels
+    are assigned in the header's column order. Returns (languages, confidence), or None
+    when there is no such table.
+    """
+    for rows in _table_rows(text):
+        columns = [match.lower() for match in _TABLE_SKILL_COLUMN_PATTERN.findall(rows[0])]
+        if not columns or _LANGUAGE_PATTERN.search(rows[0]):
+            continue
+        field_names = {"speak": "speaking", "read": "reading", "writ": "writing"}
+        languages = []
+        unresolved_rows = 0
+        for row in rows[1:]:
+            found = [language.title() for language in _LANGUAGE_PATTERN.findall(row)]
+            levels = [PROFICIENCY_LEVELS[level.lower()] for level in _PROFICIENCY_PATTERN.findall(row)]
+            if len(found) != 1:
+                unresolved_rows += 1
+                continue
+            entry = {"language": found[0], "speaking": "N/A", "reading": "N/A", "writing": "N/A"}
+            if len(levels) == len(columns):
+                entry.update((field_names[column], level) for column, level in zip(columns, levels))
+            elif levels:
+                unresolved_rows += 1  # Some cells hold something other than a level
+            languages.append(entry)
+        if languages:
+            return languages, round(max(0.95 - 0.3 * unresolved_rows, 0.0), 2)
+    return None
+
+
+def extract_languages_deterministic(text):
+    """
+    Reads a DOCX language table when there is one, otherwise the languages section: comma
+    separated lists ("English, Hindi"), languages with levels ("English (Fluent), German
+    (Basic)", "Fluent in English, Hindi") and simple Speaking/Reading/Writing table rows.
+    Confidence drops for every word that is neither a known language nor a proficiency
+    term, and falls below any useful threshold when a level was written but could not be
+    given to a language.
+    """
+    table_result = _languages_from_tables(text)
+    if table_result is not None:
+        return table_result
+
+    section = _section_lines(text, _LANGUAGES_HEADER_PATTERN, max_lines=8)
+    lines = []
+    for line in (line for line in section if line.strip(' :-o')):
+        if _LANGUAGE_PATTERN.search(line) or _PROFICIENCY_PATTERN.search(line) or _LANGUAGE_HEADINGS_LINE_PATTERN.fullmatch(line):
+            lines.append(line)
+        elif any(_LANGUAGE_PATTERN.search(kept) for kept in lines):
+            break  # First line after the language entries ends the section
+        else:
+            lines.append(line)  # Unrecognised text before any language lowers the confidence
+    if not lines:
+        return [], 0.0
+
+    languages = []
+    unknown_words = 0
+    unpaired_levels = False
+    table_layout = any(re.search(r'\b(?:speak|read|writ)', line, re.IGNORECASE) and not _LANGUAGE_PATTERN.search(line) for line in lines)
+    for line in lines:
+        found = _LANGUAGE_PATTERN.findall(line)
+        levels = [PROFICIENCY_LEVELS[level.lower()] for level in _PROFICIENCY_PATTERN.findall(line)]
+        if not found:
+            if levels:
+                unpaired_levels = True  # e.g. the level on the line below its language
+            elif not _LANGUAGE_HEADINGS_LINE_PATTERN.fullmatch(line):
+                unknown_words += len(re.findall(r'[A-Za-z]{3,}', line))
+            continue
+        leftover = _PROFICIENCY_PATTERN.sub(' ', _LANGUAGE_PATTERN.sub(' ', line))
+        leftover = re.sub(r'\b(?:s|r|w|read|write|speak|reading|writing|speaking|and|only|knowledge)\b', ' ', leftover, flags=re.IGNORECASE)
+        unknown_words += len(re.findall(r'[A-Za-z]{3,}', leftover))
+
+        for language, language_levels in _pair_language_levels(line):
+            if len(language_levels) == 3:
+                speaking, reading, writing = language_levels
+            elif len(language_levels) == 1:
+                speaking = reading = writing = language_levels[0]
+            else:
+                speaking = reading = writing = "N/A"
+                unpaired_levels = unpaired_levels or bool(levels)
+            if language not in [entry["language"] for entry in languages]:
+                languages.append({"language": language, "speaking": speaking, "reading": reading, "writing": writing})
+
+    if not languages:
+        return [], 0.0
+    confidence = 0.95 - 0.25 * unknown_words - (0.3 if table_layout else 0.0) - (0.5 if unpaired_levels else 0.0)
+    return languages, round(max(confidence, 0.0), 2)
+
+
+def _split_education_row(row, degree_match):
+    """Splits one table row (cells already joined by spaces) into degree, institution and year."""
+    years = _YEAR_PATTERN.findall(row)
+    institution_match = next((match for match in _INSTITUTION_PATTERN.finditer(row)
+                              if match.start() >= degree_match.end() or match.end() <= degree_match.start()), None)
+    if institution_match is None:
+        return {"degree": row[degree_match.start():].split(years[0])[0].strip(' ,-') if years else row.strip(' ,-'),
+                "institution": "N/A", "year": max(years) if years else "N/A"}
+    # The institution name runs left over capitalized words (not into the degree or its
+    # specialization) and right up to the degree, a year or a number
+    words_before = row[:institution_match.start()].split(' ')
+    limit = degree_match.end() if degree_match.start() < institution_match.start() else 0
+    start = institution_match.start()
+    for word in reversed(words_before[:-1]):
+        if start - len(word) - 1 < limit or not word[:1].isupper() or word.strip(',()').lower() in _SPECIALIZATION_WORDS or word.endswith(')'):
+            break
+        start -= len(word) + 1
+    end_match = _NUMBER_CELL_PATTERN.search(row, institution_match.end())
+    end = end_match.start() if end_match else len(row)
+    if degree_match.start() > institution_match.start():
+        end = min(end, degree_match.start())
+        degree_end = _NUMBER_CELL_PATTERN.search(row, degree_match.end())
+        degree = row[degree_match.start():degree_end.start() if degree_end else len(row)]
+    else:
+        degree = row[degree_match.start():start]  # Leaves out a serial number or year cell before the degree
+    return {"degree": degree.strip(' ,-'), "institution": row[start:end].strip(' ,-') or "N/A", "year": max(years) if years else "N/A"}
+
+
+def _education_from_tables(text):
+    """
+    Reads DOCX education tables: every row with a degree becomes one entry. Confidence is
+    the share of complete entries, reduced by the share of rows (other than the header)
+    that held no degree.
+    """
+    best = ([], 0.0)
+    for rows in _table_rows(text):
+        entries = []
+        other_rows = 0
+        for position, row in enumerate(rows):
+            degree_match = _DEGREE_PATTERN.search(row)
+            if degree_match is None or (position == 0 and not _YEAR_PATTERN.search(row)
+                                        and len(_EDUCATION_HEADING_WORDS.findall(row)) >= len(row.split()) / 2):
+                if position > 0:
+                    other_rows += 1
+                continue
+            entries.append(_split_education_row(row, degree_match))
+        if not entries:
+            continue
+        complete = sum(entry["institution"] != "N/A" and entry["year"] != "N/A" for entry in entries)
+        confidence = 0.95 * (complete / len(entries)) * (len(entries) / (len(entries) + other_rows))
+        if confidence > best[1]:
+            best = (entries, round(confidence, 2))
+    return best
+
+
+def extract_education_deterministic(section_text, text=""):
+    """
+    Splits an isolated education section into degree entries. Each entry takes the
+    institution and the latest year from the lines around its degree line. Confidence is
+    the share of complete entries, reduced by the share of lines inside the entries'
+    block that no entry accounted for. An education table in text (a DOCX
+    --- TABLE START --- block) is used instead when it reads more confidently.
+    """
+    table_entries, table_confidence = _education_from_tables(text)
+    section_entries, section_confidence = _education_from_section(section_text)
+    if table_confidence > section_confidence:
+        return table_entries, table_confidence
+    return section_entries, section_confidence
+
+
+def _education_from_section(section_text):
+    if not section_text:
+        return [], 0.0
+    lines = [line.strip() for line in section_text.split('\n') if line.strip(' :-')]
+    if not lines:
+        return [], 0.0
+
+    degree_indices = [index for index, line in enumerate(lines) if _DEGREE_PATTERN.search(line) and len(line) < 150]
+    entries = []
+    used_lines = set()
+    complete = 0
+    for number, index in enumerate(degree_indices):
+        next_degree = degree_indices[number + 1] if number + 1 < len(degree_indices) else len(lines)
+        window = list(range(index, min(index + 4, next_degree)))
+        if index > 0 and index - 1 not in used_lines and _YEAR_PATTERN.search(lines[index - 1]) and not _DEGREE_PATTERN.search(lines[index - 1]):
+            window.insert(0, index - 1)  # Year printed above the degree
+        degree = lines[index]
+        institution = None
+        for line_index in window:
+            if line_index != index and _INSTITUTION_PATTERN.search(lines[line_index]) and not _INSTITUTION_HEADING_PATTERN.match(lines[line_index]):
+                institution = lines[line_index]
+                break
+        if institution is None and _INSTITUTION_PATTERN.search(degree) and ',' in degree:
+            degree, institution = (part.strip() for part in degree.split(',', 1))
+        years = [year for line_index in window for year in _YEAR_PATTERN.findall(lines[line_index])]
+
+        entries.append({"degree": degree, "institution": institution or "N/A", "year": max(years) if years else "N/A"})
+        if institution and years:
+            complete += 1
+        used_lines.update(line_index for line_index in window
+                          if line_index == index or lines[line_index] == institution or _YEAR_PATTERN.search(lines[line_index])
+                          or re.fullmatch(r'[\d.%/()\s-]+(?:cgpa|gpa|%)?', lines[line_index], re.IGNORECASE))
+
+    if not entries:
+        return [], 0.0
+    # Only the block spanned by the entries counts; trailing text is left to the next section
+    block_size = max(used_lines) - min(used_lines) + 1
+    # Years near the top of the section that no entry used point at entries that were missed
+    year_lines = [index for index, line in enumerate(lines[:max(used_lines) + 10]) if _YEAR_PATTERN.search(line)]
+    year_coverage = sum(index in used_lines for index in year_lines) / len(year_lines) if year_lines else 1.0
+    confidence = 0.95 * (complete / len(entries)) * (len(used_lines) / block_size) * year_coverage
+    return entries, round(confidence, 2)
+
+
+# --- Tier ---
+
+DETERMINISTIC_EXTRACTORS = {
+    "name": extract_name_deterministic,
+    "skills": extract_skills_deterministic,
+    "languages": extract_languages_deterministic,
+    "education": extract_education_deterministic,
+}
+
+
+class DeterministicTierStats:
+    """Counts, per section, how often the deterministic tier answered instead of the LLM."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = {}
+        self.resolved = {}
+        self.llm_calls = 0
+
+    def record(self, section, resolved):
+        with self._lock:
+            self.attempts[section] = self.attempts.get(section, 0) + 1
+            self.resolved[section] = self.resolved.get(section, 0) + int(resolved)
+
+    def record_llm_calls(self, count):
+        with self._lock:
+            self.llm_calls += count
+
+    def log_stats(self):
+        """Writes the share of LLM section calls the tier avoided to the performance log."""
+        with self._lock:
+            avoided = sum(self.resolved.values())
+            total_calls = avoided + self.llm_calls
+            per_section = ", ".join(f"{section} {self.resolved[section]}/{self.attempts[section]}" for section in self.attempts)
+        fraction = (avoided / total_calls * 100) if total_calls else 0.0
+        performance_logger.info(
+            f"Deterministic tier: {avoided} of {total_calls} section LLM calls avoided ({fraction:.1f}%); resolved per section: {per_section or 'none'}"
+        )
+
+
+tier_stats = DeterministicTierStats()
+
+
+def run_deterministic_tier(text, sections, threshold, section_texts=None):
+    """
+    Runs the deterministic extractor of every requested section that has one and returns
+    {section: result} for those whose confidence reaches threshold. section_texts supplies
+    already isolated section text (e.g. education, which also reads DOCX tables from the
+    full text); other extractors read the full text.
+    """
+    section_texts = section_texts or {}
+    resolved = {}
+    for section in sections:
+        extractor = DETERMINISTIC_EXTRACTORS.get(section)
+        if extractor is None:
+            continue
+        if section == "education":
+            if not section_texts.get("education") and not _TABLE_BLOCK_PATTERN.search(text):
+                continue
+            result, confidence = extractor(section_texts.get("education"), text)
+        else:
+            result, confidence = extractor(text)
+        accepted = confidence >= threshold and bool(result) and result != "N/A"
+        tier_stats.record(section, accepted)
+        performance_logger.info(f"    Deterministic {section}: confidence {confidence:.2f} ({'used' if accepted else 'LLM fallback'})")
+        if accepted:
+            resolved[section] = result
+    return resolved
@@ -0,0 +1,186 @@
+# ingest_pipeline.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import PIPELINE_EXTRACT_WORKERS, PIPELINE_PARSE_WORKERS, PIPELINE_WRITE_WORKERS, PIPELINE_QUEUE_SIZE
+from logger import performance_logger
+from preprocess_cv import scan_cvs, _extract_and_save_cv_isolated, _extract_in_own_process
+
+_END = object()  # Sent once per worker after the last item of a stage
+
+
+class PipelineStage:
+    """
+    One stage of a StagedPipeline: `workers` threads apply fn to the items of a bounded
+    input queue. A None result (or an exception, which is logged) drops the item.
+    Records the items processed, busy time and the input queue depth seen by each item.
+    """
+
+    def __init__(self, name, fn, workers=1, queue_size=PIPELINE_QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.input = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.busy_seconds = 0.0
+        self.depth_total = 0
+        self.max_depth = 0
+
+    def _record(self, depth, seconds, dropped):
+        with self._lock:
+            self.processed += 1
+            self.dropped += int(dropped)
+            self.busy_seconds += seconds
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+
+    def log_stats(self, wall_seconds):
+        """Writes throughput, utilization (busy time / worker time) and queue depth to the performance log."""
+        with self._lock:
+            utilization = self.busy_seconds / (self.workers * wall_seconds) * 100 if wall_seconds > 0 else 0.0
+            mean_depth = self.depth_total / self.processed if self.processed else 0.0
+            performance_logger.info(
+                f"Pipeline stage '{self.name}': {self.processed} items ({self.dropped} dropped) on {self.workers} worker(s), "
+                f"utilization {utilization:.1f}%, input queue depth mean {mean_depth:.1f} / max {self.max_depth} "
+                f"(capacity {self.input.maxsize})"
+            )
+
+
+class StagedPipeline:
+    """
+    Chains PipelineStages with bounded queues: a full queue blocks the stage feeding it,
+    so a slow stage throttles the ones before it instead of letting work pile up.
+    """
+
+    def __init__(self, stages):
+        self.stages = stages
+
+    def _work(self, stage, next_stage):
+        while True:
+            item = stage.input.get()
+            if item is _END:
+                return
+            depth = stage.input.qsize()
+            start_time = time.perf_counter()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                performance_logger.error(f"Pipeline stage '{stage.name}' failed on {item!r}: {type(e).__name__}: {e}", exc_info=True)
+                result = None
+            stage._record(depth, time.perf_counter() - start_time, result is None)
+            if result is not None and next_stage is not None:
+                next_stage.input.put(result)  # Blocks while the next stage is saturated
+
+    def run(self, items, should_stop=lambda: False):
+        """Feeds items through every stage and returns once all of them are drained."""
+        start_time = time.perf_counter()
+        threads = []
+        for position, stage in enumerate(self.stages):
+            next_stage = self.stages[position + 1] if position + 1 < len(self.stages) else None
+            stage_threads = [
+                threading.Thread(target=self._work, args=(stage, next_stage), name=f"{stage.name}-{worker}", daemon=True)
+                for worker in range(stage.workers)
+            ]
+            for thread in stage_threads:
+                thread.start()
+            threads.append(stage_threads)
+
+        for item in items:
+            if should_stop():
+                break
+            self.stages[0].input.put(item)
+
+        # Shut the stages down in order, each once the previous one has emptied into it
+        for stage, stage_threads in zip(self.stages, threads):
+            for _ in stage_threads:
+                stage.input.put(_END)
+            for thread in stage_threads:
+                thread.join()
+
+        wall_seconds = time.perf_counter() - start_time
+        for stage in self.stages:
+            stage.log_stats(wall_seconds)
+
+
+def run_cv_ingestion(runner, manifest, warm_up=None, extract_workers=PIPELINE_EXTRACT_WORKERS, parse_workers=PIPELINE_PARSE_WORKERS,
+                     write_workers=PIPELINE_WRITE_WORKERS, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Extracts, parses and saves the CVs that need work in one pipeline, so text extraction
+    of the next CVs overlaps with LLM parsing of the current ones:
+    extract (process pool) -> parse (runner.parse) -> write (runner.finish).
+    runner is a batch_runner.BatchRunner; manifest records extractions (None extracts every file).
+    A file whose text cannot be extracted counts as a failed CV. If a worker process dies,
+    the pool is replaced and the files it was extracting are retried one process each.
+    warm_up() is called before the first item when there is anything to do.
+    Returns the number of CVs completed.
+    """
+    text_paths, files_to_extract, skipped_count = scan_cvs(manifest)
+    print(f" [PIPELINE] {len(files_to_extract)} file(s) to extract, {len(text_paths)} already extracted, {skipped_count} unchanged file(s) skipped")
+    extraction_pool = ProcessPoolExecutor(max_workers=extract_workers) if extract_workers > 1 and len(files_to_extract) > 1 else None
+    pool_lock = threading.Lock()
+
+    def extract_in_pool(source_path):
+        nonlocal extraction_pool
+        pool = extraction_pool
+        try:
+            return pool.submit(_extract_and_save_cv_isolated, source_path).result()
+        except BrokenProcessPool:
+            with pool_lock:
+                if extraction_pool is pool:  # First to notice: later items get a fresh pool
+                    print(" [PIPELINE] An extraction worker died; restarting the extraction pool")
+                    pool.shutdown()  # Waits until the old workers are gone, so none still writes a file retried below
+                    extraction_pool = ProcessPoolExecutor(max_workers=extract_workers)
+        # Any file in flight may have killed the worker, so this one is retried on its own
+        return _extract_in_own_process(source_path)
+
+    def extract(item):
+        source_path, fingerprint, text_path = item
+        if text_path is not None:
+            return text_path  # Extracted by an earlier run
+        try:
+            output_path = extract_in_pool(source_path) if extraction_pool is not None else _extract_and_save_cv_isolated(source_path)
+        except Exception as e:
+            output_path = None
+            print(f" ❌ Failed to preprocess {os.path.basename(source_path)}: {type(e).__name__}: {e}")
+        if output_path is None:
+            runner.record_failure(source_path, "text extraction failed")  # Still counts towards the run's total
+            return None
+        if manifest is not None:
+            manifest.record_extraction(source_path, fingerprint, output_path)
+            manifest.save()
+        return output_path
+
+    def parse(text_path):
+        if runner.stop_requested:
+            return None  # Left without parsed JSON, so the next run picks it up
+        parsed_data = runner.parse(text_path)
+        return None if parsed_data is None else (text_path, parsed_data)
+
+    def write(item):
+        runner.finish(*item)
+        return True
+
+    pipeline = StagedPipeline([
+        PipelineStage("extract", extract, extract_workers, queue_size),
+        PipelineStage("parse", parse, parse_workers, queue_size),
+        PipelineStage("write", write, write_workers, queue_size),
+    ])
+    items = [(None, None, text_path) for text_path in text_paths] + [(source_path, fingerprint, None) for source_path, fingerprint in files_to_extract]
+    if items and warm_up is not None:
+        warm_up()
+    runner.begin(len(items))
+    try:
+        with runner.stop_on_signals():
+            pipeline.run(items, should_stop=lambda: runner.stop_requested)
+    finally:
+        if extraction_pool is not None:
+            extraction_pool.shutdown()
+    if runner.stop_requested:
+        print(" [PIPELINE] Stopped early; the remaining CVs resume on the next run.")
+    return runner.completed
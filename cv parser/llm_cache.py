@@ -0,0 +1,153 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+from logger import performance_logger
+
+
+class LLMResponseCache:
+    """
+    Persistent, content-addressed cache of LLM responses stored in SQLite.
+    Entries are keyed by a hash of the model name, the chat messages (prompt and system
+    context) and the generation options. Once the stored responses exceed max_bytes the
+    least recently used entries are evicted.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Shared by the section worker threads; every access goes through self._lock
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, last_access REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, messages, **request_options):
+        """Returns the SHA-256 key for a request; request_options covers options, format etc."""
+        payload = json.dumps(
+            {"model": model, "messages": messages, "request_options": request_options},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response for key (refreshing its LRU position) or None."""
+        with self._lock:
+            row = self._connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, response):
+        """Stores a response and evicts least recently used entries if over max_bytes."""
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            previous = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, size, time.time())
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Deletes the least recently used entries until the cache fits in max_bytes."""
+        evicted = 0
+        rows = self._connection.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._total_bytes -= size
+            evicted += 1
+        performance_logger.info(f"LLM cache: evicted {evicted} least recently used entries ({self._total_bytes / 1e6:.2f} MB kept)")
+
+    def log_stats(self):
+        """Writes the hit/miss counters and cache size to the performance log."""
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0.0
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        performance_logger.info(
+            f"LLM cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+            f"{entries} entries, {self._total_bytes / 1e6:.2f} MB of {self.max_bytes / 1e6:.0f} MB"
+        )
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of embedding vectors stored in SQLite.
+    Vectors are keyed by embedding model and a SHA-256 hash of the embedded text and
+    stored as float32 blobs, so a chunk is only ever embedded once across runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT, text_hash TEXT, dimensions INTEGER, vector BLOB, PRIMARY KEY (model, text_hash))"
+        )
+
+    @staticmethod
+    def text_hash(text):
+        """Returns the SHA-256 hex digest identifying a text."""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get_many(self, model, text_hashes):
+        """Returns {text_hash: vector} for the hashes already cached for model."""
+        found = {}
+        with self._lock:
+            for text_hash in text_hashes:
+                row = self._connection.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?", (model, text_hash)
+                ).fetchone()
+                if row is not None:
+                    found[text_hash] = array('f', row[0]).tolist()
+            self.hits += len(found)
+            self.misses += len(text_hashes) - len(found)
+        return found
+
+    def put_many(self, model, vectors_by_hash):
+        """Stores {text_hash: vector} for model in one transaction."""
+        rows = [
+            (model, text_hash, len(vector), array('f', vector).tobytes())
+            for text_hash, vector in vectors_by_hash.items()
+        ]
+        with self._lock:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dimensions, vector) VALUES (?, ?, ?, ?)", rows
+            )
+            self._connection.execute("COMMIT")
+
+    def log_stats(self):
+        """Writes the hit/miss counters and number of stored vectors to the performance log."""
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        performance_logger.info(f"Embedding cache: {self.hits} hits, {self.misses} misses, {entries} vectors stored")
@@ -1,53 +1,363 @@
 # llm_parser.py
-import ollama
+import contextvars
 import json
 import re
-from config import OLLAMA_HOST, OLLAMA_MODEL_NAME, OLLAMA_EMBEDDING_MODEL_NAME
-from logger import time_function
-# Initialize Ollama client
+import textwrap
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import ollama
+from config import OLLAMA_HOSTS, OLLAMA_MODEL_NAME, OLLAMA_EMBEDDING_MODEL_NAME, OLLAMA_KEEP_ALIVE, OLLAMA_NUM_THREAD, LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, EMBEDDING_BATCH_SIZE, EMBEDDING_CACHE_PATH
+from config import MODEL_ROUTING_ENABLED, MODEL_TIERS, DEFAULT_MODEL_TIER, SECTION_MODEL_TIERS
+from config import LLM_SECTION_DEADLINES, LLM_DEFAULT_DEADLINE, LLM_MAX_RETRIES, LLM_HEDGING_ENABLED
+from config import GENERATION_DEFAULTS, GENERATION_PROFILES, LLM_MAX_CONCURRENCY, LLM_STRUCTURED_OUTPUT, LLM_STREAMING, MAP_REDUCE_CHUNK_SIZE, MAP_REDUCE_CHUNK_OVERLAP
+from logger import performance_logger, time_function
+from llm_cache import LLMResponseCache, EmbeddingCache
+from ollama_pool import OllamaPool
+from call_policy import CircuitBreaker, LatencyTracker, CallPolicyStats, backoff_delay, run_with_deadline
+from llm_scheduler import PriorityScheduler
+from metrics import registry, current_cv
+from text_chunker import chunk_text
+# Initialize Ollama client (a pool over OLLAMA_HOSTS with the ollama.Client call interface)
 client = None  
 try:
-    client = ollama.Client(host=OLLAMA_HOST)
+    client = OllamaPool(OLLAMA_HOSTS)
     
 except Exception as e:
-    print(f"Error connecting to Ollama at {OLLAMA_HOST}: {e}")
+    print(f"Error connecting to Ollama at {', '.join(OLLAMA_HOSTS)}: {e}")
     print("Please ensure Ollama is running and the specified model is downloaded.")
     client = None # Set client to None if connection fails
 
+# Failure handling shared by every _call_ollama call (see call_policy.py)
+circuit_breaker = CircuitBreaker()
+latency_tracker = LatencyTracker()
+call_policy_stats = CallPolicyStats()
+
+# Every _call_ollama request waits here for a slot, interactive calls ahead of batch ones
+scheduler = PriorityScheduler()
+
+# Persistent cache of LLM responses, shared by every _call_ollama call
+response_cache = LLMResponseCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES) if LLM_CACHE_ENABLED else None
+
+# Persistent cache of embedding vectors, shared by every get_embeddings call
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH)
+
+
+# Fixed prefix of the system message that carries the resume text. Keeping it (and the
+# context that follows) byte-identical across the section calls for one CV lets Ollama
+# reuse the already evaluated prompt prefix from its KV cache.
+RESUME_CONTEXT_PREFIX = "Here is the relevant text context to extract information from:\n\n"
+
+
+def _build_messages(prompt, context=None):
+    """
+    Assembles the chat messages for one call. The context is sent exactly once, as the
+    leading system message, and the section instructions follow as the user message.
+    """
+    messages = []
+    if context:
+        messages.append({"role": "system", "content": RESUME_CONTEXT_PREFIX + context})
+    messages.append({"role": "user", "content": textwrap.dedent(prompt).strip()})
+    return messages
+
+
+def _log_token_usage(response, model, section):
+    """Logs the prompt/completion token counts Ollama reports for a finished call."""
+    prompt_tokens = response.get('prompt_eval_count')
+    completion_tokens = response.get('eval_count')
+    prompt_eval_seconds = (response.get('prompt_eval_duration') or 0) / 1e9
+    registry.inc("llm_prompt_tokens_total", prompt_tokens or 0, "Prompt tokens evaluated", section=section, model=model, cv=current_cv())
+    registry.inc("llm_completion_tokens_total", completion_tokens or 0, "Tokens generated", section=section, model=model, cv=current_cv())
+    performance_logger.info(
+        f"LLM call [{section or 'unlabelled'}] ({model}): prompt tokens={prompt_tokens}, "
+        f"completion tokens={completion_tokens}, prompt eval={prompt_eval_seconds:.2f}s"
+    )
+
+
+def generation_options(section=None):
+    """Ollama options for a call: GENERATION_DEFAULTS overridden by the section's profile."""
+    options = {**GENERATION_DEFAULTS, **GENERATION_PROFILES.get(section, {})}
+    if OLLAMA_NUM_THREAD:
+        options["num_thread"] = OLLAMA_NUM_THREAD
+    return options
+
 
 @time_function
-def _call_ollama(prompt, model=OLLAMA_MODEL_NAME, context=None):
-    """Helper function to call Ollama model with error handling."""
+def warm_up_models(embedding=False):
+    """
+    Loads the chat model of every tier (and the embedding model when `embedding` is set)
+    before the first CV, with the same num_ctx every call uses and OLLAMA_KEEP_ALIVE, so each
+    model is loaded once per batch instead of on its first section call or after an eviction.
+    """
     if client is None:
-        return None # Return None if client wasn't initialized
+        return
+    chat_models = set(MODEL_TIERS.values()) if MODEL_ROUTING_ENABLED else {OLLAMA_MODEL_NAME}
+    try:
+        for model in sorted(chat_models):
+            # An empty prompt only loads the model (on every host in the pool)
+            client.broadcast("generate", model=model, prompt="", keep_alive=OLLAMA_KEEP_ALIVE, options=generation_options())
+        if embedding:
+            client.broadcast("embed", model=OLLAMA_EMBEDDING_MODEL_NAME, input=["warm-up"], keep_alive=OLLAMA_KEEP_ALIVE)
+    except Exception as e:
+        print(f"Error warming up OLLAMA models at {', '.join(OLLAMA_HOSTS)}: {type(e).__name__}: {e}")
+
+
+# --- Streaming ---
+_JSON_STRUCTURE_PATTERN = re.compile(r'[\[\]{}"\\]')
+# Text that may precede the JSON value: nothing but whitespace, or a ```json fence
+_JSON_LEAD_PATTERN = re.compile(r'\s*(?:```(?:json)?\s*)?', re.IGNORECASE)
 
-    messages = [{"role": "user", "content": prompt}]
-    if context:
-        # Prepend context as a system message for better instruction following
-        messages.insert(0, {"role": "system", "content": f"Here is the relevant text context to extract information from:\n\n{context}"})
 
+class JsonCompletionTracker:
+    """
+    Follows streamed LLM output and finds where the first top-level JSON array or object
+    closes, tracking bracket depth, strings and escapes across piece boundaries.
+    Only a value that starts the reply or directly follows a ```json fence counts, so
+    brackets in prose before the JSON (e.g. "the skills [as requested]:") are ignored.
+    After feed() returns True, text[start:end] of the joined pieces is that JSON value.
+    """
+
+    def __init__(self):
+        self.start = -1
+        self.end = -1
+        self._offset = 0  # Position of the next piece in the joined text
+        self._depth = 0
+        self._in_string = False
+        self._escaped_position = -1
+        self._lead = []  # Pieces seen before the JSON value started
+        self.gave_up = False  # The reply does not start with JSON, so it is never cut off
+
+    def feed(self, piece):
+        """Consumes the next piece of output; returns True once the JSON value is complete."""
+        if self.gave_up:
+            return False
+        for match in _JSON_STRUCTURE_PATTERN.finditer(piece):
+            position = self._offset + match.start()
+            char = match.group(0)
+            if self._in_string:
+                if position == self._escaped_position:
+                    continue
+                if char == '\\':
+                    self._escaped_position = position + 1
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                if self._depth:
+                    self._in_string = True
+            elif char in '[{':
+                if not self._depth:
+                    lead = ''.join(self._lead) + piece[:match.start()]
+                    if not _JSON_LEAD_PATTERN.fullmatch(lead):
+                        self.gave_up = True
+                        return False
+                    self.start = position
+                self._depth += 1
+            elif char in ']}' and self._depth:
+                self._depth -= 1
+                if not self._depth:
+                    self.end = position + 1
+                    return True
+        if self.start < 0:
+            self._lead.append(piece)
+        self._offset += len(piece)
+        return False
+
+
+def _stream_chat(model, messages, section, request_options, stop_at_json, cancel_event=None):
+    """
+    Streams a chat completion and returns its text. With stop_at_json the stream is closed
+    as soon as a complete top-level JSON value has arrived, which makes Ollama stop
+    generating, and only that value is returned. Logs time-to-first-token and tokens/s.
+    Setting cancel_event (deadline passed, or a hedged request won) closes the stream at the
+    next chunk and returns None.
+    Returns (text, stopped_early).
+    """
+    tracker = JsonCompletionTracker() if stop_at_json else None
+    pieces = []
+    token_count = 0
+    first_token_time = None
+    stopped_early = False
+    usage_logged = False
+    request_start_time = time.perf_counter()
+    stream = client.chat(model=model, messages=messages, stream=True, keep_alive=OLLAMA_KEEP_ALIVE, **request_options)
     try:
-        response = client.chat(
-            model=model,
-            messages=messages,
-            stream=False # We want the full response
+        for chunk in stream:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            piece = chunk['message']['content']
+            if piece:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                token_count += 1  # Ollama streams one token per chunk
+                pieces.append(piece)
+                if tracker is not None and tracker.feed(piece):
+                    stopped_early = True
+                    break
+            if chunk.get('done'):
+                _log_token_usage(chunk, model, section)
+                usage_logged = True
+    finally:
+        stream.close()  # Drops the connection, so an early stop also ends generation on the server
+    end_time = time.perf_counter()
+
+    content = ''.join(pieces)
+    if stopped_early:
+        content = content[tracker.start:tracker.end]
+    if not usage_logged and token_count:
+        # Closed before the final chunk, which carries Ollama's counts: use the streamed count
+        _log_token_usage({'eval_count': token_count}, model, section)
+    if first_token_time is not None:
+        registry.observe("llm_time_to_first_token_seconds", first_token_time - request_start_time, "Time to the first streamed token", section=section, model=model)
+        decode_seconds = end_time - first_token_time
+        tokens_per_second = (token_count - 1) / decode_seconds if decode_seconds > 0 else 0.0
+        performance_logger.info(
+            f"LLM stream [{section or 'unlabelled'}] ({model}): time to first token={first_token_time - request_start_time:.2f}s, "
+            f"{token_count} tokens at {tokens_per_second:.1f} tokens/s"
+            + (", stopped after the complete JSON value" if stopped_early else "")
         )
-        return response['message']['content']
-    except Exception as e:
-        print(f"Error calling OLLAMA ({model}) at {OLLAMA_HOST}: {type(e).__name__}: {e}")
-        return None
+    return content, stopped_early
+
+
+def _chat_attempt(model, messages, section, request_options, expect_json, cancel_event):
+    """One request to Ollama; the unit that _call_ollama times out, retries and hedges. Returns (text, stopped_early)."""
+    if LLM_STREAMING:
+        return _stream_chat(model, messages, section, request_options, stop_at_json=expect_json, cancel_event=cancel_event)
+    response = client.chat(
+        model=model,
+        messages=messages,
+        stream=False, # We want the full response
+        keep_alive=OLLAMA_KEEP_ALIVE,
+        **request_options
+    )
+    _log_token_usage(response, model, section)
+    return response['message']['content'], False
+
+
+def _is_retryable(error):
+    """Timeouts, connection problems and server errors are retried; bad requests (e.g. unknown model) are not."""
+    status_code = getattr(error, 'status_code', None)
+    return not (isinstance(error, ollama.ResponseError) and status_code is not None and 0 < status_code < 500)
+
+
+@time_function
+def _call_ollama(prompt, model=OLLAMA_MODEL_NAME, context=None, section=None, use_cache=True, format=None, expect_json=False):
+    """
+    Helper function to call Ollama model with error handling.
+    Responses are served from / stored in the persistent response cache unless
+    use_cache is False or the cache is disabled in config.
+    format is passed on to Ollama ("json" or a JSON schema) to constrain decoding.
+    With LLM_STREAMING the reply is streamed, and with expect_json it is cut off right
+    after the first complete JSON array or object.
+    Each attempt is abandoned after the section's deadline (LLM_SECTION_DEADLINES) and
+    retried with jittered backoff; with LLM_HEDGING_ENABLED a second request is sent once an
+    attempt runs past the section's p95 latency. Returns None once every attempt failed or
+    while the circuit breaker is open.
+    Each attempt first waits for a scheduler slot in the caller's priority class (see
+    llm_scheduler.py); the deadline only counts from when the request is sent.
+    """
+    messages = _build_messages(prompt, context)
+    request_options = {"options": generation_options(section)}
+    if format is not None:
+        request_options["format"] = format
+
+    label = section or 'unlabelled'
+    cache_key = None
+    if use_cache and response_cache is not None:
+        cache_key = response_cache.make_key(model, messages, **request_options)
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            registry.inc("llm_calls_total", 1, "LLM calls by outcome", section=label, model=model, outcome="cache_hit")
+            performance_logger.info(f"LLM cache hit [{label}] ({model}): hits={response_cache.hits}, misses={response_cache.misses}")
+            return cached_response
+
+    if client is None:
+        return None # Return None if client wasn't initialized
+
+    deadline = LLM_SECTION_DEADLINES.get(section, LLM_DEFAULT_DEADLINE)
+    latency_key = (section, model)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        if not circuit_breaker.allow():
+            print(f"Skipping OLLAMA call [{label}] ({model}): circuit open after repeated failures")
+            registry.inc("llm_calls_total", 1, "LLM calls by outcome", section=label, model=model, outcome="circuit_open")
+            return None
+        hedge_after = latency_tracker.p95(latency_key) if LLM_HEDGING_ENABLED else None
+        priority = scheduler.wait_for_slot(label)
+
+        def attempt_with_slot(cancel_event):
+            # Each request gives its scheduler slot back only once it has really ended, so an
+            # abandoned (timed-out or out-hedged) request still counts against the slots
+            attempt_start_time = time.perf_counter()
+            try:
+                return _chat_attempt(model, messages, section, request_options, expect_json, cancel_event)
+            finally:
+                scheduler.release(priority, time.perf_counter() - attempt_start_time)
+
+        start_time = time.perf_counter()
+        try:
+            content, stopped_early = run_with_deadline(
+                attempt_with_slot, deadline, hedge_after=hedge_after, hedge_gate=lambda: scheduler.try_acquire(priority),
+                label=label, stats=call_policy_stats
+            )
+        except Exception as e:
+            if _is_retryable(e):
+                circuit_breaker.record_failure()
+            else:
+                circuit_breaker.record_success()  # The server answered; a bad request (e.g. a model not pulled) says nothing about its health
+            registry.inc("llm_attempt_errors_total", 1, "Failed LLM attempts by error type", section=label, model=model, error=type(e).__name__)
+            print(f"Error calling OLLAMA [{label}] ({model}) at {', '.join(OLLAMA_HOSTS)} (attempt {attempt + 1}/{LLM_MAX_RETRIES + 1}): {type(e).__name__}: {e}")
+            if attempt == LLM_MAX_RETRIES or not _is_retryable(e):
+                registry.inc("llm_calls_total", 1, "LLM calls by outcome", section=label, model=model, outcome="error")
+                return None
+            call_policy_stats.count("retries")
+            time.sleep(backoff_delay(attempt))
+            continue
+        circuit_breaker.record_success()
+        request_seconds = time.perf_counter() - start_time
+        latency_tracker.record(latency_key, request_seconds)
+        registry.observe("llm_request_seconds", request_seconds, "LLM request time, excluding queue wait", section=label, model=model)
+        registry.inc("llm_calls_total", 1, "LLM calls by outcome", section=label, model=model, outcome="ok")
+        if cache_key is not None and content and (not stopped_early or _is_valid_json(content)):
+            response_cache.put(cache_key, model, content)  # A cut-off reply is only cached if it parses
+        return content
+
+
+def _is_valid_json(text):
+    try:
+        json.loads(text)
+        return True
+    except json.JSONDecodeError:
+        return False
+
+
+def log_section_latencies():
+    """Writes p50/p95/p99 of the LLM request time (excluding queue wait) per section and model to the performance log."""
+    for record in registry.snapshot():
+        if record["name"] == "llm_request_seconds":
+            labels = record["labels"]
+            performance_logger.info(
+                f"LLM latency [{labels['section']}] ({labels['model']}): {record['count']} requests, "
+                f"p50 {record['p50']:.2f}s, p95 {record['p95']:.2f}s, p99 {record['p99']:.2f}s"
+            )
 
     
-def _parse_llm_json_output(llm_output):
+def _parse_llm_json_output(llm_output, prefer_object=False):
     """
     Robustly extracts the first valid JSON block (array or object) from the LLM output.
     Handles extra text, markdown, multiple JSON snippets.
+    With prefer_object=True, object-like JSON is tried before array-like JSON, so an
+    array nested inside the expected object is not returned on its own.
     """
     if not llm_output:
         return None
 
     llm_output = llm_output.strip()
 
+    # Step 0: The whole output may already be valid JSON
+    try:
+        return json.loads(llm_output)
+    except json.JSONDecodeError:
+        pass
+
     # Step 1: Try extracting from ```json ... ``` block
     match = re.search(r'```json\s*(.*?)\s*```', llm_output, re.DOTALL)
     if match:
@@ -58,20 +368,16 @@ def _parse_llm_json_output(llm_output):
             pass  # Try fallbacks
 
     # Step 2: Try first valid array-like JSON
-    arrays = re.findall(r'(\[\s*[\s\S]*?\])', llm_output)
-    for arr in arrays:
-        try:
-            return json.loads(arr)
-        except json.JSONDecodeError:
-            continue
-
     # Step 3: Try object-like JSON
-    objects = re.findall(r'(\{\s*[\s\S]*?\})', llm_output)
-    for obj in objects:
-        try:
-            return json.loads(obj)
-        except json.JSONDecodeError:
-            continue
+    patterns = [r'(\[\s*[\s\S]*?\])', r'(\{\s*[\s\S]*?\})']
+    if prefer_object:
+        patterns.reverse()
+    for pattern in patterns:
+        for candidate in re.findall(pattern, llm_output):
+            try:
+                return json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
 
     # Step 4: Try last resort fallback — clean and try parsing entire string
     try:
@@ -82,34 +388,217 @@ def _parse_llm_json_output(llm_output):
         print(f"⚠️ Raw LLM output (first 300 chars):\n{llm_output[:300]}...\n")
         return None
 
+
+# --- Structured (schema-constrained) JSON output ---
+# With LLM_STRUCTURED_OUTPUT the schema of each section is sent as Ollama's `format`, so the
+# server only samples JSON of that shape and one json.loads parses the reply.
+_STRING = {"type": "string"}
+
+
+def _object_array_schema(properties):
+    """Schema of a JSON array of objects that carry every one of the given properties."""
+    return {
+        "type": "array",
+        "items": {"type": "object", "properties": properties, "required": list(properties)},
+    }
+
+
+SECTION_SCHEMAS = {
+    "skills": {"type": "array", "items": _STRING},
+    "experience": _object_array_schema({
+        "title": _STRING, "company": _STRING, "start_date": _STRING, "end_date": _STRING, "description": _STRING,
+    }),
+    "education": _object_array_schema({"degree": _STRING, "institution": _STRING, "year": _STRING}),
+    "projects": _object_array_schema({
+        "project_name": _STRING, "client_company": _STRING, "role": _STRING, "description": _STRING,
+        "technologies_used": {"type": "array", "items": _STRING},
+    }),
+    "certifications": _object_array_schema({"name": _STRING, "issuing_body": _STRING, "dates": _STRING}),
+    "languages": _object_array_schema({"language": _STRING, "speaking": _STRING, "reading": _STRING, "writing": _STRING}),
+}
+
+
+def combined_schema(sections):
+    """Schema of the combined extraction object, limited to the requested sections."""
+    properties = {section: _STRING if section == "name" else SECTION_SCHEMAS[section] for section in sections}
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+class StructuredOutputStats:
+    """Per section: how many replies were parsed, how many needed the text scraper and the time spent parsing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.parsed = {}
+        self.fallbacks = {}
+        self.failures = {}
+        self.parse_seconds = {}
+
+    def record(self, section, used_fallback, failed, seconds):
+        with self._lock:
+            self.parsed[section] = self.parsed.get(section, 0) + 1
+            self.fallbacks[section] = self.fallbacks.get(section, 0) + int(used_fallback)
+            self.failures[section] = self.failures.get(section, 0) + int(failed)
+            self.parse_seconds[section] = self.parse_seconds.get(section, 0.0) + seconds
+
+    def log_stats(self):
+        """Writes the per-section fallback / failure rates and parse times to the performance log."""
+        with self._lock:
+            for section, count in self.parsed.items():
+                performance_logger.info(
+                    f"JSON parsing [{section}]: {count} replies, {self.fallbacks[section]} needed the scraper "
+                    f"({self.fallbacks[section] / count * 100:.1f}%), {self.failures[section]} unparseable "
+                    f"({self.failures[section] / count * 100:.1f}%), {self.parse_seconds[section] * 1000:.2f} ms parsing in total"
+                )
+
+
+parse_stats = StructuredOutputStats()
+
+
+def _parse_section_output(section, llm_output, structured, prefer_object=False):
+    """
+    Parses an LLM reply into JSON. Schema-constrained replies (structured=True) take a
+    single json.loads; anything else, or a reply json.loads rejects (e.g. truncated by
+    the token limit), goes through the _parse_llm_json_output scraper.
+    """
+    start_time = time.perf_counter()
+    parsed_data = None
+    used_fallback = False
+    if llm_output:
+        if structured:
+            try:
+                parsed_data = json.loads(llm_output)
+            except json.JSONDecodeError:
+                used_fallback = True
+        if not structured or used_fallback:
+            parsed_data = _parse_llm_json_output(llm_output, prefer_object=prefer_object)
+    parse_stats.record(section, used_fallback, parsed_data is None, time.perf_counter() - start_time)
+    return parsed_data
+
+
+def _call_ollama_json(prompt, section, schema, context=None, model=None, prefer_object=False):
+    """
+    Calls the LLM for a JSON answer, constrained to schema when LLM_STRUCTURED_OUTPUT is on,
+    and parses it. Without an explicit model the call is routed by tier (see route_model_call).
+    """
+    format = schema if LLM_STRUCTURED_OUTPUT else None
+
+    def call(tier_model):
+        llm_output = _call_ollama(prompt, model=tier_model, context=context, section=section, format=format, expect_json=True)
+        return _parse_section_output(section, llm_output, structured=format is not None, prefer_object=prefer_object)
+
+    if model is not None:
+        return call(model)
+    return route_model_call(section, call)
+
+
+# --- Model tier routing ---
+class ModelRoutingStats:
+    """Per model tier: calls, total latency and how many outputs were escalated to the next tier."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.seconds = {}
+        self.escalations = {}
+
+    def record(self, tier, seconds, escalated):
+        with self._lock:
+            self.calls[tier] = self.calls.get(tier, 0) + 1
+            self.seconds[tier] = self.seconds.get(tier, 0.0) + seconds
+            self.escalations[tier] = self.escalations.get(tier, 0) + int(escalated)
+
+    def log_stats(self):
+        """Writes the per-tier latency and escalation rate to the performance log."""
+        with self._lock:
+            for tier, count in self.calls.items():
+                performance_logger.info(
+                    f"Model tier '{tier}' ({MODEL_TIERS.get(tier, OLLAMA_MODEL_NAME)}): {count} calls, "
+                    f"mean latency {self.seconds[tier] / count:.2f}s, {self.escalations[tier]} escalated "
+                    f"({self.escalations[tier] / count * 100:.1f}%)"
+                )
+
+
+routing_stats = ModelRoutingStats()
+
+
+def section_model_tiers(section):
+    """The tiers a section may use, starting with its own tier and ending with the largest."""
+    tiers = list(MODEL_TIERS)
+    return tiers[tiers.index(SECTION_MODEL_TIERS.get(section, DEFAULT_MODEL_TIER)):]
+
+
+def route_model_call(section, call, is_valid=None):
+    """
+    Runs call(model) on the section's model tier and escalates to the next larger tier for
+    as long as is_valid(result) fails (validate_section by default). With routing disabled
+    the call goes to OLLAMA_MODEL_NAME once.
+    """
+    if not MODEL_ROUTING_ENABLED:
+        return call(OLLAMA_MODEL_NAME)
+    if is_valid is None:
+        is_valid = (lambda result: validate_section(section, result)) if section in SECTION_EXTRACTORS else (lambda result: isinstance(result, (dict, list)))
+    tiers = section_model_tiers(section)
+    for position, tier in enumerate(tiers):
+        start_time = time.perf_counter()
+        result = call(MODEL_TIERS[tier])
+        escalate = position + 1 < len(tiers) and not is_valid(result)
+        routing_stats.record(tier, time.perf_counter() - start_time, escalate)
+        if not escalate:
+            return result
+        performance_logger.info(f"    Escalating [{section}] from tier '{tier}' to '{tiers[position + 1]}' after failed validation")
+
+
+@time_function
+def get_embeddings(texts, model=OLLAMA_EMBEDDING_MODEL_NAME, batch_size=EMBEDDING_BATCH_SIZE):
+    """
+    Generates embeddings for a list of texts, returned in the same order (None where
+    embedding failed). Identical texts are embedded once, vectors already in the
+    embedding cache are reused, and the rest are sent batch_size texts per embed request.
+    """
+    text_hashes = [embedding_cache.text_hash(text) for text in texts]
+    unique_texts = dict(zip(text_hashes, texts))  # De-duplicates identical texts
+    vectors = embedding_cache.get_many(model, list(unique_texts))
+
+    missing_hashes = [text_hash for text_hash in unique_texts if text_hash not in vectors]
+    if missing_hashes and client is not None:
+        for start in range(0, len(missing_hashes), batch_size):
+            batch_hashes = missing_hashes[start:start + batch_size]
+            try:
+                response = client.embed(model=model, input=[unique_texts[text_hash] for text_hash in batch_hashes], keep_alive=OLLAMA_KEEP_ALIVE)
+            except Exception as e:
+                print(f"Error generating embeddings with OLLAMA ({model}): {type(e).__name__}: {e}")
+                continue
+            new_vectors = dict(zip(batch_hashes, response['embeddings']))
+            embedding_cache.put_many(model, new_vectors)
+            vectors.update(new_vectors)
+
+    performance_logger.info(
+        f"Embeddings ({model}): {len(texts)} texts, {len(unique_texts)} unique, "
+        f"{len(unique_texts) - len(missing_hashes)} cached, {len(missing_hashes)} requested"
+    )
+    return [vectors.get(text_hash) for text_hash in text_hashes]
+
 def get_embedding(text):
     """Generates an embedding for the given text using the specified embedding model."""
-    if client is None:
-        return None
-    try:
-        response = client.embeddings(
-            model=OLLAMA_EMBEDDING_MODEL_NAME,
-            prompt=text
-        )
-        return response['embedding']
-    except Exception as e:
-        print(f"Error generating embedding with OLLAMA ({OLLAMA_EMBEDDING_MODEL_NAME}): {e}")
-        return None
+    return get_embeddings([text])[0]
  
 
 # --- LLM Parsing Functions for specific fields ---
 @time_function
 def extract_name_with_llm(text_context):
     """Extracts the full name from the given text context."""
-    prompt = f"""
+    prompt = """
     Based on the following resume text, extract ONLY the full name of the candidate.
     Return only the name string, without any additional text, labels, or punctuation.
     If the name is not clearly identifiable, return "N/A".
-
-    Context:
-    {text_context}
     """
-    name = _call_ollama(prompt, context=text_context)
+    # A small model that answers with more than a name (or nothing) is escalated
+    name = route_model_call(
+        "name",
+        lambda model: _call_ollama(prompt, model=model, context=text_context, section="name"),
+        is_valid=lambda name: validate_section("name", name) and len(name.split()) <= 6 and '\n' not in name.strip(),
+    )
     return name.strip() if name else "N/A"
 
 @time_function
@@ -118,7 +607,7 @@ def extract_skills_with_llm(text_context):
     Extracts a list of skills from the given text context.
     Returns a JSON array of strings.
     """
-    prompt = f"""
+    prompt = """
     From the provided resume text, identify and list all distinct technical skills, programming languages, software, tools, and methodologies. Focus on the candidate's actual technical abilities and proficiency, typically found in a 'Skills' or 'Technical Expertise' section, or explicitly mentioned in job descriptions.
     Return the skills as a JSON array of strings. Each string should be a single skill.
     If no relevant skills are found, return an empty JSON array: [].
@@ -134,12 +623,8 @@ def extract_skills_with_llm(text_context):
         "Cloud Computing (AWS)"
     ]
     ```
-
-    Resume Context:
-    {text_context}
     """
-    llm_output = _call_ollama(prompt, context=text_context)
-    parsed_data = _parse_llm_json_output(llm_output)
+    parsed_data = _call_ollama_json(prompt, "skills", SECTION_SCHEMAS["skills"], context=text_context)
     # Ensure it's a list, otherwise return empty
     return parsed_data if isinstance(parsed_data, list) else []
 
@@ -150,7 +635,7 @@ def extract_experience_with_llm(text_context):
     EXCLUDING project or assignment-based experience.
     Returns a JSON array of objects.
     """
-    prompt = f"""
+    prompt = """
     From the provided resume text, extract ONLY formal work experience entries.
     Focus exclusively on instances where the candidate held a specific 'title' at a 'company' (employer) during a defined period ('start_date' and 'end_date').
     **DO NOT include any entries that describe projects, assignments, freelancing, or client-based work. Focus strictly on traditional employment history.**
@@ -168,34 +653,31 @@ def extract_experience_with_llm(text_context):
     Example JSON format for multiple entries (focus on formal employment, and strict date formats):
     ```json
     [
-        {{
+        {
             "title": "Principal Pavement Engineer",
             "company": "ADG Mobility Pvt. Ltd., India",
             "start_date": "2021-11",
             "end_date": "Present",
             "description": "Responsible for detailed engineering design of pavements, project management, and quality control."
-        }},
-        {{
+        },
+        {
             "title": "Lecturer",
             "company": "Eduardo Mondlane University",
             "start_date": "1987-01",
             "end_date": "1997-12",
             "description": "Taught various civil engineering subjects and supervised student projects."
-        }},
-        {{
+        },
+        {
             "title": "Head of Pavement Design",
             "company": "Infrastructure Solutions Inc.",
             "start_date": "2015-03",
             "end_date": "2021-10",
             "description": "Managed a team of engineers, oversaw pavement design projects from conceptualization to completion."
-        }}
+        }
     ]
     ```
-    Resume Context:
-    {text_context}
     """
-    llm_output = _call_ollama(prompt, context=text_context) # Use unified call
-    parsed_data = _parse_llm_json_output(llm_output)
+    parsed_data = _call_ollama_json(prompt, "experience", SECTION_SCHEMAS["experience"], context=text_context)
     return parsed_data if isinstance(parsed_data, list) else []
 
 @time_function
@@ -204,7 +686,7 @@ def extract_education_with_llm(text_context):
     Extracts a list of education entries from the given text context.
     Returns a JSON array of objects.
     """
-    prompt = f"""
+    prompt = """
     From the provided resume text, extract ALL education entries.
     For each entry, extract the following:
     - 'degree': The full degree obtained (e.g., "Master of Science in Computer Science").
@@ -216,24 +698,20 @@ def extract_education_with_llm(text_context):
     Example JSON format:
     ```json
     [
-        {{
+        {
             "degree": "Master of Technology (M. Tech.) in Transportation Systems Engineering",
             "institution": "Indian Institute of Technology (IIT), Bombay",
             "year": "1990"
-        }},
-        {{
+        },
+        {
             "degree": "Bachelor of Engineering (B.E.) (Civil) Hons",
             "institution": "Malviya National Institute of Technology (MNIT), Jaipur, Rajasthan, India",
             "year": "1987"
-        }}
+        }
     ]
     ```
-
-    Resume Context:
-    {text_context}
     """
-    llm_output = _call_ollama(prompt, context=text_context) 
-    parsed_data = _parse_llm_json_output(llm_output)
+    parsed_data = _call_ollama_json(prompt, "education", SECTION_SCHEMAS["education"], context=text_context)
     return parsed_data if isinstance(parsed_data, list) else []
 
 @time_function
@@ -242,7 +720,7 @@ def extract_projects_with_llm(text_context):
     Extracts project entries.
     Returns a JSON array of objects.
     """
-    prompt = f"""
+    prompt = """
     From the following resume text, extract all relevant project entries. Each entry should include:
     - project_name or Name of assignment (the name of the project)
     - client_company (Optional) The name of the client company or organization for whom the project was done. If not explicitly mentioned, infer or return "N/A".
@@ -255,35 +733,31 @@ def extract_projects_with_llm(text_context):
     Example JSON format:
     ```json
     [
-        {{
+        {
             "project_name": "E-commerce Recommendation System",
             "client_company": "Retail Innovations Inc.",
             "role": "Lead Developer",
             "description": "Developed a real-time recommendation engine using collaborative filtering; Improved user engagement by 15%.",
             "technologies_used": ["Python", "TensorFlow", "Kafka", "PostgreSQL"]
-        }},
-        {{
+        },
+        {
             "project_name": "Personal Portfolio Website",
             "client_company": "Self-project",
             "role": "Full-stack Developer",
             "description": "Built and deployed a personal portfolio site showcasing projects and skills.",
             "technologies_used": ["React", "Node.js", "MongoDB", "AWS S3"]
-        }},
-        {{
+        },
+        {
             "project_name": "Road Construction Project in Mozambique",
             "client_company": "ADMINISTRAÇÃO NACIONAL DE ESTRADAS, I.P., MOZAMBIQUE",
             "role": "Geotechnical/Materials Engineer",
             "description": "Preparation of Feasibility Study, Conceptual Design, Environmental and Social Impact Assessment, Resettlement Action Plan, Bidding Documents and Procurement Support for civil works under design and build methodology for roads N381, N380, and N762 in Cabo Delgado province, Mozambique.",
             "technologies_used": ["Design and Build Methodology", "Feasibility Study", "Environmental Impact Assessment"]
-        }}
+        }
     ]
     ```
-
-    Resume Context:
-    {text_context}
     """
-    llm_output = _call_ollama(prompt, context=text_context) # Use unified call
-    parsed_data = _parse_llm_json_output(llm_output)
+    parsed_data = _call_ollama_json(prompt, "projects", SECTION_SCHEMAS["projects"], context=text_context)
     return parsed_data if isinstance(parsed_data, list) else []
 
 @time_function
@@ -292,7 +766,7 @@ def extract_certifications_with_llm(text_context):
     Extracts a list of certifications from the given text context.
     Returns a JSON array of objects.
     """
-    prompt = f"""
+    prompt = """
     From the provided resume text, identify and extract ALL distinct certifications, professional licenses, and formal training programs and also if the resume has heading i.e Other Training.
     For each entry, include:
     - 'name': The full name of the certification or training.
@@ -304,29 +778,25 @@ def extract_certifications_with_llm(text_context):
     Example JSON format for multiple entries:
     ```json
     [
-        {{
+        {
             "name": "Project Management Professional (PMP)",
             "issuing_body": "PMI",
             "dates": "2021-08"
-        }},
-        {{
+        },
+        {
             "name": "AWS Certified Solutions Architect - Associate",
             "issuing_body": "Amazon Web Services",
             "dates": "2023-12-Expiration"
-        }},
-        {{
+        },
+        {
             "name": "Sub – Urban Railway System, Training",
             "issuing_body": "Indian Railway Institute of Civil Engineering",
             "dates": "2005"
-        }}
+        }
     ]
     ```
-
-    Resume Context:
-    {text_context}
     """
-    llm_output = _call_ollama(prompt, context=text_context) # Use unified call
-    parsed_data = _parse_llm_json_output(llm_output)
+    parsed_data = _call_ollama_json(prompt, "certifications", SECTION_SCHEMAS["certifications"], context=text_context)
     return parsed_data if isinstance(parsed_data, list) else []
 
 @time_function
@@ -336,7 +806,7 @@ def extract_languages_with_llm(text_context):
     Attempts to parse a table-like structure if present.
     Returns a JSON array of objects.
     """
-    prompt = f"""
+    prompt = """
     From the provided resume text, identify and extract ALL distinct languages spoken by the candidate, along with their corresponding proficiency levels for speaking, reading, and writing.
     If proficiency levels are not explicitly stated for a category (e.g., only "Fluent" overall), infer them as 'Fluent' for all categories. Use 'Native' or 'Mother tongue' for highest proficiency. If no level is given, use 'N/A'.
     Return the languages as a JSON array of objects. If no languages are found, return an empty JSON array: [].
@@ -344,36 +814,204 @@ def extract_languages_with_llm(text_context):
     Example JSON format (always an array of objects):
     ```json
     [
-        {{
+        {
             "language": "English",
             "speaking": "Fluent",
             "reading": "Excellent",
             "writing": "Excellent"
-        }},
-        {{
+        },
+        {
             "language": "Hindi",
             "speaking": "Native",
             "reading": "Mother tongue",
             "writing": "Mother tongue"
-        }},
-        {{
+        },
+        {
             "language": "Bengali",
             "speaking": "Mother tongue",
             "reading": "Mother tongue",
             "writing": "Mother tongue"
-        }},
-        {{
+        },
+        {
             "language": "Arabic",
             "speaking": "Beginner",
             "reading": "Beginner",
             "writing": "Beginner"
-        }}
+        }
     ]
     ```
+    """
+    parsed_data = _call_ollama_json(prompt, "languages", SECTION_SCHEMAS["languages"], context=text_context)
+    return parsed_data if isinstance(parsed_data, list) else []
+
 
-    Resume Context:
-    {text_context}
+# --- Combined (single-pass) extraction ---
+SECTION_EXTRACTORS = {
+    "name": extract_name_with_llm,
+    "skills": extract_skills_with_llm,
+    "experience": extract_experience_with_llm,
+    "education": extract_education_with_llm,
+    "projects": extract_projects_with_llm,
+    "certifications": extract_certifications_with_llm,
+    "languages": extract_languages_with_llm,
+}
+
+# Keys every entry of an object-list section must carry to be accepted
+SECTION_REQUIRED_KEYS = {
+    "experience": ("title", "company"),
+    "education": ("degree", "institution"),
+    "projects": ("project_name",),
+    "certifications": ("name",),
+    "languages": ("language",),
+}
+
+
+def validate_section(section, data):
+    """
+    Checks that data has the shape the extractor for this section returns:
+    a string for the name, a list of strings for skills and a list of objects
+    with the required keys for every other section.
+    """
+    if section == "name":
+        return isinstance(data, str) and bool(data.strip())
+    if not isinstance(data, list):
+        return False
+    if section == "skills":
+        return all(isinstance(item, str) for item in data)
+    required_keys = SECTION_REQUIRED_KEYS.get(section, ())
+    return all(isinstance(item, dict) and all(key in item for key in required_keys) for item in data)
+
+
+@time_function
+def extract_all_sections_with_llm(text_context, section_contexts=None, sections=None):
+    """
+    Extracts name, skills, experience, education, projects, certifications and languages
+    with a single LLM call that returns one JSON object.
+    Each section is validated on its own; only the sections that fail validation are
+    re-queried with their per-section extractor, using section_contexts[section] when given.
+    `sections` limits the result (and any re-queries) to the sections still needed.
+    Returns a dict of section -> result.
+    """
+    sections = list(SECTION_EXTRACTORS) if sections is None else [section for section in SECTION_EXTRACTORS if section in sections]
+    if not sections:
+        return {}
+    prompt = """
+    From the provided resume text, extract the sections below and return them together as ONE JSON object with exactly these keys:
+    - "name": the full name of the candidate as a string, or "N/A" if it is not clearly identifiable.
+    - "skills": a JSON array of strings, one distinct technical skill, programming language, software, tool or methodology per string.
+    - "experience": a JSON array of formal employment entries only (no projects, assignments, freelancing or client-based work). Each entry is an object with 'title', 'company', 'start_date' (YYYY-MM, or YYYY if only the year is available), 'end_date' (YYYY-MM, YYYY or 'Present') and 'description'.
+    - "education": a JSON array of objects with 'degree', 'institution' and 'year' (YYYY).
+    - "projects": a JSON array of objects with 'project_name', 'client_company' ("N/A" if not mentioned), 'role', 'description' and 'technologies_used' (a list of strings).
+    - "certifications": a JSON array of certifications, professional licenses and formal training programs (including an 'Other Training' heading), each an object with 'name', 'issuing_body' ("N/A" if not found) and 'dates' ("N/A" if not found).
+    - "languages": a JSON array of objects with 'language', 'speaking', 'reading' and 'writing'. Use 'Native' or 'Mother tongue' for the highest proficiency and 'N/A' if no level is given.
+
+    Use an empty JSON array for any section that is not present in the resume.
+
+    Example JSON format:
+    ```json
+    {
+        "name": "Jane Doe",
+        "skills": ["Python", "SQL"],
+        "experience": [{"title": "Data Analyst", "company": "Acme Corp", "start_date": "2021-03", "end_date": "Present", "description": "Built reporting dashboards."}],
+        "education": [{"degree": "B.Sc. in Statistics", "institution": "University of Delhi", "year": "2020"}],
+        "projects": [{"project_name": "Churn Model", "client_company": "N/A", "role": "Developer", "description": "Predicted customer churn.", "technologies_used": ["Python", "scikit-learn"]}],
+        "certifications": [{"name": "AWS Certified Cloud Practitioner", "issuing_body": "Amazon Web Services", "dates": "2022"}],
+        "languages": [{"language": "English", "speaking": "Fluent", "reading": "Fluent", "writing": "Fluent"}]
+    }
+    ```
+    """
+    parsed_data = _call_ollama_json(prompt, "combined", combined_schema(sections), context=text_context, prefer_object=True)
+    if not isinstance(parsed_data, dict):
+        parsed_data = {}
+
+    section_contexts = section_contexts or {}
+    results = {}
+    failed_sections = []
+    for section in sections:
+        section_data = parsed_data.get(section)
+        if validate_section(section, section_data):
+            results[section] = section_data.strip() if section == "name" else section_data
+        else:
+            failed_sections.append(section)
+
+    if failed_sections:
+        performance_logger.info(f"    Combined extraction: re-querying {len(failed_sections)} section(s) that failed validation: {', '.join(failed_sections)}")
+    for section in failed_sections:
+        results[section] = SECTION_EXTRACTORS[section](section_contexts.get(section, text_context))
+    return results
+
+
+# --- Map-reduce extraction for long resumes ---
+# Fields that identify one entry when it is extracted from two overlapping chunks
+MAP_REDUCE_ENTRY_KEYS = {
+    "experience": ("company", "title", "start_date"),
+    "projects": ("project_name",),
+}
+# Key fields that may be missing on one side of a duplicate, e.g. a start date that fell
+# into the previous chunk; the other key fields must match
+MAP_REDUCE_OPTIONAL_KEY_FIELDS = {"start_date"}
+
+
+def _entry_key(section, entry):
+    """Case-, spacing- and punctuation-insensitive identity of an extracted entry; missing and "N/A" fields are empty."""
+    key = []
+    for field in MAP_REDUCE_ENTRY_KEYS[section]:
+        value = re.sub(r'[^a-z0-9]+', ' ', str(entry.get(field) or '').lower()).strip()
+        key.append("" if value == "n a" else value)
+    return tuple(key)
+
+
+def _same_entry(section, key, other_key):
+    for field, value, other_value in zip(MAP_REDUCE_ENTRY_KEYS[section], key, other_key):
+        if value != other_value and not (field in MAP_REDUCE_OPTIONAL_KEY_FIELDS and not (value and other_value)):
+            return False
+    return True
+
+
+def merge_section_entries(section, entry_lists):
+    """
+    Merges the entry lists extracted from consecutive chunks into one list.
+    Entries are kept in chunk order; a later duplicate (same key fields, an optional one
+    such as the start date may be missing on either side) only fills in the fields the
+    first occurrence left empty or "N/A", so the result does not depend on which chunk
+    call finished first. Entries without any key field are dropped.
+    """
+    merged = []  # [key, entry] in chunk order
+    for entries in entry_lists:
+        for entry in entries or []:
+            if not isinstance(entry, dict):
+                continue
+            key = _entry_key(section, entry)
+            if not any(key):
+                continue
+            kept = next((kept for kept in merged if _same_entry(section, kept[0], key)), None)
+            if kept is None:
+                merged.append([key, dict(entry)])
+                continue
+            kept_entry = kept[1]
+            for field, value in entry.items():
+                if kept_entry.get(field) in (None, "", "N/A", []) and value not in (None, "", "N/A", []):
+                    kept_entry[field] = value
+            kept[0] = _entry_key(section, kept_entry)
+    return [entry for _, entry in merged]
+
+
+@time_function
+def extract_section_map_reduce(section, text_context, max_concurrency=LLM_MAX_CONCURRENCY, chunk_size=MAP_REDUCE_CHUNK_SIZE):
+    """
+    Map-reduce extraction for a list section (see MAP_REDUCE_ENTRY_KEYS) of a resume too
+    long for one prompt: the text is split with chunk_text, the section extractor runs on
+    every chunk concurrently and the per-chunk arrays are merged with merge_section_entries.
     """
-    llm_output = _call_ollama(prompt, context=text_context) # Use unified call
-    parsed_data = _parse_llm_json_output(llm_output)
-    return parsed_data if isinstance(parsed_data, list) else []
\ No newline at end of file
+    chunks = chunk_text(text_context, max_chunk_size=chunk_size, overlap=MAP_REDUCE_CHUNK_OVERLAP)
+    extractor = SECTION_EXTRACTORS[section]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(chunks))), thread_name_prefix=f"map-{section}") as executor:
+        # Each chunk runs in a copy of the caller's context, so its calls keep the caller's priority class
+        futures = [executor.submit(contextvars.copy_context().run, extractor, chunk) for chunk in chunks]
+        entry_lists = [future.result() for future in futures]  # Results stay in chunk order
+    merged_entries = merge_section_entries(section, entry_lists)
+    performance_logger.info(
+        f"    Map-reduce [{section}]: {len(chunks)} chunks, {sum(len(entries) for entries in entry_lists)} entries extracted, "
+        f"{len(merged_entries)} after de-duplication"
+    )
+    return merged_entries
@@ -0,0 +1,125 @@
+# llm_scheduler.py
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import LLM_SCHEDULER_SLOTS, LLM_SCHEDULER_RESERVATIONS, LLM_DEFAULT_PRIORITY_CLASS
+from logger import performance_logger
+from metrics import registry
+
+# Highest priority first
+PRIORITY_CLASSES = ("interactive", "batch")
+
+# Priority class of the LLM calls made in the current context. Worker threads only see it
+# when they are started through contextvars.copy_context().run (see run_section_extractors).
+_priority_class = contextvars.ContextVar("llm_priority_class", default=LLM_DEFAULT_PRIORITY_CLASS)
+
+
+@contextmanager
+def priority_class(name):
+    """Within the block, LLM calls are scheduled in priority class `name`."""
+    if name not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class '{name}', expected one of {PRIORITY_CLASSES}")
+    token = _priority_class.set(name)
+    try:
+        yield
+    finally:
+        _priority_class.reset(token)
+
+
+def current_priority_class():
+    return _priority_class.get()
+
+
+class PriorityScheduler:
+    """
+    Admits at most `slots` LLM requests at a time. Waiters are served first-come first-served
+    within a class, and a free slot goes to the highest class that has a waiter. Slots
+    reserved for a class (reservations) are only used by that class, so every class always
+    has capacity of its own however busy the others are.
+    Queue wait and execution time are recorded separately per class.
+    """
+
+    def __init__(self, slots=LLM_SCHEDULER_SLOTS, reservations=LLM_SCHEDULER_RESERVATIONS):
+        self.slots = slots
+        self.reservations = {name: reservations.get(name, 0) for name in PRIORITY_CLASSES}
+        if sum(self.reservations.values()) > slots:
+            raise ValueError(f"Reserved slots {self.reservations} exceed the {slots} slots available")
+        self._condition = threading.Condition()
+        self.running = {name: 0 for name in PRIORITY_CLASSES}
+        self._waiting = {name: deque() for name in PRIORITY_CLASSES}
+        self.calls = {name: 0 for name in PRIORITY_CLASSES}
+        self.wait_seconds = {name: 0.0 for name in PRIORITY_CLASSES}
+        self.max_wait_seconds = {name: 0.0 for name in PRIORITY_CLASSES}
+        self.execution_seconds = {name: 0.0 for name in PRIORITY_CLASSES}
+
+    def _has_slot(self, name):
+        free = self.slots - sum(self.running.values())
+        held_back = sum(max(reserved - self.running[other], 0) for other, reserved in self.reservations.items() if other != name)
+        return free - held_back > 0
+
+    def _may_start(self, name, ticket):
+        if self._waiting[name][0] is not ticket or not self._has_slot(name):
+            return False
+        higher_classes = PRIORITY_CLASSES[:PRIORITY_CLASSES.index(name)]
+        return not any(self._waiting[higher] and self._has_slot(higher) for higher in higher_classes)
+
+    def acquire(self, name):
+        """Blocks until a request of class `name` may start; returns the seconds spent waiting."""
+        ticket = object()
+        start_time = time.perf_counter()
+        with self._condition:
+            self._waiting[name].append(ticket)
+            while not self._may_start(name, ticket):
+                self._condition.wait()
+            self._waiting[name].popleft()
+            self.running[name] += 1
+            wait_seconds = time.perf_counter() - start_time
+            self.calls[name] += 1
+            self.wait_seconds[name] += wait_seconds
+            self.max_wait_seconds[name] = max(self.max_wait_seconds[name], wait_seconds)
+            self._condition.notify_all()  # The next waiter of this class may fit as well
+        return wait_seconds
+
+    def try_acquire(self, name):
+        """Takes a slot for class `name` only if one is free right now and nobody is queued ahead; returns whether it did."""
+        with self._condition:
+            higher_classes = PRIORITY_CLASSES[:PRIORITY_CLASSES.index(name)]
+            if self._waiting[name] or not self._has_slot(name) or any(self._waiting[higher] and self._has_slot(higher) for higher in higher_classes):
+                return False
+            self.running[name] += 1
+            self.calls[name] += 1
+            return True
+
+    def release(self, name, execution_seconds):
+        with self._condition:
+            self.running[name] -= 1
+            self.execution_seconds[name] += execution_seconds
+            self._condition.notify_all()
+
+    def wait_for_slot(self, label="unlabelled"):
+        """
+        Takes a slot in the current context's priority class, waiting for one if needed, and
+        returns the class. The slot is held until release(name, execution_seconds).
+        """
+        name = current_priority_class()
+        wait_seconds = self.acquire(name)
+        registry.observe("llm_queue_wait_seconds", wait_seconds, "Time LLM requests waited for a scheduler slot", priority=name)
+        if wait_seconds >= 0.1:
+            performance_logger.info(f"LLM queue [{label}] ({name}): waited {wait_seconds:.2f}s for a slot")
+        return name
+
+    def log_stats(self):
+        """Writes per-class call counts, queue wait and execution time to the performance log."""
+        with self._condition:
+            for name in PRIORITY_CLASSES:
+                calls = self.calls[name]
+                if not calls:
+                    continue
+                performance_logger.info(
+                    f"LLM scheduler [{name}]: {calls} calls, queue wait mean {self.wait_seconds[name] / calls:.2f}s / "
+                    f"max {self.max_wait_seconds[name]:.2f}s, execution mean {self.execution_seconds[name] / calls:.2f}s "
+                    f"({self.reservations[name]} of {self.slots} slots reserved)"
+                )
@@ -1,7 +1,11 @@
 import logging
 import os
+import threading
 import time
 from functools import wraps
+
+from config import LOG_FUNCTION_TIMINGS
+from metrics import registry
 # --- Logger Setup ---
 LOG_FILE_NAME = "performance.log" # Name of the log file
 LOG_DIR = "logs" # Directory for logs
@@ -28,23 +32,53 @@ console_handler.setFormatter(logging.Formatter('%(levelname)s - %(message)s'))
 # performance_logger.addHandler(console_handler) # Uncomment if you want live logging in terminal too
 
 # --- Timing Decorator ---
+# Timed calls active on each thread, innermost last: a call's time is subtracted from its
+# caller's self time, so nested timed functions (e.g. extract_*_with_llm -> _call_ollama)
+# are not counted twice. Work a call hands to other threads counts as the caller's own time.
+_active_calls = threading.local()
+
+
 def time_function(func):
     """
-    A decorator that logs the execution time of the decorated function.
+    A decorator that records the execution time of the decorated function (time.perf_counter)
+    in the metrics registry: function_seconds (wall time) and function_self_seconds
+    (excluding nested timed calls on the same thread), labelled by function.
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
-        result = func(*args, **kwargs)
-        end_time = time.time()
-        duration = end_time - start_time
-        
-        # Log the function's execution time
-        performance_logger.info(f"Function '{func.__name__}' took {duration:.4f} seconds to execute.")
-        
-        return result
+        stack = getattr(_active_calls, "stack", None)
+        if stack is None:
+            stack = _active_calls.stack = []
+        frame = [0.0]  # Seconds spent in nested timed calls
+        stack.append(frame)
+        start_time = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start_time
+            stack.pop()
+            if stack:
+                stack[-1][0] += duration
+            registry.observe("function_seconds", duration, "Wall time of timed functions", function=func.__name__)
+            registry.observe("function_self_seconds", duration - frame[0], "Time of timed functions excluding nested timed calls", function=func.__name__)
+            if LOG_FUNCTION_TIMINGS:
+                performance_logger.info(f"Function '{func.__name__}' took {duration:.4f} seconds to execute.")
     return wrapper
 
+
+def log_function_timings():
+    """Writes call count, total, self time and p50/p95/p99 of every timed function to the performance log."""
+    records = registry.snapshot()
+    self_seconds = {record["labels"]["function"]: record["sum"] for record in records if record["name"] == "function_self_seconds"}
+    for record in records:
+        if record["name"] != "function_seconds":
+            continue
+        function = record["labels"]["function"]
+        performance_logger.info(
+            f"Function '{function}': {record['count']} calls, total {record['sum']:.4f}s, self {self_seconds[function]:.4f}s, "
+            f"p50 {record['p50']:.4f}s, p95 {record['p95']:.4f}s, p99 {record['p99']:.4f}s"
+        )
+
 if __name__ == "__main__":
     # Example usage:
     @time_function
@@ -55,4 +89,5 @@ if __name__ == "__main__":
     performance_logger.info("Logger setup complete. Running example task.")
     example_task(0.5)
     example_task(1.2)
+    log_function_timings()
     performance_logger.info(f"Check '{log_file_path}' for logs.")
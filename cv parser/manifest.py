@@ -0,0 +1,101 @@
+# manifest.py
+import hashlib
+import json
+import os
+import threading
+
+from text_normalizer import NORMALIZER_VERSION
+
+
+def file_sha256(path, block_size=1 << 20):
+    """Returns the SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class CVManifest:
+    """
+    Records, per source CV file, its content hash, size and mtime together with the
+    extracted text file and parsed JSON it produced, so repeated runs only process
+    new or changed resumes.
+    The manifest is a JSON file keyed by the source file name.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f" [MANIFEST] Could not read {path} ({type(e).__name__}: {e}). Starting with an empty manifest.")
+
+    def check_source(self, source_path):
+        """
+        Returns (unchanged, fingerprint) for a source file. Size and mtime are compared
+        first; the content is only hashed when they differ from the recorded values.
+        A source also counts as changed if its extracted text file has gone missing or
+        was written by an older text normalizer.
+        """
+        stat = os.stat(source_path)
+        fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime}
+        entry = self.entries.get(os.path.basename(source_path))
+        if not entry or not entry.get("text_path") or not os.path.exists(entry["text_path"]):
+            return False, fingerprint
+        if entry.get("normalizer_version") != NORMALIZER_VERSION:
+            return False, fingerprint
+
+        if entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+            fingerprint["sha256"] = entry.get("sha256")
+            return True, fingerprint
+
+        fingerprint["sha256"] = file_sha256(source_path)
+        if fingerprint["sha256"] == entry.get("sha256"):
+            # Touched but not modified: remember the new mtime so it is not hashed again
+            with self._lock:
+                entry["mtime"] = stat.st_mtime
+            return True, fingerprint
+        return False, fingerprint
+
+    def record_extraction(self, source_path, fingerprint, text_path):
+        """Records the text file extracted from a (new or changed) source; its old parse is stale."""
+        if "sha256" not in fingerprint:
+            fingerprint = dict(fingerprint, sha256=file_sha256(source_path))
+        with self._lock:
+            self.entries[os.path.basename(source_path)] = {
+                "sha256": fingerprint["sha256"],
+                "size": fingerprint["size"],
+                "mtime": fingerprint["mtime"],
+                "text_path": text_path,
+                "normalizer_version": NORMALIZER_VERSION,
+                "parsed_path": None,
+            }
+
+    def record_parse(self, text_path, parsed_path):
+        """Records the parsed JSON produced from an extracted text file."""
+        with self._lock:
+            for entry in self.entries.values():
+                if entry.get("text_path") == text_path:
+                    entry["parsed_path"] = parsed_path
+
+    def needs_parse(self, source_path):
+        """True if the source has no parsed JSON on disk for its current extracted text."""
+        entry = self.entries.get(os.path.basename(source_path))
+        return not entry or not entry.get("parsed_path") or not os.path.exists(entry["parsed_path"])
+
+    def text_path(self, source_path):
+        entry = self.entries.get(os.path.basename(source_path))
+        return entry.get("text_path") if entry else None
+
+    def save(self):
+        """Writes the manifest atomically (temp file + rename)."""
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,197 @@
+# metrics.py
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_JSONL_PATH, METRICS_PROMETHEUS_PATH, METRICS_LATENCY_BUCKETS, METRICS_QUANTILE_WINDOW
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# CV being parsed in the current context, used as the `cv` label of per-CV metrics
+_current_cv = contextvars.ContextVar("metrics_cv", default=None)
+
+
+@contextmanager
+def cv_label(name):
+    """Within the block (and in worker threads started with contextvars.copy_context), per-CV metrics are labelled cv=name."""
+    token = _current_cv.set(name)
+    try:
+        yield
+    finally:
+        _current_cv.reset(token)
+
+
+def current_cv():
+    return _current_cv.get()
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items() if value is not None))
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of one series, plus its most recent observations for quantiles."""
+
+    def __init__(self, buckets=METRICS_LATENCY_BUCKETS, window=METRICS_QUANTILE_WINDOW):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value):
+        self.bucket_counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantiles(self, quantiles=QUANTILES):
+        samples = sorted(self.recent)
+        if not samples:
+            return {quantile: None for quantile in quantiles}
+        return {quantile: samples[min(len(samples) - 1, int(quantile * len(samples)))] for quantile in quantiles}
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms. Every metric is a family of series keyed
+    by label values, e.g. registry.observe("llm_request_seconds", 1.2, section="skills", model="llama3.2").
+    Thread-safe; exported as JSON lines or Prometheus text.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}  # name -> (type, help, {label_key: value or Histogram})
+
+    def _series(self, name, kind, help_text):
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = (kind, help_text, {})
+        elif family[0] != kind:
+            raise ValueError(f"Metric '{name}' is a {family[0]}, not a {kind}")
+        return family[2]
+
+    def inc(self, name, value=1, help_text="", **labels):
+        """Adds value to a counter."""
+        with self._lock:
+            series = self._series(name, "counter", help_text)
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, help_text="", **labels):
+        """Sets a gauge."""
+        with self._lock:
+            self._series(name, "gauge", help_text)[_label_key(labels)] = value
+
+    def observe(self, name, value, help_text="", **labels):
+        """Records one observation (seconds, for the default buckets) in a histogram."""
+        with self._lock:
+            series = self._series(name, "histogram", help_text)
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def quantiles(self, name, **labels):
+        """{0.5: p50, 0.95: p95, 0.99: p99} of a histogram series (None where nothing was observed)."""
+        with self._lock:
+            histogram = self._families.get(name, (None, None, {}))[2].get(_label_key(labels))
+            return histogram.quantiles() if histogram is not None else {quantile: None for quantile in QUANTILES}
+
+    def snapshot(self):
+        """Returns every series as a list of plain dicts (the JSON-lines records)."""
+        records = []
+        timestamp = time.time()
+        with self._lock:
+            for name, (kind, _, series) in sorted(self._families.items()):
+                for key, value in sorted(series.items()):
+                    record = {"timestamp": timestamp, "name": name, "type": kind, "labels": dict(key)}
+                    if kind == "histogram":
+                        record.update(count=value.count, sum=value.sum)
+                        record.update({f"p{int(quantile * 100)}": result for quantile, result in value.quantiles().items()})
+                    else:
+                        record["value"] = value
+                    records.append(record)
+        return records
+
+    def to_prometheus(self):
+        """Renders every metric in the Prometheus text exposition format. Histogram quantiles are exported as <name>_quantile gauges."""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, series) in sorted(self._families.items()):
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    if kind != "histogram":
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+                        continue
+                    cumulative = 0
+                    for bound, bucket_count in zip((*value.buckets, "+Inf"), value.bucket_counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', str(bound))])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {value.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {value.count}")
+                if kind == "histogram":
+                    lines.append(f"# TYPE {name}_quantile gauge")
+                    for key, value in sorted(series.items()):
+                        for quantile, result in value.quantiles().items():
+                            if result is not None:
+                                lines.append(f"{name}_quantile{_format_labels(key, [('quantile', str(quantile))])} {result}")
+        return "\n".join(lines) + "\n"
+
+    def export_jsonl(self, path=METRICS_JSONL_PATH):
+        """Appends the current snapshot to path, one JSON object per series."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for record in self.snapshot():
+                f.write(json.dumps(record) + "\n")
+
+    def export_prometheus(self, path=METRICS_PROMETHEUS_PATH):
+        """Rewrites path with the Prometheus text (atomically, so a scraper never reads half a file)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+    def serve_prometheus(self, port, host="0.0.0.0"):
+        """Serves the Prometheus text at http://host:port/metrics from a daemon thread; returns the server."""
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the console
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        return server
+
+
+# Shared by the whole process
+registry = MetricsRegistry()
@@ -0,0 +1,165 @@
+# ollama_pool.py
+import threading
+import time
+from itertools import islice
+
+import httpx
+import ollama
+
+from config import OLLAMA_POOL_CONNECTIONS, OLLAMA_HEALTH_CHECK_INTERVAL, OLLAMA_HEALTH_CHECK_TIMEOUT, OLLAMA_CONNECT_TIMEOUT
+from config import LLM_DEFAULT_DEADLINE, LLM_SECTION_DEADLINES
+from call_policy import remaining_deadline
+from logger import performance_logger
+
+# No single read may take longer than the longest call deadline, so a stalled connection
+# cannot hold a worker thread forever after _call_ollama has given up on it
+READ_TIMEOUT = max([LLM_DEFAULT_DEADLINE, *LLM_SECTION_DEADLINES.values()])
+
+
+def _apply_attempt_deadline(request):
+    """httpx request hook: caps every timeout of a request made by an LLM attempt at the attempt's remaining deadline."""
+    remaining = remaining_deadline()
+    if remaining is None:
+        return
+    remaining = max(remaining, 0.001)
+    request.extensions["timeout"] = {
+        phase: remaining if seconds is None else min(seconds, remaining)
+        for phase, seconds in request.extensions.get("timeout", {}).items()
+    }
+
+
+def _is_host_failure(error):
+    """A request that failed because of the host; a read timeout from an attempt's deadline is not one."""
+    return isinstance(error, (httpx.TransportError, ConnectionError)) and not isinstance(error, httpx.ReadTimeout)
+
+
+class OllamaHost:
+    """One Ollama endpoint: a client with its own pool of keep-alive connections plus load and health state."""
+
+    def __init__(self, host, max_connections=OLLAMA_POOL_CONNECTIONS):
+        self.host = host
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        timeout = httpx.Timeout(READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+        self.client = ollama.Client(host=host, limits=limits, timeout=timeout, event_hooks={"request": [_apply_attempt_deadline]})
+        self.probe_client = ollama.Client(host=host, timeout=OLLAMA_HEALTH_CHECK_TIMEOUT)
+        self.outstanding = 0
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+        self.busy_seconds = 0.0
+
+
+class OllamaPool:
+    """
+    Drop-in replacement for ollama.Client that spreads calls over several Ollama hosts.
+    Every call goes to the healthy host with the fewest outstanding requests. A host is
+    taken out of rotation when a request to it fails at the connection level (the call
+    is then retried once on another host) or when its health probe fails or takes longer
+    than OLLAMA_HEALTH_CHECK_TIMEOUT, and is put back once a probe succeeds again.
+    """
+
+    def __init__(self, hosts, health_check_interval=OLLAMA_HEALTH_CHECK_INTERVAL):
+        self.hosts = [OllamaHost(host) for host in hosts]
+        self._lock = threading.Lock()
+        if len(self.hosts) > 1 and health_check_interval:
+            threading.Thread(target=self._health_loop, args=(health_check_interval,), name="ollama-health", daemon=True).start()
+
+    # --- Dispatch ---
+    def _acquire(self, exclude=None):
+        with self._lock:
+            candidates = [host for host in self.hosts if host.healthy and host is not exclude]
+            if not candidates:  # Nothing healthy: keep trying every host rather than failing outright
+                candidates = [host for host in self.hosts if host is not exclude] or self.hosts
+            host = min(candidates, key=lambda candidate: candidate.outstanding)
+            host.outstanding += 1
+            host.requests += 1
+            return host
+
+    def _release(self, host, start_time, failed=False):
+        with self._lock:
+            host.outstanding -= 1
+            host.busy_seconds += time.perf_counter() - start_time
+            if failed:
+                host.failures += 1
+                if host.healthy and len(self.hosts) > 1:
+                    host.healthy = False
+                    performance_logger.info(f"Ollama host {host.host} taken out of rotation after a failed request")
+
+    def _track_stream(self, host, stream, start_time, first_chunks):
+        """Keeps a streamed call counted as outstanding until the stream is finished or closed."""
+        failed = False
+        try:
+            yield from first_chunks
+            yield from stream
+        except Exception as e:
+            failed = _is_host_failure(e)
+            raise
+        finally:
+            stream.close()
+            self._release(host, start_time, failed)
+
+    def _dispatch(self, method, kwargs):
+        host = self._acquire()
+        for attempt in range(2):
+            start_time = time.perf_counter()
+            try:
+                result = getattr(host.client, method)(**kwargs)
+                if kwargs.get("stream"):
+                    # A stream only connects when iterated: pull the first chunk here so a dead host still fails over
+                    stream, result = result, list(islice(result, 1))
+            except Exception as e:
+                self._release(host, start_time, failed=_is_host_failure(e))
+                if not _is_host_failure(e) or attempt or len(self.hosts) == 1:
+                    raise
+                host = self._acquire(exclude=host)  # Fail over once
+                continue
+            if kwargs.get("stream"):
+                return self._track_stream(host, stream, start_time, result)
+            self._release(host, start_time)
+            return result
+
+    def chat(self, **kwargs):
+        return self._dispatch("chat", kwargs)
+
+    def generate(self, **kwargs):
+        return self._dispatch("generate", kwargs)
+
+    def embed(self, **kwargs):
+        return self._dispatch("embed", kwargs)
+
+    def broadcast(self, method, **kwargs):
+        """Calls a client method on every healthy host (e.g. to load a model everywhere)."""
+        for host in self.hosts:
+            if host.healthy:
+                getattr(host.client, method)(**kwargs)
+
+    # --- Health checks ---
+    def check_health(self):
+        """Probes every host once (GET /api/ps) and updates which hosts are in rotation."""
+        for host in self.hosts:
+            start_time = time.perf_counter()
+            try:
+                host.probe_client.ps()
+                healthy = time.perf_counter() - start_time <= OLLAMA_HEALTH_CHECK_TIMEOUT
+            except Exception:
+                healthy = False
+            with self._lock:
+                changed = healthy != host.healthy
+                host.healthy = healthy
+            if changed:
+                performance_logger.info(f"Ollama host {host.host} {'back in' if healthy else 'taken out of'} rotation after a health check")
+
+    def _health_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.check_health()
+
+    def log_stats(self):
+        """Writes per-host request counts, failures and mean latency to the performance log."""
+        with self._lock:
+            for host in self.hosts:
+                mean_seconds = host.busy_seconds / host.requests if host.requests else 0.0
+                performance_logger.info(
+                    f"Ollama host {host.host}: {host.requests} requests, {host.failures} failed, "
+                    f"mean latency {mean_seconds:.2f}s, {'healthy' if host.healthy else 'out of rotation'}"
+                )
@@ -1,12 +1,16 @@
 # Libraries
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import fitz
 from docx import Document
 
-from config import CV_FILES_DIR, EXTRACTED_TEXT_DIR
-from logger import time_function
+from config import CV_FILES_DIR, EXTRACTED_TEXT_DIR, MANIFEST_PATH, INCREMENTAL_PREPROCESSING, PREPROCESS_WORKERS, PREPROCESS_CHUNKSIZE
+from logger import performance_logger, time_function
+from manifest import CVManifest
+from text_normalizer import normalize_text, normalize_text_stream
 
 @time_function
 def convert_docx_to_pdf(docx_path):
@@ -70,6 +74,8 @@ def convert_doc_to_docx(doc_path):
 def clean_text(text):
     """
     Performs cleaning on extracted text to remove artifacts and normalize formatting.
+    Reference implementation: preprocessing now uses text_normalizer.normalize_text,
+    which produces clean_text + regex_parser.clean_text_for_parsing in one go.
     """
     if not isinstance(text, str):
         return ""
@@ -97,28 +103,38 @@ def clean_text(text):
     text = '\n'.join([line.strip() for line in text.split('\n')])
     return text.strip()
 
+
 # ----PDF EXTRACTION FUNC ------
-@time_function
-def extract_text_from_pdf(pdf_path):
+def iter_text_from_pdf(pdf_path):
     """
-    Extracts both visible text and embedded hyperlinks from a PDF using PyMuPDF (fitz).
+    Generator over a PDF's text using PyMuPDF (fitz): yields each page's visible text
+    followed by the URLs of that page's hyperlink annotations, one piece at a time,
+    so the whole document never has to be held in memory.
     """
-    text = ""
-    print(f" [PDF DEBUG] Attempting PyMuPDF extraction for PDF: {os.path.basename(pdf_path)}")
+    doc = fitz.open(pdf_path)
     try:
-        doc = fitz.open(pdf_path)
-        for page_num in range(doc.page_count):
-            page = doc.load_page(page_num)
-            text += page.get_text() + "\n"
+        for page in doc:
+            yield page.get_text() + "\n"
 
             # 🔍 Append any URLs found in hyperlink annotations
-            links = page.get_links()
-            for link in links:
+            for link in page.get_links():
                 uri = link.get("uri", None)
                 if uri and uri.startswith("http"):
-                    text += f"{uri}\n"  # Append the URL so it's picked up later
+                    yield f"{uri}\n"  # Append the URL so it's picked up later
+    finally:
         doc.close()
 
+
+@time_function
+def extract_text_from_pdf(pdf_path):
+    """
+    Extracts both visible text and embedded hyperlinks from a PDF using PyMuPDF (fitz).
+    Joined variant of iter_text_from_pdf.
+    """
+    print(f" [PDF DEBUG] Attempting PyMuPDF extraction for PDF: {os.path.basename(pdf_path)}")
+    try:
+        text = "".join(iter_text_from_pdf(pdf_path))
+
         # if len(text.strip()) < 50:
         #     print(f" [PDF DEBUG] PyMuPDF extraction too little text ({len(text.strip())} chars), falling back to OCR.")
         #     return extract_text_from_pdf_with_ocr(pdf_path)
@@ -131,6 +147,36 @@ def extract_text_from_pdf(pdf_path):
         return ""
 
 
+@time_function
+def save_pdf_text_streaming(pdf_path, output_path):
+    """
+    Streams a PDF page by page through normalize_text_stream straight into output_path,
+    so memory stays flat however large the document is.
+    Returns (raw_length, cleaned_length); nothing is written if no text remains.
+    """
+    raw_length = 0
+    cleaned_length = 0
+
+    def counted_pieces():
+        nonlocal raw_length
+        for piece in iter_text_from_pdf(pdf_path):
+            raw_length += len(piece)
+            yield piece
+
+    tmp_path = output_path + ".tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for cleaned_piece in normalize_text_stream(counted_pieces()):
+                f.write(cleaned_piece)
+                cleaned_length += len(cleaned_piece)
+        if cleaned_length:
+            os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return raw_length, cleaned_length
+
+
 # ----PDF EXTRACTION WITH OCR FUNC ------
 # def extract_text_from_pdf_with_ocr(pdf_path):
 #     text = ""
@@ -183,85 +229,198 @@ def extract_text_from_docx(docx_path):
         print(f" [DOCX EXTRACTION ERROR] Failed to extract text from {docx_path}: {e}")
         return None
     
-# ---- Main Processing Function ----
-@time_function
-def preprocess_cvs():
+# ---- Single File Processing ----
+def extract_and_save_cv(file_path):
     """
-    Scans the CV_FILES, extracts text from DOC, DOCX, and PDF,
-    cleans it, applies fallback via .docx → .pdf if necessary,
-    and saves the cleaned text to EXTRACTED_TEXT_DIR.
+    Extracts, cleans and saves the text of one CV file.
+    Runs in a worker process when preprocess_cvs uses a process pool, so it only takes
+    and returns plain, picklable values. Returns the saved text path, or None.
     """
-    processed_files_paths = []
-    print(f"--- Starting CV preprocessing. Scanning '{CV_FILES_DIR}' ---")
+    filename = os.path.basename(file_path)
+    output_path = os.path.join(EXTRACTED_TEXT_DIR, os.path.splitext(filename)[0] + '.txt')
+    text = ""
+    docx_path = None
+
+    # --- PDF (streamed page by page, cleaned and written incrementally) ---
+    if filename.endswith(".pdf"):
+        print(f" [PDF DETECTED] Streaming text from {filename}...")
+        try:
+            initial_len, cleaned_len = save_pdf_text_streaming(file_path, output_path)
+        except Exception as e:
+            print(f" [PDF DEBUG] PyMuPDF extraction failed for {filename}: {type(e).__name__}: {e}.")
+            return None
+        if not cleaned_len:
+            print(f" ⚠️ No meaningful text extracted from {filename}.")
+            return None
+        print(f" [CLEANING] Original text length: {initial_len}, Cleaned text length: {cleaned_len}")
+        print(f" ✅ Text saved to {output_path}")
+        return output_path
+
+    # --- DOCX ---
+    elif filename.endswith(".docx"):
+        print(f" [DOCX DETECTED] Extracting text from {filename}...")
+        docx_path = file_path
+        text = extract_text_from_docx(docx_path)
+
+    # --- DOC ---
+    elif filename.endswith(".doc"):
+        print(f" [DOC DETECTED] Converting {filename} to .docx...")
+        docx_path = convert_doc_to_docx(file_path)
+        if docx_path and os.path.exists(docx_path):
+            print(f" [DOCX CREATED] Extracting text from converted {docx_path}...")
+            text = extract_text_from_docx(docx_path)
+        else:
+            print(f" [SKIP] Could not convert {filename}. Skipping.")
+            return None
+    else:
+        print(f" [SKIP] Unsupported file type: {filename}.")
+        return None
 
+    # --- Fallback to PDF if too short or too long ---
+    if docx_path:
+        line_count = text.count("\n") + 1
+        if line_count <= 6 or len(text) > 131072:
+            print(f" ⚠️ Text from {filename} is {'too short' if line_count <= 6 else 'too long'} ({line_count} lines / {len(text)} chars). Trying DOCX→PDF fallback.")
+            pdf_path = convert_docx_to_pdf(docx_path)
+            if pdf_path and os.path.exists(pdf_path):
+                pdf_text = extract_text_from_pdf(pdf_path)
+                if pdf_text and len(pdf_text.strip()) < len(text.strip()):
+                    print(f" ✅ PDF fallback successful. Using extracted text from PDF for {filename}.")
+                    text = pdf_text
+                else:
+                    print(f" ℹ️ PDF fallback did not improve extraction. Keeping original DOCX text.")
+            else:
+                print(f" ❌ Failed to convert {docx_path} to PDF. Keeping DOCX text.")
+
+    # --- Cleaning and Saving ---
+    if text and text.strip():
+        print(f" [CLEANING] Cleaning text for {filename} ...")
+        initial_len = len(text)
+        text = normalize_text(text)
+        cleaned_len = len(text)
+        print(f" [CLEANING] Original text length: {initial_len}, Cleaned text length: {cleaned_len}")
+
+        try:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            print(f" ✅ Text saved to {output_path}")
+            return output_path
+        except Exception as e:
+            print(f" ❌ Could not save text for {filename}: {type(e).__name__}: {e}")
+    else:
+        print(f" ⚠️ No meaningful text extracted from {filename}.")
+    return None
+
+
+def _extract_and_save_cv_isolated(file_path):
+    """Wrapper for the pool: a failure in one file is reported and never affects the others."""
+    try:
+        return extract_and_save_cv(file_path)
+    except Exception as e:
+        print(f" ❌ Failed to preprocess {os.path.basename(file_path)}: {type(e).__name__}: {e}")
+        return None
+
+
+def _extract_in_own_process(file_path):
+    """Extracts one file in a short-lived worker process, so a crash (e.g. inside fitz) only loses this file."""
+    try:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            return executor.submit(_extract_and_save_cv_isolated, file_path).result()
+    except BrokenProcessPool:
+        print(f" ❌ Failed to preprocess {os.path.basename(file_path)}: the worker process crashed")
+        return None
+
+
+def _extract_in_pool(source_paths, workers, chunksize):
+    """
+    Extracts source_paths across a process pool and returns their output paths in order.
+    If a worker process dies, the files that may have been in flight (the next
+    workers * chunksize without a result) are retried in a process each and the rest go
+    to a fresh pool, so a crash loses only the file that caused it.
+    """
+    output_paths = []
+    while len(output_paths) < len(source_paths):
+        remaining = source_paths[len(output_paths):]
+        broken = False
+        with ProcessPoolExecutor(max_workers=min(workers, len(remaining))) as executor:
+            try:
+                # map() yields results in submission order
+                for output_path in executor.map(_extract_and_save_cv_isolated, remaining, chunksize=chunksize):
+                    output_paths.append(output_path)
+            except BrokenProcessPool:
+                broken = True
+                print(" [POOL] A worker process died; retrying the files in flight one process each, then restarting the pool")
+        if broken:
+            in_flight = source_paths[len(output_paths):len(output_paths) + workers * chunksize]
+            output_paths.extend(_extract_in_own_process(file_path) for file_path in in_flight)
+    return output_paths
+
+# ---- Main Processing Function ----
+def scan_cvs(manifest=None):
+    """
+    Lists the CV_FILES that need work. Returns (text_paths, files_to_extract, skipped_count):
+    extracted text files of unchanged resumes that still need parsing, (source path,
+    fingerprint) pairs of new or changed resumes, and how many unchanged files were skipped.
+    Without a manifest every file is extracted.
+    """
+    text_paths = []
+    files_to_extract = []
+    skipped_count = 0
     for filename in os.listdir(CV_FILES_DIR):
         file_path = os.path.join(CV_FILES_DIR, filename)
         if not os.path.isfile(file_path):
             continue
 
-        text = ""
-        docx_path = None
+        fingerprint = None
+        if manifest is not None:
+            unchanged, fingerprint = manifest.check_source(file_path)
+            if unchanged:
+                skipped_count += 1
+                if manifest.needs_parse(file_path):
+                    text_paths.append(manifest.text_path(file_path))
+                continue
 
-        # --- PDF ---
-        if filename.endswith(".pdf"):
-            print(f" [PDF DETECTED] Extracting text from {filename}...")
-            text = extract_text_from_pdf(file_path)
+        files_to_extract.append((file_path, fingerprint))
+    return text_paths, files_to_extract, skipped_count
 
-        # --- DOCX ---
-        elif filename.endswith(".docx"):
-            print(f" [DOCX DETECTED] Extracting text from {filename}...")
-            docx_path = file_path
-            text = extract_text_from_docx(docx_path)
 
-        # --- DOC ---
-        elif filename.endswith(".doc"):
-            print(f" [DOC DETECTED] Converting {filename} to .docx...")
-            docx_path = convert_doc_to_docx(file_path)
-            if docx_path and os.path.exists(docx_path):
-                print(f" [DOCX CREATED] Extracting text from converted {docx_path}...")
-                text = extract_text_from_docx(docx_path)
-            else:
-                print(f" [SKIP] Could not convert {filename}. Skipping.")
-                continue
-        else:
-            print(f" [SKIP] Unsupported file type: {filename}.")
-            continue
+@time_function
+def preprocess_cvs(incremental=INCREMENTAL_PREPROCESSING, workers=PREPROCESS_WORKERS, chunksize=PREPROCESS_CHUNKSIZE):
+    """
+    Scans the CV_FILES, extracts text from DOC, DOCX, and PDF,
+    cleans it, applies fallback via .docx → .pdf if necessary,
+    and saves the cleaned text to EXTRACTED_TEXT_DIR.
+    With incremental=True, files whose content is unchanged since the last run
+    (per the manifest) are not re-extracted.
+    With workers > 1 the extraction runs in a process pool, files being handed
+    out in chunks of `chunksize` and results collected in submission order.
+    Returns the text files that still need parsing: new or changed resumes plus
+    unchanged ones that have no parsed JSON yet.
+    """
+    manifest = CVManifest(MANIFEST_PATH) if incremental else None
+    print(f"--- Starting CV preprocessing. Scanning '{CV_FILES_DIR}' ---")
+    processed_files_paths, files_to_extract, skipped_count = scan_cvs(manifest)
 
-        # --- Fallback to PDF if too short or too long ---
-        if docx_path:
-            line_count = text.count("\n") + 1
-            if line_count <= 6 or len(text) > 131072:
-                print(f" ⚠️ Text from {filename} is {'too short' if line_count <= 6 else 'too long'} ({line_count} lines / {len(text)} chars). Trying DOCX→PDF fallback.")
-                pdf_path = convert_docx_to_pdf(docx_path)
-                if pdf_path and os.path.exists(pdf_path):
-                    pdf_text = extract_text_from_pdf(pdf_path)
-                    if pdf_text and len(pdf_text.strip()) < len(text.strip()):
-                        print(f" ✅ PDF fallback successful. Using extracted text from PDF for {filename}.")
-                        text = pdf_text
-                    else:
-                        print(f" ℹ️ PDF fallback did not improve extraction. Keeping original DOCX text.")
-                else:
-                    print(f" ❌ Failed to convert {docx_path} to PDF. Keeping DOCX text.")
+    # --- Extraction (serial or across a process pool) ---
+    source_paths = [file_path for file_path, _ in files_to_extract]
+    if workers > 1 and len(source_paths) > 1:
+        workers = min(workers, len(source_paths))
+        print(f" [POOL] Extracting {len(source_paths)} files with {workers} worker processes (chunksize={chunksize})...")
+        output_paths = _extract_in_pool(source_paths, workers, chunksize)
+    else:
+        output_paths = [_extract_and_save_cv_isolated(file_path) for file_path in source_paths]
 
-        # --- Cleaning and Saving ---
-        if text and text.strip():
-            print(f" [CLEANING] Cleaning text for {filename} ...")
-            initial_len = len(text)
-            text = clean_text(text)
-            cleaned_len = len(text)
-            print(f" [CLEANING] Original text length: {initial_len}, Cleaned text length: {cleaned_len}")
+    for (file_path, fingerprint), output_path in zip(files_to_extract, output_paths):
+        if output_path is None:
+            continue
+        processed_files_paths.append(output_path)
+        if manifest is not None:
+            manifest.record_extraction(file_path, fingerprint, output_path)
 
-            try:
-                output_filename = os.path.splitext(filename)[0] + '.txt'
-                output_path = os.path.join(EXTRACTED_TEXT_DIR, output_filename)
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                processed_files_paths.append(output_path)
-                print(f" ✅ Text saved to {output_path}")
-            except Exception as e:
-                print(f" ❌ Could not save text for {filename}: {type(e).__name__}: {e}")
-        else:
-            print(f" ⚠️ No meaningful text extracted from {filename}.")
+    if manifest is not None:
+        manifest.save()
+        print(f" [MANIFEST] Skipped {skipped_count} unchanged files.")
+        performance_logger.info(f"Preprocessing skipped {skipped_count} unchanged files; {len(processed_files_paths)} files need parsing.")
 
     print(f"\n✅ Finished preprocessing {len(processed_files_paths)} files. Saved in '{EXTRACTED_TEXT_DIR}'.")
     return processed_files_paths
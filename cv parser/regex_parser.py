@@ -1,19 +1,44 @@
 # regex_parser.py
+import contextvars
 import os
 import re
 import json
 from datetime import datetime
 import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 
 # Import paths from config
-from config import EXTRACTED_TEXT_DIR, REGEX_PARSED_RESULTS_DIR, CV_FILES_DIR  
-from logger import performance_logger, time_function
+from config import EXTRACTED_TEXT_DIR, REGEX_PARSED_RESULTS_DIR, CV_FILES_DIR, LLM_EXECUTION_MODE, LLM_MAX_CONCURRENCY, LLM_EXTRACTION_MODE, MANIFEST_PATH, RAG_ENABLED, VECTOR_INDEX_ENABLED, DETERMINISTIC_TIER_ENABLED, DETERMINISTIC_CONFIDENCE_THRESHOLD
+from config import INCREMENTAL_PREPROCESSING, PIPELINE_ENABLED, MAP_REDUCE_ENABLED, MAP_REDUCE_SECTIONS, MAP_REDUCE_THRESHOLD_TOKENS, METRICS_HTTP_PORT
+from logger import performance_logger, time_function, log_function_timings
+from metrics import registry, cv_label
+from manifest import CVManifest
+from deterministic_parser import run_deterministic_tier, tier_stats
+from vector_index import VectorIndex
+from batch_runner import BatchRunner
+from ingest_pipeline import run_cv_ingestion
+from context_packer import pack_context, estimate_tokens, context_budget
+from text_normalizer import normalize_text
+from text_chunker import chunk_text
 # Import preprocessing function
 from preprocess_cv import preprocess_cvs
 
 # Import ALL LLM parsing functions from llm_parser.py
 from llm_parser import (
+    response_cache,
+    embedding_cache,
+    parse_stats,
+    routing_stats,
+    call_policy_stats,
+    scheduler,
+    log_section_latencies,
+    circuit_breaker,
+    client,
+    warm_up_models,
     get_embedding,
+    get_embeddings,
     _call_ollama, 
     extract_name_with_llm,
     extract_skills_with_llm,
@@ -21,7 +46,9 @@ from llm_parser import (
     extract_education_with_llm,
     extract_projects_with_llm,
     extract_certifications_with_llm,
-    extract_languages_with_llm
+    extract_languages_with_llm,
+    extract_all_sections_with_llm,
+    extract_section_map_reduce
 )
 
 
@@ -34,6 +61,8 @@ def clean_text_for_parsing(text):
     This mostly ensures consistent line endings and space compression,
     and removes any residual non-ASCII that might have slipped through
     or been re-introduced (though unlikely with the aggressive first pass).
+    Reference implementation: text_normalizer.normalize_text now applies these
+    steps (together with preprocess_cv.clean_text) in a single pass.
     """
     
     text = re.sub(r'\r\n|\r', '\n', text) # Normalize all line endings to \n
@@ -76,95 +105,145 @@ def extract_contact_info(text):
 
     return contact_info
 
-def chunk_text(text, max_chunk_size=1500, overlap=80):
+def build_embedding_matrix(embeddings):
     """
-    Chunks text into smaller pieces with overlap for RAG.
-    Prioritizes splitting at natural boundaries (e.g., double newlines).
+    Stacks embeddings into one contiguous float32 matrix (one row per embedding) and
+    L2-normalizes the rows once, so a dot product with it is a cosine similarity.
     """
-    chunks = []
-    paragraphs = text.split('\n\n') # Split by double newlines (paragraphs)
-    current_chunk = ""
-
-    for para in paragraphs:
-        # Check if adding the current paragraph exceeds max_chunk_size
-        # +2 for potential \n\n if this isn't the last paragraph
-        if len(current_chunk) + len(para) + 2 <= max_chunk_size:
-            current_chunk += (para + '\n\n')
-        else:
-            if current_chunk: # If current_chunk is not empty, add it
-                chunks.append(current_chunk.strip())
-            current_chunk = para + '\n\n' # Start a new chunk with the current paragraph
-
-            # If a single paragraph is too large, split it further
-            while len(current_chunk) > max_chunk_size:
-                # Find a good split point (last space before max_chunk_size)
-                split_point = current_chunk.rfind(' ', 0, max_chunk_size)
-                if split_point == -1: # No space found, force split at max_chunk_size
-                    split_point = max_chunk_size
-                chunks.append(current_chunk[:split_point].strip())
-                current_chunk = current_chunk[split_point:].strip()
-
-    if current_chunk: # Add any remaining text as a chunk
-        chunks.append(current_chunk.strip())
-
-    # Add overlap if desired (simplified for this context, can be more sophisticated)
-    final_chunks = []
-    for i, chunk in enumerate(chunks):
-        if i > 0:
-            overlap_text = chunks[i-1][-overlap:] if len(chunks[i-1]) > overlap else chunks[i-1]
-            final_chunks.append(overlap_text + '\n' + chunk)
-        else:
-            final_chunks.append(chunk)
+    if len(embeddings) == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    matrix = np.array(embeddings, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # Leave all-zero vectors as they are
+    matrix /= norms
+    return matrix
+
+def _top_k_indices(scores, top_k):
+    """Indices of the top_k highest scores, best first. Only the selected k are sorted."""
+    if top_k >= len(scores):
+        candidates = np.arange(len(scores))
+    else:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
 
-    return [c for c in final_chunks if c] # Filter out any empty chunks
 @time_function
+def retrieve_relevant_chunks_for_queries(queries, chunk_matrix, chunk_texts):
+    """
+    Retrieves the most relevant chunks for several queries at once.
+    `queries` maps a name to (query, top_k) and `chunk_matrix` comes from
+    build_embedding_matrix. All queries are embedded in one batch and scored against
+    every chunk with a single matrix product. Returns {name: [chunk, ...]} best first;
+    names whose query could not be embedded are left out.
+    """
+    if not queries or chunk_matrix.shape[0] == 0:
+        return {}
+    names = list(queries)
+    query_embeddings = get_embeddings([queries[name][0] for name in names])
+    usable = [(name, embed) for name, embed in zip(names, query_embeddings) if embed is not None]
+    for name, embed in zip(names, query_embeddings):
+        if embed is None:
+            print(f"DEBUG: Failed to get embedding for query '{name}'. Skipping RAG for this query.")
+    if not usable:
+        return {}
+
+    query_matrix = build_embedding_matrix([embed for _, embed in usable])
+    similarities = query_matrix @ chunk_matrix.T  # (queries x chunks) cosine similarities
+
+    relevant_chunks = {}
+    for row, (name, _) in enumerate(usable):
+        query, top_k = queries[name]
+        relevant_chunks[name] = [chunk_texts[index] for index in _top_k_indices(similarities[row], top_k)]
+        performance_logger.info(f"Retrieved {len(relevant_chunks[name])} relevant chunks for query: {query[:50]}...")
+    return relevant_chunks
+
 def retrieve_relevant_chunks(full_text_content, query, chunk_embeddings, chunk_texts, top_k=3):
     """
     Retrieves top_k most relevant chunks based on a query.
+    `chunk_embeddings` is either a list of vectors or a matrix from build_embedding_matrix.
     """
-    query_embedding = get_embedding(query)
-    if not query_embedding:
-        print("DEBUG: Failed to get embedding for query. Skipping RAG for this query.")
-        return []
-
-    similarities = []
-    for i, chunk_embed in enumerate(chunk_embeddings):
-        
-        if chunk_embed:
-            similarity = sum(qe * ce for qe, ce in zip(query_embedding, chunk_embed))
-            similarities.append((similarity, i,))
-
-    # Sort by similarity in descending order
-    similarities.sort(key=lambda x: x[0],reverse=True)
-
-    # Retrieve top_k chunks
-    relevant_chunks = []
-    for _, index in similarities[:top_k]:
-        relevant_chunks.append(chunk_texts[index])
-    performance_logger.info(f"Retrieved {len(relevant_chunks)} relevant chunks for query: {query[:50]}...")
-    return relevant_chunks
+    chunk_matrix = chunk_embeddings if isinstance(chunk_embeddings, np.ndarray) else build_embedding_matrix(chunk_embeddings)
+    return retrieve_relevant_chunks_for_queries({"query": (query, top_k)}, chunk_matrix, chunk_texts).get("query", [])
+
+# --- Section segmentation ---
+# Header keyword (upper case, matched case-insensitively with an optional suffix such as
+# "S" or "AL") -> canonical section name used in the section map.
+SECTION_HEADER_KEYWORDS = {
+    "EXPERIENCE": "EXPERIENCE", "WORK HISTORY": "EXPERIENCE", "EMPLOYMENT": "EXPERIENCE",
+    "EDUCATION": "EDUCATION", "ACADEMIC": "EDUCATION", "QUALIFICATION": "EDUCATION",
+    "PROJECT": "PROJECTS", "PUBLICATION": "PUBLICATIONS",
+    "AWARD": "AWARDS", "ACHIEVEMENT": "AWARDS", "HONOR": "AWARDS", "HONOUR": "AWARDS",
+    "LANGUAGE": "LANGUAGES", "CERTIFICATION": "CERTIFICATIONS", "CERTIFICATE": "CERTIFICATIONS",
+    "TRAINING": "TRAINING", "COURSE": "TRAINING", "REFERENCE": "REFERENCES",
+    "SUMMARY": "SUMMARY", "OBJECTIVE": "SUMMARY", "PROFILE": "PROFILE",
+    "SKILL": "SKILLS", "HOBBIES": "HOBBIES", "INTERESTS": "HOBBIES",
+    "PERSONAL DETAILS": "PERSONAL", "PERSONAL INFORMATION": "PERSONAL", "DECLARATION": "DECLARATION",
+}
+
+# One pattern for every header line: up to two leading words, a header keyword, up to
+# three trailing words, then the end of the line or a colon followed by inline content.
+# The leading words are greedy, so the last keyword among the first words names the
+# section ("ACADEMIC PROJECTS" -> PROJECTS, "Educational Qualifications" -> EDUCATION).
+_HEADER_WORD = r"[A-Za-z&/().,'-]+"
+_SECTION_HEADER_PATTERN = re.compile(
+    rf"^[^\S\n]*(?:{_HEADER_WORD}[^\S\n]+){{0,2}}"
+    rf"(?P<keyword>{'|'.join(sorted(SECTION_HEADER_KEYWORDS, key=len, reverse=True))})[A-Za-z]*"
+    rf"(?:[^\S\n]+{_HEADER_WORD}){{0,3}}[^\S\n]*(?P<colon>[:\-][^\S\n]*)?(?P<inline>[^\n]*)$",
+    re.IGNORECASE | re.MULTILINE
+)
+# Shorter sections are treated as a stray header and the extractor gets the wider context
+MIN_SECTION_CONTEXT_CHARS = 200
+
+_HEADER_KEYWORD_CANONICAL = {re.sub(r'\s+', ' ', keyword): section for keyword, section in SECTION_HEADER_KEYWORDS.items()}
+
 
-def extract_section(text, section_name):
+def _is_header_line(match):
+    """A header is written in capitals or title case, or ends in a colon; sentences are not headers."""
+    if match.group("inline") and not match.group("colon"):
+        return False
+    header_text = match.group(0)[:match.start("inline") - match.start()].strip(" :-")
+    if match.group("colon") or header_text.isupper():
+        return True
+    return all(word[0].isupper() or word.lower() in ("and", "of", "&", "/") for word in header_text.split() if word[0].isalpha())
+
+
+def build_section_map(text):
+    """
+    Segments a resume in one pass over the text: every header line found by the single
+    precompiled header pattern starts a section that ends where the next header starts.
+    Returns {canonical section name: (start, end)} character spans of the section bodies
+    (inline content after "Header:" included). A header naming the section that is already
+    open (e.g. a "Qualification" table column under "ACADEMIC BACKGROUND") does not split
+    it. The first occurrence of a section with a non-trivial body wins.
+    """
+    headers = []
+    for match in _SECTION_HEADER_PATTERN.finditer(text):
+        if _is_header_line(match):
+            section = _HEADER_KEYWORD_CANONICAL[re.sub(r'\s+', ' ', match.group("keyword").upper())]
+            if not headers or headers[-1][0] != section:
+                headers.append((section, match.start(), match.start("inline")))
+
+    section_map = {}
+    for number, (section, _, body_start) in enumerate(headers):
+        body_end = headers[number + 1][1] if number + 1 < len(headers) else len(text)
+        previous = section_map.get(section)
+        if previous is None or len(text[previous[0]:previous[1]].strip()) < 20:
+            section_map[section] = (body_start, body_end)
+    return section_map
+
+
+def extract_section(text, section_name, section_map=None):
     """
     Extracts text content for a specific section based on typical CV headings.
-    Improved to handle variations and potential trailing text.
-    It looks for the section name (case-insensitive, optionally with spaces around)
-    followed by content, up until another common CV section header or end of document.
+    The section is sliced from section_map (see build_section_map), which is built here
+    when the caller does not already hold one for this text.
+    Returns the stripped section body, or None if the section is missing or empty.
     """
-     
-    # the target section (e.g., "EDUCATION" followed by "EXPERIENCE", not "SKILLS")
-    common_headers_regex = r"(?:EXPERIENCE|WORK HISTORY|Academics|PROFESSIONAL EXPERIENCE|PROJECTS|PUBLICATIONS|AWARDS|LANGUAGES|CERTIFICATIONS|TRAINING|REFERENCES|SUMMARY|PROFILE|SKILLS|EDUCATION|QUALIFICATIONS)\s*:"
-    
-    # Regex to capture content between section_name and the next section header or end of document
-    # It tries to be flexible with leading/trailing whitespace around headers
-    pattern = re.compile(
-        rf"(?:^|\n\s*){re.escape(section_name)}\s*(?:\n+|:)?\s*(.*?)(?=\n\s*{common_headers_regex}|\Z)",
-        re.DOTALL | re.IGNORECASE
-    )
-    match = pattern.search(text)
-    if match:
-        return match.group(1).strip()
-    return None
+    if section_map is None:
+        section_map = build_section_map(text)
+    span = section_map.get(section_name.upper())
+    if span is None:
+        return None
+    return text[span[0]:span[1]].strip() or None
 
 def post_process_experience(experience_list, education_list):
     """
@@ -243,8 +322,58 @@ def post_process_experience(experience_list, education_list):
 
 # --- Main Parsing Pipeline ---
 
+def run_section_extractors(section_tasks, execution_mode=LLM_EXECUTION_MODE, max_concurrency=LLM_MAX_CONCURRENCY, on_result=None):
+    """
+    Runs the LLM section extractors given as {section: (extractor, text_context)}.
+    In "concurrent" mode the extractors are submitted to a thread pool bounded by
+    max_concurrency, so the wall-clock time is roughly that of the slowest section.
+    Each extractor runs in a copy of the caller's context, keeping its LLM priority class.
+    on_result(section, result) is called as each section finishes.
+    Returns {section: result}.
+    """
+    section_results = {}
+    if execution_mode != "concurrent" or max_concurrency <= 1 or len(section_tasks) <= 1:
+        for section, (extractor, text_context) in section_tasks.items():
+            section_results[section] = extractor(text_context)
+            if on_result is not None:
+                on_result(section, section_results[section])
+        return section_results
+
+    workers = min(max_concurrency, len(section_tasks))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="section") as executor:
+        futures = {
+            executor.submit(contextvars.copy_context().run, extractor, text_context): section
+            for section, (extractor, text_context) in section_tasks.items()
+        }
+        for future in as_completed(futures):
+            section_results[futures[future]] = future.result()
+            if on_result is not None:
+                on_result(futures[future], section_results[futures[future]])
+    return section_results
+
+
 @time_function # Apply the decorator here
-def parse_cv_with_pipeline(file_path):
+def parse_cv_with_pipeline(file_path, execution_mode=LLM_EXECUTION_MODE, max_concurrency=LLM_MAX_CONCURRENCY, extraction_mode=LLM_EXTRACTION_MODE, rag_enabled=RAG_ENABLED, deterministic_tier=DETERMINISTIC_TIER_ENABLED, map_reduce=MAP_REDUCE_ENABLED,
+                           completed_sections=None, on_section_done=None):
+    """
+    Parses one extracted CV text file. completed_sections ({section: result}, e.g. restored
+    by batch_runner) are not extracted again; on_section_done(section, result) is called as
+    each LLM section finishes, so a caller can checkpoint them.
+    Its LLM calls are scheduled as interactive work unless the caller is inside
+    llm_scheduler.priority_class("batch") (as BatchRunner is).
+    Metrics recorded while it runs carry the file name as their cv label.
+    """
+    cv_name = os.path.basename(file_path)
+    with cv_label(cv_name):
+        start_time = time.perf_counter()
+        parsed_data = _parse_cv(file_path, execution_mode, max_concurrency, extraction_mode, rag_enabled, deterministic_tier, map_reduce,
+                                completed_sections, on_section_done)
+        registry.set("cv_parse_seconds", time.perf_counter() - start_time, "Time taken to parse each CV", cv=cv_name)
+    return parsed_data
+
+
+def _parse_cv(file_path, execution_mode, max_concurrency, extraction_mode, rag_enabled, deterministic_tier, map_reduce,
+              completed_sections, on_section_done):
     performance_logger.info(f"Processing: {os.path.basename(file_path)}")
     parsed_data = {
         "file_name": os.path.basename(file_path),
@@ -261,27 +390,11 @@ def parse_cv_with_pipeline(file_path):
     with open(file_path, 'r', encoding='utf-8') as f:
         raw_text_content = f.read()
 
-    clean_text_content = clean_text_for_parsing(raw_text_content) # Assuming text is already preprocessed
-
-    # --- Step 1: Initial Regex Extraction (Name, Contact Info) ---
-    # Name - Try LLM first for better accuracy
-    name_query = "What is the full name of the candidate in this resume?"
-    # Pass a reasonable portion of the text where the name is likely found
-    name_llm = extract_name_with_llm(clean_text_content[:2000]) # Increased context for name
-    if name_llm and name_llm.strip() != "N/A":
-        parsed_data["name"] = name_llm.strip()
-        performance_logger.info(f"    Name (LLM): {parsed_data['name']}")
-    else:
-        # Fallback regex if LLM fails (less accurate, but a backup)
-        # Tries to find capitalized words at the beginning, usually a name
-        name_match = re.search(r'^[A-Z][a-z]+(?:\s[A-Z][a-z]+){1,3}', clean_text_content[:500])
-        if name_match:
-            parsed_data["name"] = name_match.group(0).strip()
-            performance_logger.info(f"    Name (Regex Fallback): {parsed_data['name']}")
-        else:
-            parsed_data["name"] = "N/A"
-            performance_logger.info(f"    Name (Regex Fallback): {parsed_data['name']} (Not Found)")
+    # preprocess_cv already writes normalized text; normalizing again is cheap and covers
+    # text files from older runs or from elsewhere
+    clean_text_content = normalize_text(raw_text_content)
 
+    # --- Step 1: Initial Regex Extraction (Contact Info) ---
     # Contact Info (Email, Phone, URLs) - Best handled by regex
     contact_info = extract_contact_info(clean_text_content)
     parsed_data["contact_info"] = contact_info
@@ -292,86 +405,165 @@ def parse_cv_with_pipeline(file_path):
     # --- Step 2: RAG Pipeline for other sections ---
     # Generate chunks and embeddings for the entire document once
     chunk_texts = chunk_text(clean_text_content)
-    # Filter out any None embeddings
-    # chunk_embeddings_start_time = time.time()
-    # chunk_embeddings = [get_embedding(chunk) for chunk in chunk_texts]
-    # chunk_embeddings_filtered = [embed for embed in chunk_embeddings if embed is not None]
-    # chunk_texts_filtered = [chunk_texts[i] for i, embed in enumerate(chunk_embeddings) if embed is not None]
-    # chunk_enbedding_end_time = time.time()
-    # total_time = chunk_enbedding_end_time - chunk_embeddings_start_time
-    # performance_logger.info(f"Total get_embedding execution time: {total_time:.4f} seconds")
-    # performance_logger.info(f"Generating embeddings for {len(chunk_texts_filtered)} usable chunks...")
+    full_context = ' '.join(chunk_texts)
+
+    # Retrieval query and top_k per section; every query is scored in one batch below
+    rag_queries = {
+        "skills": ("List of distinct technical skills, programming languages, software, tools, and methodologies from this resume.", 5),
+        "experience": ("Candidate's work experience, employment history, EMPLOYMENT RECORD RELEVANT TO THE ASSIGNMENT, job titles, companies, start and end dates, and responsibilities.", 12),
+        "projects": ("List of projects, assignments, or key deliverables with descriptions, technologies, client_company and dates.", 10),
+        "certifications": ("List of certifications, professional licenses, training programs, and workshops completed.", 5),
+        "education": ("Academic degrees, diplomas, institutions, and graduation years.", 3),
+        "languages": ("List of languages spoken, reading and writing proficiency levels from a table.", 3),
+    }
+    rag_contexts = {}
+    if rag_enabled:
+        # Batched and cached (see llm_parser.get_embeddings), so unchanged chunks cost nothing on later runs
+        chunk_embeddings_start_time = time.time()
+        chunk_embeddings = get_embeddings(chunk_texts)
+        # Filter out any None embeddings
+        chunk_embeddings_filtered = [embed for embed in chunk_embeddings if embed is not None]
+        chunk_texts_filtered = [chunk_texts[i] for i, embed in enumerate(chunk_embeddings) if embed is not None]
+        total_time = time.time() - chunk_embeddings_start_time
+        performance_logger.info(f"Total get_embeddings execution time: {total_time:.4f} seconds")
+        performance_logger.info(f"Generated embeddings for {len(chunk_texts_filtered)} usable chunks...")
+        chunk_matrix = build_embedding_matrix(chunk_embeddings_filtered)
+        relevant_chunks = retrieve_relevant_chunks_for_queries(rag_queries, chunk_matrix, chunk_texts_filtered)
+        rag_contexts = {section: ' '.join(chunks) for section, chunks in relevant_chunks.items() if chunks}
+
+    # Every section extractor only depends on the cleaned text, so the contexts are built
+    # up front and the LLM calls are handed to run_section_extractors together.
+    section_tasks = {}
+    # Every header is located in one pass; the section contexts below are slices of this map
+    section_map = build_section_map(clean_text_content)
 
+    # Name - Try LLM first for better accuracy
+    name_query = "What is the full name of the candidate in this resume?"
+    # Pass a reasonable portion of the text where the name is likely found
+    section_tasks["name"] = (extract_name_with_llm, clean_text_content[:2000]) # Increased context for name
 
     # Skills
-    skills_query = "List of distinct technical skills, programming languages, software, tools, and methodologies from this resume."
-    # Corrected call: removed redundant clean_text_content argument
-    # skills_chunks = retrieve_relevant_chunks(clean_text_content,skills_query, chunk_embeddings_filtered, chunk_texts_filtered, top_k=5)
-    # performance_logger.debug(f"Retrieved {len(skills_chunks)} chunks for skills. Context length: {len(' '.join(skills_chunks))} chars.")
-    # performance_logger.debug(f"Context for Skills (first 800 chars):\n{' '.join(skills_chunks)[:800]}...") # Removed for brevity in log, use for deep debugging
-    parsed_data["skills"] = extract_skills_with_llm(' '.join(chunk_texts)) # Changed to use all filtered chunks
-    performance_logger.info(f"    Skills (LLM via RAG): {len(parsed_data['skills'])} entries")
+    section_tasks["skills"] = (extract_skills_with_llm, rag_contexts.get("skills", full_context))
 
-    # Experience
-    experience_query = "Candidate's work experience, employment history, EMPLOYMENT RECORD RELEVANT TO THE ASSIGNMENT, job titles, companies, start and end dates, and responsibilities."
-    # Corrected call: removed redundant clean_text_content argument
-    # experience_chunks = retrieve_relevant_chunks(clean_text_content,experience_query, chunk_embeddings_filtered, chunk_texts_filtered, top_k=12)
-    # performance_logger.debug(f"Retrieved {len(experience_chunks)} chunks for experience. Context length: {len(' '.join(experience_chunks))} chars.")
-    # performance_logger.debug(f"Context for Experience (first 1500 chars):\n{' '.join(experience_chunks)[:1000]}...") # Removed for brevity in log
-    parsed_data["experience"] = extract_experience_with_llm(' '.join(chunk_texts))
-    performance_logger.info(f"    Experience (LLM via RAG): {len(parsed_data['experience'])} entries")
+    # Experience (Own section when the resume has a substantial one, otherwise RAG / full text)
+    experience_section_text = extract_section(clean_text_content, "EXPERIENCE", section_map)
+    if experience_section_text and len(experience_section_text) >= MIN_SECTION_CONTEXT_CHARS:
+        performance_logger.debug(f"Passing to LLM for Experience (from regex section): First 500 chars:\n{experience_section_text[:500]}...")
+        section_tasks["experience"] = (extract_experience_with_llm, experience_section_text)
+    else:
+        section_tasks["experience"] = (extract_experience_with_llm, rag_contexts.get("experience", full_context))
 
     # Projects
-    projects_query = "List of projects, assignments, or key deliverables with descriptions, technologies, client_company and dates."
-    # Corrected call: removed redundant clean_text_content argument
-    # projects_chunks = retrieve_relevant_chunks(clean_text_content, projects_query, chunk_embeddings_filtered, chunk_texts_filtered, top_k=10)
-    # performance_logger.debug(f"Retrieved {len(projects_chunks)} chunks for projects. Context length: {len(' '.join(projects_chunks))} chars.")
-    parsed_data["projects"] = extract_projects_with_llm(' '.join(chunk_texts))
-    performance_logger.info(f"    Projects (LLM via RAG): {len(parsed_data['projects'])} entries")
+    section_tasks["projects"] = (extract_projects_with_llm, rag_contexts.get("projects", full_context))
 
     # Certifications (Prioritize section extraction, fallback to RAG)
-    certifications_section_text = extract_section(clean_text_content, "CERTIFICATIONS")
+    certifications_section_text = extract_section(clean_text_content, "CERTIFICATIONS", section_map)
     if not certifications_section_text: # If "CERTIFICATIONS" not found, try "TRAINING"
-        certifications_section_text = extract_section(clean_text_content, "TRAINING")
+        certifications_section_text = extract_section(clean_text_content, "TRAINING", section_map)
     
     if certifications_section_text:
         performance_logger.debug(f"Passing to LLM for Certifications (from regex section): First 500 chars:\n{certifications_section_text[:500]}...")
-        parsed_data["certifications"] = extract_certifications_with_llm(certifications_section_text)
+        section_tasks["certifications"] = (extract_certifications_with_llm, certifications_section_text)
     else:
-        certifications_query = "List of certifications, professional licenses, training programs, and workshops completed."
-        # Corrected call: removed redundant clean_text_content argument
-        # certifications_chunks = retrieve_relevant_chunks(clean_text_content, certifications_query, chunk_embeddings_filtered, chunk_texts_filtered, top_k=5)
-        # performance_logger.debug(f"Retrieved {len(certifications_chunks)} chunks for certifications. Context length: {len(' '.join(certifications_chunks))} chars.")
-        parsed_data["certifications"] = extract_certifications_with_llm(' '.join(chunk_texts))
-    performance_logger.info(f"    Certifications (LLM): {len(parsed_data['certifications'])} entries") # Changed to LLM, as it might be section or RAG
+        section_tasks["certifications"] = (extract_certifications_with_llm, rag_contexts.get("certifications", full_context))
 
     # Education (Section extraction is usually robust here)
-    education_section_text = extract_section(clean_text_content, "EDUCATION")
+    education_section_text = extract_section(clean_text_content, "EDUCATION", section_map)
     if education_section_text:
         performance_logger.debug(f"Passing to LLM for Education (from regex section): First 500 chars:\n{education_section_text[:500]}...")
-        parsed_data["education"] = extract_education_with_llm(education_section_text)
+        section_tasks["education"] = (extract_education_with_llm, education_section_text)
     else:
         # Fallback to RAG if explicit section not found
-        education_query = "Academic degrees, diplomas, institutions, and graduation years."
-        # Corrected call: removed redundant clean_text_content argument
-        # education_chunks = retrieve_relevant_chunks(clean_text_content, education_query, chunk_embeddings_filtered, chunk_texts_filtered, top_k=3)
-        # performance_logger.debug(f"Retrieved {len(education_chunks)} chunks for education. Context length: {len(' '.join(education_chunks))} chars.")
-        parsed_data["education"] = extract_education_with_llm(' '.join(chunk_texts))
-    performance_logger.info(f"    Education (LLM): {len(parsed_data['education'])} entries") # Changed to LLM, as it might be section or RAG
+        section_tasks["education"] = (extract_education_with_llm, rag_contexts.get("education", full_context))
 
     # Languages (Force RAG to handle the table format, increased top_k)
-    languages_query = "List of languages spoken, reading and writing proficiency levels from a table."
-    # Corrected call: removed redundant clean_text_content argument
-    # languages_chunks = retrieve_relevant_chunks(clean_text_content, languages_query, chunk_embeddings_filtered, chunk_texts_filtered, top_k=3)
     if chunk_texts:
-        # performance_logger.debug(f"Retrieved {len(languages_chunks)} chunks for languages. Context length: {len(' '.join(languages_chunks))} chars.")
-        parsed_data["languages"] = extract_languages_with_llm(' '.join(chunk_texts))
+        section_tasks["languages"] = (extract_languages_with_llm, rag_contexts.get("languages", full_context))
     else:
         performance_logger.info("No relevant chunks found for languages. Languages will be empty.")
-        parsed_data["languages"] = [] # Ensure it's an empty list if nothing found
+
+    # Deterministic tier: sections it extracts confidently never reach the LLM
+    deterministic_results = {}
+    if deterministic_tier:
+        deterministic_results = run_deterministic_tier(
+            clean_text_content, list(section_tasks), DETERMINISTIC_CONFIDENCE_THRESHOLD,
+            section_texts={"education": education_section_text}
+        )
+        for section in deterministic_results:
+            del section_tasks[section]
+        tier_stats.record_llm_calls(len(section_tasks))
+        performance_logger.info(f"    Deterministic tier resolved {len(deterministic_results)} section(s), {len(section_tasks)} left for the LLM")
+
+    # Sections finished before an interruption keep their checkpointed result
+    completed_sections = completed_sections or {}
+    for section in completed_sections:
+        section_tasks.pop(section, None)
+
+    # Context packing: every context that would overflow num_ctx is cut down to the blocks most
+    # relevant to its section. The full document is packed from the cleaned text, whose spans
+    # the section map describes (the joined chunks repeat every chunk overlap).
+    # Long experience / project contexts are not packed but extracted with map-reduce, so
+    # no entry is dropped to fit the budget.
+    full_context_tokens = estimate_tokens(full_context)
+    map_reduce_tasks = {}
+    for section, (extractor, text_context) in list(section_tasks.items()):
+        source_text = clean_text_content if text_context is full_context else text_context
+        if map_reduce and section in MAP_REDUCE_SECTIONS and estimate_tokens(source_text) > MAP_REDUCE_THRESHOLD_TOKENS:
+            del section_tasks[section]
+            map_reduce_tasks[section] = (partial(extract_section_map_reduce, section, max_concurrency=max_concurrency), source_text)
+        elif text_context is full_context and full_context_tokens > context_budget(section):
+            section_tasks[section] = (extractor, pack_context(section, clean_text_content, section_map=section_map))
+        else:
+            section_tasks[section] = (extractor, pack_context(section, text_context))
+
+    llm_phase_start_time = time.time()
+    if extraction_mode == "combined":
+        # One call for every section; failed sections are re-queried with their own context
+        section_contexts = {section: text_context for section, (_, text_context) in section_tasks.items()}
+        combined_context = full_context if full_context_tokens <= context_budget("combined") else pack_context("combined", clean_text_content, section_map=section_map)
+        section_results = extract_all_sections_with_llm(combined_context, section_contexts=section_contexts, sections=list(section_tasks))
+        if on_section_done is not None:
+            for section, result in section_results.items():
+                on_section_done(section, result)
+        section_results.update(run_section_extractors(map_reduce_tasks, execution_mode=execution_mode, max_concurrency=max_concurrency, on_result=on_section_done))
+    else:
+        section_tasks.update(map_reduce_tasks)
+        section_results = run_section_extractors(section_tasks, execution_mode=execution_mode, max_concurrency=max_concurrency, on_result=on_section_done)
+    section_results.update(deterministic_results)
+    section_results.update(completed_sections)
+    llm_phase_time = time.time() - llm_phase_start_time
+    performance_logger.info(f"Extraction mode '{extraction_mode}' took {llm_phase_time:.4f} seconds for {os.path.basename(file_path)}")
+
+    name_llm = section_results.get("name")
+    if name_llm and name_llm.strip() != "N/A":
+        parsed_data["name"] = name_llm.strip()
+        performance_logger.info(f"    Name (LLM): {parsed_data['name']}")
+    else:
+        # Fallback regex if LLM fails (less accurate, but a backup)
+        # Tries to find capitalized words at the beginning, usually a name
+        name_match = re.search(r'^[A-Z][a-z]+(?:\s[A-Z][a-z]+){1,3}', clean_text_content[:500])
+        if name_match:
+            parsed_data["name"] = name_match.group(0).strip()
+            performance_logger.info(f"    Name (Regex Fallback): {parsed_data['name']}")
+        else:
+            parsed_data["name"] = "N/A"
+            performance_logger.info(f"    Name (Regex Fallback): {parsed_data['name']} (Not Found)")
+
+    parsed_data["skills"] = section_results.get("skills") or []
+    performance_logger.info(f"    Skills (LLM via RAG): {len(parsed_data['skills'])} entries")
+    parsed_data["experience"] = section_results.get("experience") or []
+    performance_logger.info(f"    Experience (LLM via RAG): {len(parsed_data['experience'])} entries")
+    parsed_data["projects"] = section_results.get("projects") or []
+    performance_logger.info(f"    Projects (LLM via RAG): {len(parsed_data['projects'])} entries")
+    parsed_data["certifications"] = section_results.get("certifications") or []
+    performance_logger.info(f"    Certifications (LLM): {len(parsed_data['certifications'])} entries") # Changed to LLM, as it might be section or RAG
+    parsed_data["education"] = section_results.get("education") or []
+    performance_logger.info(f"    Education (LLM): {len(parsed_data['education'])} entries") # Changed to LLM, as it might be section or RAG
+    parsed_data["languages"] = section_results.get("languages") or [] # Ensure it's an empty list if nothing found
     performance_logger.info(f"    Languages (LLM via RAG): {len(parsed_data['languages'])} entries")
 
     # --- Post-processing for Experience (to remove education entries misclassified as experience) ---
+    # Runs only once both the experience and education extractors have finished.
     original_experience_count = len(parsed_data["experience"])
     parsed_data["experience"] = post_process_experience(parsed_data["experience"], parsed_data["education"])
     performance_logger.info(f"    Experience (After Post-processing): {len(parsed_data['experience'])} entries (removed {original_experience_count - len(parsed_data['experience'])} education-like entries)")
@@ -396,42 +588,84 @@ def parse_cv_with_pipeline(file_path):
     performance_logger.info("-" * 40)
     return final_parsed_data
 
+def index_cv_chunks(vector_index, file_path):
+    """
+    Adds a preprocessed CV's chunks to the corpus-wide vector index for cross-candidate search.
+    The text is normalized and chunked exactly as _parse_cv does, so chunk embeddings come
+    from the embedding cache when the RAG path already computed them.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        chunk_texts = chunk_text(normalize_text(f.read()))
+    written = vector_index.add_document(os.path.basename(file_path), chunk_texts, get_embeddings(chunk_texts))
+    performance_logger.info(f"Vector index: {written} chunks written for {os.path.basename(file_path)}")
+
 # --- Main Execution Block ---
 
 def main():
     print("---Starting Hybrid Regex + RAG/LLM Parsing Pipeline---")
     start_time = time.time()
+    if METRICS_HTTP_PORT:
+        registry.serve_prometheus(METRICS_HTTP_PORT)  # Live metrics while the batch runs
 
-    # 1. Preprocess all CVs to plain text
-    # Removed CV_FILES_DIR argument as preprocess_cvs() gets it from its own config import.
-    processed_files = preprocess_cvs() 
+    vector_index = VectorIndex() if VECTOR_INDEX_ENABLED else None
 
     all_parsed_results = []
 
-    # 2. Iterate through each processed text file and parse
-    for file_path in processed_files:
-        try:
-            parsed_data = parse_cv_with_pipeline(file_path)
-            all_parsed_results.append(parsed_data)
-
-            # Save individual JSON results
-            output_filename = os.path.splitext(os.path.basename(file_path))[0] + "_parsed.json"
-            output_path = os.path.join(REGEX_PARSED_RESULTS_DIR, output_filename)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(parsed_data, f, indent=4)
-            performance_logger.info(f"Final parsed data saved to: {output_path}")
-
-        except Exception as e:
-            performance_logger.error(f"Error processing {os.path.basename(file_path)}: {type(e).__name__}: {e}", exc_info=True)
-            import traceback
-            traceback.print_exc() # Print full traceback for deeper debugging
-    
+    def save_parsed_cv(file_path, parsed_data):
+        all_parsed_results.append(parsed_data)
+
+        # Save individual JSON results
+        output_filename = os.path.splitext(os.path.basename(file_path))[0] + "_parsed.json"
+        output_path = os.path.join(REGEX_PARSED_RESULTS_DIR, output_filename)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(parsed_data, f, indent=4)
+        performance_logger.info(f"Final parsed data saved to: {output_path}")
+        manifest.record_parse(file_path, output_path)
+        manifest.save()
+        if vector_index is not None:
+            index_cv_chunks(vector_index, file_path)
+
+    # Finished sections are checkpointed, so a crashed or interrupted (Ctrl+C / SIGTERM) run
+    # picks up where it stopped
+    runner = BatchRunner(parse_cv_with_pipeline, save_parsed_cv)
+    # Load the model(s) once for the whole batch, with the options every call uses
+    warm_up = lambda: warm_up_models(embedding=RAG_ENABLED or VECTOR_INDEX_ENABLED)
+
+    if PIPELINE_ENABLED:
+        # Extraction, parsing and saving overlap as pipeline stages (see ingest_pipeline.py)
+        manifest = CVManifest(MANIFEST_PATH)
+        run_cv_ingestion(runner, manifest if INCREMENTAL_PREPROCESSING else None, warm_up=warm_up)
+    else:
+        # 1. Preprocess all CVs to plain text
+        # Removed CV_FILES_DIR argument as preprocess_cvs() gets it from its own config import.
+        # Only new/changed resumes (and ones without parsed JSON) are returned
+        processed_files = preprocess_cvs()
+        manifest = CVManifest(MANIFEST_PATH)
+        if processed_files:
+            warm_up()
+        # 2. Parse each processed text file
+        runner.run(processed_files)
+
     end_time = time.time()
     total_time = end_time - start_time
 
     
     performance_logger.info(f"Total script execution time: {total_time:.4f} seconds")
-    performance_logger.info(f"Processed {len(processed_files)} files.")
+    if response_cache is not None:
+        response_cache.log_stats()
+    embedding_cache.log_stats()
+    tier_stats.log_stats()
+    parse_stats.log_stats()
+    routing_stats.log_stats()
+    call_policy_stats.log_stats(circuit_breaker)
+    scheduler.log_stats()
+    log_function_timings()
+    log_section_latencies()
+    registry.export_jsonl()
+    registry.export_prometheus()
+    if client is not None:
+        client.log_stats()
+    performance_logger.info(f"Processed {runner.completed} of {runner.total} files ({runner.failed} failed).")
     performance_logger.info(f"Results saved to '{REGEX_PARSED_RESULTS_DIR}'.")
     performance_logger.info(f"\n---Program Completed---")
 
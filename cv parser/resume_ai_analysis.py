@@ -1,7 +1,19 @@
 import json
-from llm_parser import _call_ollama, _parse_llm_json_output
+from llm_parser import _call_ollama_json
 from config import OLLAMA_MODEL_NAME
 
+# JSON schema of the analysis, sent as Ollama's `format` (see llm_parser._call_ollama_json)
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "career_growth_score": {"type": "number"},
+        "ats_score": {"type": "number"},
+        "recommended_jobs": {"type": "array", "items": {"type": "string"}},
+        "summary": {"type": "string"},
+    },
+    "required": ["career_growth_score", "ats_score", "recommended_jobs", "summary"],
+}
+
 def analyze_resume_with_llm(parsed_resume):
     """
     Uses Ollama LLM to generate:
@@ -38,8 +50,7 @@ def analyze_resume_with_llm(parsed_resume):
     {resume_json}
     """
 
-    response = _call_ollama(prompt, model=OLLAMA_MODEL_NAME)
-    parsed = _parse_llm_json_output(response)
+    parsed = _call_ollama_json(prompt, "analysis", ANALYSIS_SCHEMA, model=OLLAMA_MODEL_NAME)
 
     if not parsed or not isinstance(parsed, dict):
         return {
@@ -0,0 +1,104 @@
+# test_deterministic_parser.py
+# Run from this folder: python -m unittest test_deterministic_parser
+import os
+import tempfile
+import unittest
+
+from docx import Document
+
+from config import DETERMINISTIC_CONFIDENCE_THRESHOLD
+from deterministic_parser import extract_education_deterministic, extract_languages_deterministic, run_deterministic_tier
+from preprocess_cv import extract_text_from_docx
+from text_normalizer import normalize_text
+
+
+def _levels(languages):
+    return {entry["language"]: (entry["speaking"], entry["reading"], entry["writing"]) for entry in languages}
+
+
+class LanguageLevelsTest(unittest.TestCase):
+
+    def assertResolved(self, text, expected):
+        languages, confidence = extract_languages_deterministic(text)
+        self.assertEqual(_levels(languages), expected)
+        self.assertGreaterEqual(confidence, DETERMINISTIC_CONFIDENCE_THRESHOLD)
+
+    def test_level_in_brackets_after_each_language(self):
+        self.assertResolved("Languages: English (Fluent), German (Basic)",
+                            {"English": ("Fluent",) * 3, "German": ("Basic",) * 3})
+
+    def test_level_before_a_list(self):
+        self.assertResolved("Languages\nFluent in English, Hindi",
+                            {"English": ("Fluent",) * 3, "Hindi": ("Fluent",) * 3})
+
+    def test_level_after_a_list(self):
+        self.assertResolved("Languages: English, Hindi - Fluent",
+                            {"English": ("Fluent",) * 3, "Hindi": ("Fluent",) * 3})
+
+    def test_speak_read_write_levels(self):
+        self.assertResolved("Languages: English: Speaking - Fluent, Reading - Good, Writing - Good",
+                            {"English": ("Fluent", "Good", "Good")})
+
+    def test_list_without_levels(self):
+        self.assertResolved("Languages Known: English, Hindi and Marathi",
+                            {"English": ("N/A",) * 3, "Hindi": ("N/A",) * 3, "Marathi": ("N/A",) * 3})
+
+    def test_unpaired_level_goes_to_the_llm(self):
+        for text in ("Languages: English, Hindi (Fluent)", "Languages\nEnglish\nFluent", "Languages: English (Fluent, Basic)"):
+            with self.subTest(text=text):
+                _, confidence = extract_languages_deterministic(text)
+                self.assertLess(confidence, DETERMINISTIC_CONFIDENCE_THRESHOLD)
+
+
+def _docx_text(paragraphs, tables):
+    """Normalized text of a DOCX resume built from paragraphs and tables (lists of rows of cells)."""
+    document = Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    for rows in tables:
+        table = document.add_table(rows=len(rows), cols=len(rows[0]))
+        for row_number, row in enumerate(rows):
+            for column, cell in enumerate(row):
+                table.cell(row_number, column).text = cell
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "resume.docx")
+        document.save(path)
+        return normalize_text(extract_text_from_docx(path))
+
+
+class DocxTableTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.text = _docx_text(
+            ["Rahul Sharma", "EDUCATION", "Details in the table below."],
+            [
+                [["S.No", "Qualification", "Institute / University", "Year", "Percentage"],
+                 ["1", "B.Tech (Civil Engineering)", "Indian Institute of Technology, Delhi", "2015", "8.5 CGPA"],
+                 ["2", "Class XII", "Kendriya Vidyalaya, CBSE", "2011", "89%"]],
+                [["Language", "Read", "Write", "Speak"],
+                 ["English", "Fluent", "Fluent", "Good"],
+                 ["Hindi", "Native", "Native", "Native"]],
+            ],
+        )
+
+    def test_education_rows(self):
+        entries, confidence = extract_education_deterministic("Details in the table below.", self.text)
+        self.assertEqual(entries, [
+            {"degree": "B.Tech (Civil Engineering)", "institution": "Indian Institute of Technology, Delhi", "year": "2015"},
+            {"degree": "Class XII", "institution": "Kendriya Vidyalaya, CBSE", "year": "2011"},
+        ])
+        self.assertGreaterEqual(confidence, DETERMINISTIC_CONFIDENCE_THRESHOLD)
+
+    def test_language_levels_follow_the_header_columns(self):
+        languages, confidence = extract_languages_deterministic(self.text)
+        self.assertEqual(_levels(languages), {"English": ("Good", "Fluent", "Fluent"), "Hindi": ("Native",) * 3})
+        self.assertGreaterEqual(confidence, DETERMINISTIC_CONFIDENCE_THRESHOLD)
+
+    def test_tier_reads_tables_without_an_education_section(self):
+        resolved = run_deterministic_tier(self.text, ["education", "languages"], DETERMINISTIC_CONFIDENCE_THRESHOLD)
+        self.assertEqual(sorted(resolved), ["education", "languages"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+# test_llm_parser.py
+# Run from this folder: python -m unittest test_llm_parser
+import unittest
+
+from llm_parser import merge_section_entries
+
+
+class MergeSectionEntriesTest(unittest.TestCase):
+
+    def test_entry_split_by_chunk_overlap_is_merged(self):
+        first_chunk = [{"company": "Acme Corp", "title": "Engineer", "start_date": "Jan 2020", "end_date": "N/A"}]
+        second_chunk = [{"company": "ACME Corp.", "title": "engineer", "start_date": "N/A", "end_date": "Dec 2022"}]
+        self.assertEqual(merge_section_entries("experience", [first_chunk, second_chunk]),
+                         [{"company": "Acme Corp", "title": "Engineer", "start_date": "Jan 2020", "end_date": "Dec 2022"}])
+
+    def test_missing_start_date_on_the_first_side(self):
+        first_chunk = [{"company": "Acme", "title": "Engineer", "start_date": "", "description": "N/A"}]
+        second_chunk = [{"company": "Acme", "title": "Engineer", "start_date": "2019", "description": "Built roads"}]
+        self.assertEqual(merge_section_entries("experience", [first_chunk, second_chunk]),
+                         [{"company": "Acme", "title": "Engineer", "start_date": "2019", "description": "Built roads"}])
+
+    def test_different_start_dates_stay_separate(self):
+        entries = [{"company": "Acme", "title": "Engineer", "start_date": "2018"},
+                   {"company": "Acme", "title": "Engineer", "start_date": "2021"}]
+        self.assertEqual(merge_section_entries("experience", [entries[:1], entries[1:]]), entries)
+
+    def test_entries_without_key_fields_are_dropped(self):
+        entries = [{"company": "N/A", "title": "N/A", "start_date": "N/A"}, {"company": None, "title": ""}, "not an entry"]
+        self.assertEqual(merge_section_entries("experience", [entries, None]), [])
+
+    def test_projects_merge_by_name_in_chunk_order(self):
+        merged = merge_section_entries("projects", [
+            [{"project_name": "Ring Road", "role": "N/A"}, {"project_name": "Metro Line 2", "role": "Lead"}],
+            [{"project_name": "ring road", "role": "Designer"}],
+        ])
+        self.assertEqual(merged, [{"project_name": "Ring Road", "role": "Designer"}, {"project_name": "Metro Line 2", "role": "Lead"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
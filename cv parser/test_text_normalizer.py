@@ -0,0 +1,74 @@
+# test_text_normalizer.py
+# Run from this folder: python -m unittest test_text_normalizer
+import glob
+import os
+import re
+import unittest
+
+from config import BASE_DIR, CV_FILES_DIR
+from preprocess_cv import clean_text, extract_text_from_docx, iter_text_from_pdf
+from regex_parser import clean_text_for_parsing
+from text_normalizer import normalize_text, normalize_text_stream
+
+# Documents exercising every rule: OCR artifacts, symbols, bullets, CRLF, tabs, form feeds,
+# blank lines and non-ASCII runs, also at line starts and next to spaces
+SYNTHETIC_DOCUMENTS = [
+    "  Name\te@ Surname\r\n\r\n\r\n• Python | SQL_*™ ©\f\n\xa0 — “quoted” ‘x’ …\n\n\n\nCafé  naïve 　end e@\n",
+    "e@e@ e@\re@\n\n\n\n\tMixed\r\nline\rendings\t\t and   spaces  \n",
+    "●Skills: C++, C#, .NET ▪ Java ► Go ‣ Rust ✓ ○ done\n\n\n\n📞 +91 98765 43210 ✉ name@example.com",
+    "",
+    "   \n\n\n   ",
+]
+
+
+def _load_corpus():
+    corpus = list(SYNTHETIC_DOCUMENTS)
+    resume_dirs = [CV_FILES_DIR, os.path.join(os.path.dirname(BASE_DIR), 'Resumes')]
+    for path in sorted(p for d in resume_dirs for p in glob.glob(os.path.join(d, '*'))):
+        lower_path = path.lower()
+        if lower_path.endswith('.pdf'):
+            corpus.append(''.join(iter_text_from_pdf(path)))
+        elif lower_path.endswith('.docx'):
+            corpus.append(extract_text_from_docx(path) or '')
+    return corpus
+
+
+class NormalizeTextTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = _load_corpus()
+
+    def test_matches_clean_text_chain_byte_for_byte(self):
+        for number, text in enumerate(self.corpus):
+            with self.subTest(document=number):
+                self.assertEqual(normalize_text(text), clean_text_for_parsing(clean_text(text)))
+
+    def test_text_from_older_runs_is_normalized_like_the_chain(self):
+        # Text files written before the normalizer only went through clean_text
+        for number, text in enumerate(self.corpus):
+            with self.subTest(document=number):
+                cleaned = clean_text(text)
+                self.assertEqual(normalize_text(cleaned), clean_text_for_parsing(cleaned))
+
+    def test_normalizing_again_only_collapses_whitespace(self):
+        # Non-ASCII runs become single spaces, which a second pass may merge with their neighbours
+        for number, text in enumerate(self.corpus):
+            with self.subTest(document=number):
+                once = normalize_text(text)
+                twice = normalize_text(once)
+                self.assertEqual(re.sub(r'\s+', ' ', twice), re.sub(r'\s+', ' ', once).strip())
+                self.assertEqual(normalize_text(twice), twice)
+
+    def test_stream_matches_whole_text(self):
+        for number, text in enumerate(self.corpus):
+            with self.subTest(document=number):
+                pieces = [text[i:i + 97] for i in range(0, len(text), 97)]
+                self.assertEqual(''.join(normalize_text_stream(pieces, segment_size=256)), normalize_text(text))
+
+    def test_non_string_input(self):
+        self.assertEqual(normalize_text(None), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# text_chunker.py
+# Paragraph-aware text chunking, shared by the RAG path (regex_parser) and map-reduce extraction (llm_parser).
+
+
+def _iter_paragraphs(text_pieces):
+    """Yields the paragraphs (split on double newlines) of text given as an iterable of pieces."""
+    pending = ""
+    for piece in text_pieces:
+        pending += piece
+        *paragraphs, pending = pending.split('\n\n')
+        yield from paragraphs
+    yield pending
+
+def iter_text_chunks(text, max_chunk_size=1500, overlap=80):
+    """
+    Generator behind chunk_text. `text` is either a string or an iterable of text
+    pieces (e.g. text_normalizer.normalize_text_stream output), which is consumed lazily.
+    """
+    paragraphs = text.split('\n\n') if isinstance(text, str) else _iter_paragraphs(text) # Split by double newlines (paragraphs)
+
+    def raw_chunks():
+        current_chunk = ""
+        for para in paragraphs:
+            # Check if adding the current paragraph exceeds max_chunk_size
+            # +2 for potential \n\n if this isn't the last paragraph
+            if len(current_chunk) + len(para) + 2 <= max_chunk_size:
+                current_chunk += (para + '\n\n')
+            else:
+                if current_chunk: # If current_chunk is not empty, add it
+                    yield current_chunk.strip()
+                current_chunk = para + '\n\n' # Start a new chunk with the current paragraph
+
+                # If a single paragraph is too large, split it further
+                while len(current_chunk) > max_chunk_size:
+                    # Find a good split point (last space before max_chunk_size)
+                    split_point = current_chunk.rfind(' ', 0, max_chunk_size)
+                    if split_point == -1: # No space found, force split at max_chunk_size
+                        split_point = max_chunk_size
+                    yield current_chunk[:split_point].strip()
+                    current_chunk = current_chunk[split_point:].strip()
+
+        if current_chunk: # Add any remaining text as a chunk
+            yield current_chunk.strip()
+
+    # Add overlap if desired (simplified for this context, can be more sophisticated)
+    previous_chunk = None
+    for chunk in raw_chunks():
+        if previous_chunk is not None:
+            overlap_text = previous_chunk[-overlap:] if len(previous_chunk) > overlap else previous_chunk
+            final_chunk = overlap_text + '\n' + chunk
+        else:
+            final_chunk = chunk
+        previous_chunk = chunk
+        if final_chunk: # Filter out any empty chunks
+            yield final_chunk
+
+def chunk_text(text, max_chunk_size=1500, overlap=80):
+    """
+    Chunks text into smaller pieces with overlap for RAG.
+    Prioritizes splitting at natural boundaries (e.g., double newlines).
+    Also accepts the text as a stream of pieces (see iter_text_chunks).
+    """
+    return list(iter_text_chunks(text, max_chunk_size, overlap))
@@ -0,0 +1,138 @@
+# text_normalizer.py
+import re
+
+from config import STREAM_SEGMENT_SIZE
+
+# Bumped whenever normalize_text's output changes, so the manifest re-extracts old text files
+NORMALIZER_VERSION = 2
+
+# --- Tables and patterns, built once at import time ---
+
+# Every single-character rule of clean_text in one table: symbol replacements, bullet
+# removal, form feeds, and tabs (which clean_text only ever collapses to a single space
+# together with the spaces around them). No replacement produces another key, so the
+# table can be applied key by key; str.translate falls back to a per-character dict
+# lookup on non-ASCII text and is far slower than a guarded str.replace per key.
+_CHARACTER_TABLE = {
+    '¢': ' ', '«': ' ', '*': ' ',
+    '©': '', '™': '', '®': '', '': '',
+    '|': ' ', '_': ' ',
+    '—': '-',
+    '‘': "'", '’': "'",
+    '“': '"', '”': '"',
+    '…': '...',
+    '•': ' ', '▪': ' ', '○': ' ', '●': ' ', '✓': ' ', '►': ' ', '‣': ' ',
+    '\f': '',
+    '\t': ' ',
+}
+
+_LINE_ENDINGS_PATTERN = re.compile(r'\r\n?')
+_OCR_ARTIFACT_PATTERN = re.compile(r'(^|\s)e@(\s|$)')
+
+_MULTIPLE_SPACES_PATTERN = re.compile(r' {2,}')
+_BLANK_LINES_PATTERN = re.compile(r'\n{3,}')
+
+_NON_ASCII_PATTERN = re.compile(r'[^\x00-\x7F]+')
+
+# A cut between two ASCII letters/digits (other than "e", so no "e@" artifact is split)
+# is never touched by any normalization rule, so both sides can be normalized independently.
+_SEGMENT_CUT_PATTERN = re.compile(r'[0-9A-Za-df-z](?=[0-9A-Za-df-z])')
+
+
+def normalize_text(text):
+    """
+    Normalizes extracted CV text in a small, fixed number of C-level passes.
+    Produces exactly the output of preprocess_cv.clean_text followed by
+    regex_parser.clean_text_for_parsing: OCR artifact and symbol cleanup,
+    line-ending normalization, per-line stripping, whitespace and blank-line
+    collapsing, and replacement of non-ASCII runs with a space.
+    """
+    if not isinstance(text, str):
+        return ""
+    if '\r' in text:
+        text = _LINE_ENDINGS_PATTERN.sub('\n', text)
+    if 'e@' in text:
+        text = _OCR_ARTIFACT_PATTERN.sub(' ', text).replace('e@', '')
+    for char, replacement in _CHARACTER_TABLE.items():
+        if char in text:
+            text = text.replace(char, replacement)
+    if '  ' in text:
+        text = _MULTIPLE_SPACES_PATTERN.sub(' ', text)
+    text = '\n'.join([line.strip() for line in text.split('\n')])
+    if '\n\n\n' in text:
+        text = _BLANK_LINES_PATTERN.sub('\n\n', text)
+    if not text.isascii():
+        text = _NON_ASCII_PATTERN.sub(' ', text)
+    return text.strip()
+
+
+def _find_segment_cut(buffer, window=4096):
+    """Returns the last safe cut position in the tail of buffer, or -1 if there is none."""
+    cut = -1
+    for match in _SEGMENT_CUT_PATTERN.finditer(buffer, max(0, len(buffer) - window)):
+        cut = match.end()
+    return cut
+
+
+def normalize_text_stream(pieces, segment_size=STREAM_SEGMENT_SIZE):
+    """
+    Streaming counterpart of normalize_text. Consumes an iterable of text pieces (e.g. from
+    preprocess_cv.iter_text_from_pdf) and yields normalized text, buffering only about
+    segment_size characters at a time. Segments are cut where no rule can span the cut, so
+    ''.join(normalize_text_stream(pieces)) == normalize_text(''.join(pieces)).
+    """
+    buffer = ""
+    for piece in pieces:
+        buffer += piece
+        if len(buffer) < segment_size:
+            continue
+        cut = _find_segment_cut(buffer)
+        if cut > 0:
+            segment, buffer = buffer[:cut], buffer[cut:]
+            yield normalize_text(segment)
+    if buffer:
+        normalized = normalize_text(buffer)
+        if normalized:
+            yield normalized
+
+
+if __name__ == "__main__":
+    # Equivalence check and throughput benchmark against the previous two-function chain
+    # (preprocess_cv.clean_text -> regex_parser.clean_text_for_parsing) on the CV corpus.
+    import glob
+    import os
+    import time
+
+    from config import BASE_DIR, CV_FILES_DIR
+    from preprocess_cv import clean_text, extract_text_from_docx, iter_text_from_pdf
+    from regex_parser import clean_text_for_parsing
+
+    corpus = []
+    resume_dirs = [CV_FILES_DIR, os.path.join(os.path.dirname(BASE_DIR), 'Resumes')]
+    for path in sorted(p for d in resume_dirs for p in glob.glob(os.path.join(d, '*'))):
+        lower_path = path.lower()
+        try:
+            if lower_path.endswith('.pdf'):
+                corpus.append(''.join(iter_text_from_pdf(path)))
+            elif lower_path.endswith('.docx'):
+                corpus.append(extract_text_from_docx(path) or '')
+        except Exception as e:
+            print(f"Skipping {os.path.basename(path)}: {type(e).__name__}: {e}")
+    # Synthetic document exercising every rule (artifacts, symbols, CRLF, blank lines, non-ASCII)
+    corpus.append("  Name\te@ Surname\r\n\r\n\r\n• Python | SQL_*™ ©\f\n\xa0 — “quoted” ‘x’ …\n\n\n\nCafé  naïve 　end e@\n")
+
+    mismatches = [i for i, text in enumerate(corpus) if normalize_text(text) != clean_text_for_parsing(clean_text(text))]
+    print(f"Byte-identical output: {len(corpus) - len(mismatches)}/{len(corpus)} documents")
+    if mismatches:
+        print(f"Mismatching documents: {mismatches}")
+
+    total_mb = sum(len(text.encode('utf-8')) for text in corpus) / 1e6
+    repeats = max(1, int(20 / max(total_mb, 0.01)))
+    for label, normalizer in (("clean_text + clean_text_for_parsing", lambda t: clean_text_for_parsing(clean_text(t))),
+                              ("normalize_text", normalize_text)):
+        start_time = time.perf_counter()
+        for _ in range(repeats):
+            for text in corpus:
+                normalizer(text)
+        elapsed = time.perf_counter() - start_time
+        print(f"{label:>38}: {total_mb * repeats / elapsed:8.2f} MB/s ({repeats} x {total_mb:.2f} MB)")
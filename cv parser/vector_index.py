@@ -0,0 +1,378 @@
+# vector_index.py
+import hashlib
+import json
+import os
+import threading
+import time
+from array import array
+
+import numpy as np
+
+from config import VECTOR_INDEX_DIR, VECTOR_INDEX_LISTS, VECTOR_INDEX_PROBES, VECTOR_INDEX_TRAIN_SIZE
+from logger import performance_logger
+
+
+def _normalize_rows(matrix):
+    """L2-normalizes the rows of a float32 matrix in place and returns it."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def _nearest_centroids(vectors, centroids, block_size=65536):
+    """Returns the index of the most similar centroid for every vector, in blocks."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[start:start + block_size], dtype=np.float32)
+        assignments[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class VectorIndex:
+    """
+    Persistent approximate-nearest-neighbour index over the chunks of every parsed CV.
+
+    IVF-flat layout in `directory`:
+    - vectors.f32       every chunk vector, L2-normalized float32, appended and memory-mapped
+    - metadata.jsonl    one line per vector (document, chunk number, chunk text), plus one
+                        {"removed": document} line whenever a document is replaced
+    - centroids.npy     cluster centroids, trained once the index holds train_size vectors
+    - assignments.i32   centroid of every vector, appended alongside vectors.f32
+
+    A search scores the query against the centroids and then only against the vectors in
+    the n_probe closest clusters. Until the centroids are trained every vector is scored.
+    Memory holds only the document and chunk number of every vector and the byte offset of
+    its metadata line; chunk text is read from metadata.jsonl for the returned hits.
+    Writes are append-only, so documents can be added as new CVs arrive. Metadata is
+    appended last, and loading trims whatever an interrupted write left in the other files.
+    One process writes at a time; the in-process lock covers threads.
+    """
+
+    def __init__(self, directory=VECTOR_INDEX_DIR, n_lists=VECTOR_INDEX_LISTS, n_probe=VECTOR_INDEX_PROBES, train_size=VECTOR_INDEX_TRAIN_SIZE):
+        self.directory = directory
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_size = train_size
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._vectors_path = os.path.join(directory, 'vectors.f32')
+        self._metadata_path = os.path.join(directory, 'metadata.jsonl')
+        self._centroids_path = os.path.join(directory, 'centroids.npy')
+        self._assignments_path = os.path.join(directory, 'assignments.i32')
+
+        self.dimensions = None
+        self.count = 0           # Vectors stored, one metadata line each
+        self.documents = {}      # Document -> {"content_hash", "vector_ids" (a range)}
+        self._document_names = []            # Document number -> document
+        self._document_numbers = {}          # Document -> document number
+        self._vector_documents = array('i')  # Per vector: document number
+        self._vector_chunks = array('i')     # Per vector: chunk number within its document
+        self._metadata_offsets = array('q')  # Per vector: byte offset of its metadata line
+        self._active = np.zeros(0, dtype=bool)
+        self._vectors = None     # Memory map over vectors.f32, reopened after appends
+        self._centroids = None
+        self._lists = None       # Centroid -> sorted array of vector ids
+        self._load()
+
+    # --- Loading ---
+
+    def _load(self):
+        metadata_bytes = 0
+        if os.path.exists(self._metadata_path):
+            removed = []              # (vectors before the line, document, byte offset of the line)
+            content_hashes = {}       # Document -> hash of its latest vectors
+            record_ends = array('q')  # Byte offset just past each vector's metadata line
+            with open(self._metadata_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Last line torn by an interrupted write
+                    record = json.loads(line)
+                    if "removed" in record:
+                        removed.append((self.count, record["removed"], metadata_bytes))
+                    else:
+                        if self.dimensions is None:
+                            self.dimensions = record["dimensions"]
+                        self._append_vector(record["document"], record["chunk"], metadata_bytes)
+                        content_hashes[record["document"]] = record["content_hash"]
+                        record_ends.append(metadata_bytes + len(line))
+                    metadata_bytes += len(line)
+
+            # Metadata is written last, so it only runs ahead of vectors.f32 if that write was lost
+            vector_count = os.path.getsize(self._vectors_path) // (4 * self.dimensions) if self.dimensions and os.path.exists(self._vectors_path) else 0
+            if vector_count < self.count:
+                print(f"DEBUG: Vector index: dropping {self.count - vector_count} metadata lines without a stored vector")
+                self.count = vector_count
+                for per_vector in (self._vector_documents, self._vector_chunks, self._metadata_offsets):
+                    del per_vector[vector_count:]
+                metadata_bytes = record_ends[vector_count - 1] if vector_count else 0
+                removed = [entry for entry in removed if entry[2] < metadata_bytes]
+            if not self.count:
+                self.dimensions = None
+
+            self._active = np.ones(self.count, dtype=bool)
+            # A removal only hides the vectors written before it
+            removal_points = {}
+            for position, document, _ in removed:
+                removal_points[document] = position
+            first_ids = {}
+            for vector_id in range(self.count):
+                document = self._document_names[self._vector_documents[vector_id]]
+                if removal_points.get(document, -1) > vector_id:
+                    self._active[vector_id] = False
+                    continue
+                first_ids.setdefault(document, vector_id)
+            # A document's vectors are written in one append, so its live ones are one run
+            for document, first_id in first_ids.items():
+                last_id = first_id
+                while last_id + 1 < self.count and self._vector_documents[last_id + 1] == self._vector_documents[first_id]:
+                    last_id += 1
+                self.documents[document] = {"content_hash": content_hashes[document], "vector_ids": range(first_id, last_id + 1)}
+        self._truncate(self._metadata_path, metadata_bytes)
+        self._truncate(self._vectors_path, self.count * 4 * (self.dimensions or 0))
+        self._reopen_vectors()
+
+        if os.path.exists(self._centroids_path):
+            self._centroids = np.load(self._centroids_path)
+            self._build_lists(self._load_assignments())
+        performance_logger.info(
+            f"Vector index: loaded {int(self._active.sum())} vectors from {len(self.documents)} documents "
+            f"({'IVF, ' + str(len(self._centroids)) + ' lists' if self._centroids is not None else 'flat'})"
+        )
+
+    def _append_vector(self, document, chunk, offset):
+        number = self._document_numbers.get(document)
+        if number is None:
+            number = self._document_numbers[document] = len(self._document_names)
+            self._document_names.append(document)
+        self._vector_documents.append(number)
+        self._vector_chunks.append(chunk)
+        self._metadata_offsets.append(offset)
+        self.count += 1
+
+    @staticmethod
+    def _truncate(path, size):
+        """Cuts off whatever an interrupted write left beyond `size` bytes."""
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            print(f"DEBUG: Vector index: truncating {os.path.basename(path)} from {os.path.getsize(path)} to {size} bytes after an interrupted write")
+            os.truncate(path, size)
+
+    def _load_assignments(self):
+        """Reads assignments.i32, recomputing the entries of vectors it is missing."""
+        assignments = np.fromfile(self._assignments_path, dtype=np.int32) if os.path.exists(self._assignments_path) else np.zeros(0, dtype=np.int32)
+        if len(assignments) != self.count:
+            print(f"DEBUG: Vector index: {len(assignments)} assignments for {self.count} vectors, repairing assignments.i32")
+            assignments = assignments[:self.count]
+            if len(assignments) < self.count:
+                missing = _nearest_centroids(self._vectors[len(assignments):], self._centroids)
+                assignments = np.concatenate([assignments, missing])
+            assignments.tofile(self._assignments_path)
+        return assignments
+
+    def _reopen_vectors(self):
+        count = self.count
+        if count and self.dimensions:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode='r', shape=(count, self.dimensions))
+        else:
+            self._vectors = None
+
+    def _build_lists(self, assignments):
+        order = np.argsort(assignments, kind='stable').astype(np.int64)
+        boundaries = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[boundaries[i]:boundaries[i + 1]] for i in range(len(self._centroids))]
+
+    # --- Writing ---
+
+    @staticmethod
+    def content_hash(chunks):
+        """SHA-256 of a document's chunks, used to skip documents that are already indexed."""
+        return hashlib.sha256('\x00'.join(chunks).encode('utf-8')).hexdigest()
+
+    def add_document(self, document, chunks, embeddings):
+        """
+        Indexes the chunks of one document (e.g. a parsed CV's text file name) with their
+        embeddings. Unchanged documents are skipped; changed ones replace the old vectors.
+        Chunks without an embedding are left out. Returns the number of vectors written.
+        """
+        pairs = [(chunk, embed) for chunk, embed in zip(chunks, embeddings) if embed is not None]
+        if not pairs:
+            return 0
+        content_hash = self.content_hash([chunk for chunk, _ in pairs])
+        matrix = _normalize_rows(np.array([embed for _, embed in pairs], dtype=np.float32, ndmin=2))
+
+        with self._lock:
+            existing = self.documents.get(document)
+            if existing and existing["content_hash"] == content_hash:
+                return 0
+            if self.dimensions is None:
+                self.dimensions = matrix.shape[1]
+            elif matrix.shape[1] != self.dimensions:
+                raise ValueError(f"Vector index holds {self.dimensions}-dimensional vectors, got {matrix.shape[1]}")
+
+            first_id = self.count
+            lines = [
+                (json.dumps({"document": document, "chunk": chunk_number, "text": chunk, "content_hash": content_hash,
+                             "dimensions": self.dimensions}, ensure_ascii=False) + '\n').encode('utf-8')
+                for chunk_number, (chunk, _) in enumerate(pairs)
+            ]
+            # Metadata goes last: _load trims vectors and assignments that have no metadata line
+            with open(self._vectors_path, 'ab') as f:
+                matrix.tofile(f)
+            if self._centroids is not None:
+                assignments = _nearest_centroids(matrix, self._centroids)
+                with open(self._assignments_path, 'ab') as f:
+                    assignments.tofile(f)
+            with open(self._metadata_path, 'ab') as f:
+                if existing:
+                    f.write((json.dumps({"removed": document}) + '\n').encode('utf-8'))
+                offset = f.tell()
+                for chunk_number, line in enumerate(lines):
+                    f.write(line)
+                    self._append_vector(document, chunk_number, offset)
+                    offset += len(line)
+
+            if existing:
+                self._active[existing["vector_ids"]] = False
+            self._active = np.concatenate([self._active, np.ones(len(lines), dtype=bool)])
+            self.documents[document] = {"content_hash": content_hash, "vector_ids": range(first_id, first_id + len(lines))}
+
+            if self._centroids is not None:
+                for vector_id, centroid in enumerate(assignments, start=first_id):
+                    self._lists[centroid] = np.append(self._lists[centroid], vector_id)
+            self._reopen_vectors()
+
+            if self._centroids is None and int(self._active.sum()) >= self.train_size:
+                self._train()
+        return len(lines)
+
+    def _train(self, iterations=10, seed=0):
+        """Spherical k-means over a sample of the active vectors, then assigns every vector."""
+        start_time = time.time()
+        active_ids = np.flatnonzero(self._active)
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(active_ids))))
+        rng = np.random.default_rng(seed)
+        sample_ids = np.sort(rng.choice(active_ids, size=min(len(active_ids), n_lists * 64), replace=False))
+        sample = np.asarray(self._vectors[sample_ids], dtype=np.float32)
+
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = _nearest_centroids(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = ~sums.any(axis=1)
+            sums[empty] = centroids[empty]  # Keep centroids that attracted no vectors
+            centroids = _normalize_rows(sums)
+
+        self._centroids = centroids
+        np.save(self._centroids_path, centroids)
+        assignments = _nearest_centroids(self._vectors, centroids)
+        assignments.tofile(self._assignments_path)
+        self._build_lists(assignments)
+        performance_logger.info(
+            f"Vector index: trained {n_lists} lists on {len(sample_ids)} vectors in {time.time() - start_time:.2f} seconds"
+        )
+
+    def rebuild(self):
+        """Retrains the centroids on the current vectors (e.g. after the corpus has grown a lot)."""
+        with self._lock:
+            if self._vectors is not None:
+                self._train()
+
+    # --- Searching ---
+
+    def search_vector(self, query_vector, top_k=10, chunks_per_candidate=3, n_probe=None):
+        """
+        Returns the top_k documents for a query embedding, best first, as
+        [{"document", "score", "chunks": [{"chunk", "text", "score"}, ...]}, ...].
+        A document's score is the cosine similarity of its best matching chunk.
+        """
+        with self._lock:
+            if self._vectors is None:
+                return []
+            query = _normalize_rows(np.array(query_vector, dtype=np.float32, ndmin=2))[0]
+            if self._centroids is not None:
+                n_probe = min(n_probe or self.n_probe, len(self._centroids))
+                closest_lists = np.argpartition(-(self._centroids @ query), n_probe - 1)[:n_probe]
+                candidate_ids = np.sort(np.concatenate([self._lists[i] for i in closest_lists]))
+            else:
+                candidate_ids = np.arange(self.count)
+            candidate_ids = candidate_ids[self._active[candidate_ids]]
+            if len(candidate_ids) == 0:
+                return []
+            scores = np.asarray(self._vectors[candidate_ids]) @ query
+
+            # Walk chunks best first until top_k documents have been seen
+            results = {}
+            chunk_ids = []  # (chunk, vector id) of every returned chunk
+            for position in np.argsort(-scores, kind='stable'):
+                vector_id = int(candidate_ids[position])
+                document = self._document_names[self._vector_documents[vector_id]]
+                result = results.get(document)
+                if result is None:
+                    if len(results) == top_k:
+                        continue
+                    result = results[document] = {"document": document, "score": float(scores[position]), "chunks": []}
+                if len(result["chunks"]) < chunks_per_candidate:
+                    result["chunks"].append({"chunk": self._vector_chunks[vector_id], "text": None, "score": float(scores[position])})
+                    chunk_ids.append((result["chunks"][-1], vector_id))
+                elif len(results) == top_k and all(len(r["chunks"]) >= chunks_per_candidate for r in results.values()):
+                    break
+            # Only the returned chunks' text is read from disk
+            texts = self._read_texts([vector_id for _, vector_id in chunk_ids])
+            for chunk, vector_id in chunk_ids:
+                chunk["text"] = texts[vector_id]
+            return list(results.values())
+
+    def _read_texts(self, vector_ids):
+        """Reads the chunk text of the given vectors from metadata.jsonl, in file order."""
+        texts = {}
+        with open(self._metadata_path, 'rb') as f:
+            for vector_id in sorted(set(vector_ids), key=self._metadata_offsets.__getitem__):
+                f.seek(self._metadata_offsets[vector_id])
+                texts[vector_id] = json.loads(f.readline())["text"]
+        return texts
+
+    def search(self, query_text, top_k=10, chunks_per_candidate=3, n_probe=None):
+        """Free-text search (e.g. a job description): embeds the query, then search_vector."""
+        from llm_parser import get_embedding  # Imported here so the index itself needs no Ollama client
+
+        start_time = time.time()
+        query_vector = get_embedding(query_text)
+        if query_vector is None:
+            print("DEBUG: Failed to get embedding for query. Vector search skipped.")
+            return []
+        results = self.search_vector(query_vector, top_k=top_k, chunks_per_candidate=chunks_per_candidate, n_probe=n_probe)
+        performance_logger.info(f"Vector index: search returned {len(results)} candidates in {(time.time() - start_time) * 1000:.1f} ms")
+        return results
+
+
+if __name__ == "__main__":
+    # Semantic search over every indexed CV: python vector_index.py "job description"
+    # python vector_index.py --benchmark builds a synthetic index and reports search latency.
+    import sys
+    import tempfile
+
+    if sys.argv[1:] == ["--benchmark"]:
+        rng = np.random.default_rng(0)
+        dimensions, documents, chunks_per_document = 1024, 10000, 5
+        with tempfile.TemporaryDirectory() as directory:
+            index = VectorIndex(directory, train_size=documents * chunks_per_document)
+            start_time = time.time()
+            for document in range(documents):
+                embeddings = rng.standard_normal((chunks_per_document, dimensions), dtype=np.float32)
+                index.add_document(f"cv_{document}.txt", [f"chunk {i} of cv {document}" for i in range(chunks_per_document)], embeddings)
+            print(f"Indexed {documents * chunks_per_document} vectors in {time.time() - start_time:.1f} seconds")
+
+            queries = rng.standard_normal((50, dimensions), dtype=np.float32)
+            for label, n_probe in (("IVF", None), ("exact", len(index._centroids))):
+                start_time = time.perf_counter()
+                for query in queries:
+                    index.search_vector(query, n_probe=n_probe)
+                print(f"{label:>5} search: {(time.perf_counter() - start_time) / len(queries) * 1000:.1f} ms per query")
+    else:
+        index = VectorIndex()
+        for result in index.search(" ".join(sys.argv[1:]) or "Python developer with machine learning experience"):
+            print(f"{result['score']:.3f}  {result['document']}")
+            for chunk in result["chunks"]:
+                print(f"        {chunk['score']:.3f}  {chunk['text'][:100]!r}")